@@ -1,2 +1,24 @@
-from .combat import simulate_combat, simulate_combat_parallel
+import importlib
+from .combat import simulate_combat, simulate_combat_parallel, run_combat_parallel, run_combat_adaptive
+from .cache import run_combat_cached, ResultCache
+from .sweep import sweep, sweep_matrix, fleet_compositions
+from .compare import compare_variants, PairedComparison
+from .optimize import race, optimize_fleet, optimize_blueprint
+from .sensitivity import sensitivity_analysis
+from .analysis import MatchupAnalysis
+from .distribution import OutcomeDistribution
 from .ship_types import create_ship, list_ship_types, delete_ship_type, update_ship_type
+
+# Names from the NumPy based engines, which are only imported when one of them is first used
+_LAZY_EXPORTS = {
+    'run_combat_vectorized': 'vectorized',
+    'simulate_combat_vectorized': 'vectorized',
+    'solve_combat_exact': 'exact',
+    'simulate_combat_exact': 'exact',
+}
+
+
+def __getattr__(name):
+    if name not in _LAZY_EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(f'.{_LAZY_EXPORTS[name]}', __name__), name)
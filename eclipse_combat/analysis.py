@@ -0,0 +1,92 @@
+from .ship_table import get_ship_table
+from .stats import CombatStats, SIDES
+
+
+# Function to check whether a ship type has dice that do damage
+def has_dice(spec):
+    return any(damage > 0 and count > 0 for damage, count in spec.dice)
+
+
+# Function to check whether a ship type has missiles that do damage
+def has_missiles(spec):
+    return any(damage > 0 and count > 0 for damage, count in spec.missiles)
+
+
+class MatchupAnalysis:
+    """ What the ship types of a matchup tell about its outcome before a die is rolled.
+
+    A roll of 6 always hits, so shields never make a ship safe: a battle only fails to end when neither side has
+    anything left that damages in the combat rounds. fight stops such battles as stalemates, and stalemate is True
+    when it happens straight after the missile phase.
+
+    winner is 'attacker' or 'defender' when that side always wins without losing a ship, 'draw' when no ship can ever
+    be destroyed, and None when the matchup has to be simulated. win_bounds[side] is the (low, high) range the win
+    probability of side is known to be in.
+    """
+
+    def __init__(self, attacker_counts, defender_counts, table=None):
+        if table is None:
+            table = get_ship_table()
+        self.counts = {'attacker': attacker_counts, 'defender': defender_counts}
+        self.specs = {side: [table.specs[table.index[name]] for name, count in counts.items() if count > 0]
+                      for side, counts in self.counts.items()}
+        self.armed = {side: any(spec.can_damage or has_missiles(spec) for spec in specs)
+                      for side, specs in self.specs.items()}
+        self.rift_cannons = {side: any(spec.rift_cannon for spec in specs) for side, specs in self.specs.items()}
+        self.stalemate = not any(spec.can_damage for specs in self.specs.values() for spec in specs)
+        self.winner = self._winner()
+
+        self.win_bounds = {}
+        for side, other in (('attacker', 'defender'), ('defender', 'attacker')):
+            if self.winner is not None:
+                self.win_bounds[side] = (1.0, 1.0) if self.winner == side else (0.0, 0.0)
+            elif not self.armed[side] and not self.rift_cannons[other]:
+                # Only the other side's rift cannons could destroy its own ships
+                self.win_bounds[side] = (0.0, 0.0)
+            else:
+                self.win_bounds[side] = (0.0, 1.0)
+
+    # A side wins untouched when the other side has no weapons, as long as it keeps rolling dice every round
+    # and has no rift cannons that could destroy its own ships
+    def _wins_untouched(self, side, other):
+        return (not self.armed[other] and any(has_dice(spec) for spec in self.specs[side]) and
+                not self.rift_cannons[side])
+
+    def _winner(self):
+        if not self.specs['attacker'] and not self.specs['defender']:
+            return 'draw'
+        if not self.specs['defender'] or self._wins_untouched('attacker', 'defender'):
+            return 'attacker'
+        if not self.specs['attacker'] or self._wins_untouched('defender', 'attacker'):
+            return 'defender'
+        if not self.armed['attacker'] and not self.armed['defender']:
+            return 'draw'
+        return None
+
+    def outcome(self, iterations):
+        """ Build the totals of a decided matchup as if every one of the iterations had been simulated
+        :param iterations: Number of battles
+        :return: CombatStats, or None when the matchup has to be simulated
+        """
+        if self.winner is None:
+            return None
+        # The winning fleet cannot take any damage, so every ship survives
+        stats = CombatStats(self.counts['attacker'], self.counts['defender'])
+        wins = {side: 0 for side in SIDES}
+        survivors = {side: {} for side in SIDES}
+        stalemates = 0
+        if self.winner != 'draw':
+            wins[self.winner] = iterations
+            for ship_type, count in self.counts[self.winner].items():
+                survivors[self.winner][ship_type] = [0] * count + [iterations]
+        elif self.specs['attacker']:
+            # Both fleets are left, only a matchup without any ships ends with both destroyed
+            stalemates = iterations
+        stats.add_many(iterations, wins, survivors, stalemates)
+        return stats
+
+
+# Function to work out the outcome of a matchup without simulating it, when it is decided before any dice are rolled.
+# Returns a CombatStats as if every one of the iterations had been simulated, or None.
+def decided_outcome(attacker_counts, defender_counts, iterations, table=None):
+    return MatchupAnalysis(attacker_counts, defender_counts, table).outcome(iterations)
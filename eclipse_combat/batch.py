@@ -0,0 +1,334 @@
+import os
+import sys
+import json
+import queue
+import argparse
+from collections import deque
+from multiprocessing import Pool
+from .combat import DEFAULT_CHUNK_SIZE, DEFAULT_MAX_ITERATIONS, chunk_sizes, simulate_combat_chunk
+from .ship_table import compile_ship_types, using_ship_table
+from .ship_types import get_ship_types
+from .stats import CombatStats
+from .rng import derive_seed, stream
+
+# Number of compiled ship tables a worker keeps for scenarios with custom ship types
+TABLE_CACHE_SIZE = 64
+
+_tables = {}
+
+
+# Function to simulate one chunk of a batch scenario in a worker, with the ship types the scenario uses
+def run_batch_chunk(task):
+    index, chunk_index, attacker_counts, defender_counts, types_json, size, seed, instrument, distribution = task
+    table = _tables.get(types_json)
+    if table is None:
+        if len(_tables) >= TABLE_CACHE_SIZE:
+            _tables.clear()
+        table = _tables[types_json] = compile_ship_types(json.loads(types_json))
+    with using_ship_table(table):
+        return index, chunk_index, simulate_combat_chunk(attacker_counts, defender_counts, size,
+                                                         stream(seed, chunk_index), instrument, distribution)
+
+
+# Function to read a scenario field that must be a positive whole number
+def _positive_int(scenario, field, default=None):
+    value = scenario.get(field, default)
+    if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+        raise ValueError(f"'{field}' must be a positive whole number.")
+    return value
+
+
+# Function to read a scenario field that must be a number between low and high, both excluded
+def _number_between(scenario, field, low, high, default=None):
+    value = scenario.get(field, default)
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not low < value < high:
+        raise ValueError(f"'{field}' must be a number between {low} and {high}.")
+    return value
+
+
+class UnreadableScenario:
+    """ Stand in for input that is not valid JSON, so run_batch reports it as an error result and goes on """
+
+    def __init__(self, error):
+        self.error = error
+
+
+class InlinePool:
+    """ Stand in for multiprocessing.Pool running every task in this process as soon as it is submitted """
+
+    def apply_async(self, func, args=(), callback=None, error_callback=None):
+        try:
+            result = func(*args)
+        except Exception as error:
+            if error_callback is None:
+                raise
+            error_callback(error)
+        else:
+            if callback is not None:
+                callback(result)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class ScenarioRun:
+    """ Progress of one batch scenario: which chunks have been handed out and the totals merged so far.
+    Chunks are merged in chunk order, so a precision target stops at the same chunk whatever order the
+    workers finish in.
+    """
+
+    def __init__(self, index, scenario, base_types, chunk_size, max_iterations, confidence, batch_seed):
+        if isinstance(scenario, UnreadableScenario):
+            raise ValueError(scenario.error)
+        if not isinstance(scenario, dict):
+            raise ValueError("A scenario must be a JSON object.")
+        self.index = index
+        self.id = scenario.get('id', index)
+        self.attacker_counts = self._counts(scenario, 'attacker')
+        self.defender_counts = self._counts(scenario, 'defender')
+
+        custom_types = scenario.get('ship_types', {})
+        types = {}
+        for name in list(self.attacker_counts) + list(self.defender_counts):
+            if name in custom_types:
+                types[name] = custom_types[name]
+            elif name in base_types:
+                types[name] = base_types[name]
+            else:
+                raise ValueError(f"Unknown ship type '{name}'.")
+        try:
+            compile_ship_types(types)
+        except (KeyError, TypeError, AttributeError) as error:
+            raise ValueError(f"Invalid ship type attributes: {error!r}.")
+        self.types_json = json.dumps(types, sort_keys=True)
+
+        self.iterations = scenario.get('iterations')
+        self.precision = scenario.get('precision')
+        if (self.iterations is None) == (self.precision is None):
+            raise ValueError("Give either iterations or precision.")
+        if self.iterations is not None:
+            _positive_int(scenario, 'iterations')
+        else:
+            _number_between(scenario, 'precision', 0, 1)
+        self.confidence = _number_between(scenario, 'confidence', 0, 1, confidence)
+        self.seed = scenario.get('seed')
+        if self.seed is not None and (isinstance(self.seed, bool) or not isinstance(self.seed, int)):
+            raise ValueError("'seed' must be a whole number.")
+        if self.seed is None and batch_seed is not None:
+            self.seed = derive_seed(batch_seed, index)
+
+        self.instrument = bool(scenario.get('instrument', False))
+        self.distribution = bool(scenario.get('distribution', False))
+        total = self.iterations if self.precision is None else _positive_int(scenario, 'max_iterations', max_iterations)
+        self.sizes = enumerate(chunk_sizes(total, _positive_int(scenario, 'chunk_size', chunk_size)))
+        self.has_tasks = True
+        self.failed = False
+        self.outstanding = 0
+        self.received = {}
+        self.merged_chunks = 0
+        self.stats = CombatStats(self.attacker_counts, self.defender_counts)
+        self.finished = False
+
+    @staticmethod
+    def _counts(scenario, side):
+        counts = scenario.get(side)
+        if not isinstance(counts, dict) or not all(isinstance(count, int) and count >= 0 for count in counts.values()):
+            raise ValueError(f"'{side}' must map ship type names to counts.")
+        return counts
+
+    # Function to hand out the next chunk of the scenario, None once every chunk has been handed out
+    def next_task(self):
+        if not self.has_tasks:
+            return None
+        for chunk_index, size in self.sizes:
+            self.outstanding += 1
+            return (self.index, chunk_index, self.attacker_counts, self.defender_counts, self.types_json, size,
+                    self.seed, self.instrument, self.distribution)
+        self.has_tasks = False
+        return None
+
+    # Function to merge a finished chunk, returns True once the scenario is finished
+    def receive(self, chunk_index, chunk_stats):
+        self.outstanding -= 1
+        if self.failed:
+            return False
+        self.received[chunk_index] = chunk_stats
+        while not self.finished and self.merged_chunks in self.received:
+            self.stats.merge(self.received.pop(self.merged_chunks))
+            self.merged_chunks += 1
+            if self.precision is not None and self.stats.precise_enough(self.precision, self.confidence):
+                self.finished = True
+        if not self.has_tasks and not self.outstanding:
+            self.finished = True
+        if self.finished:
+            self.has_tasks = False
+        return self.finished and not self.outstanding
+
+    # Function to stop handing out chunks, chunks already handed out still have to be received
+    def cancel(self):
+        self.finished = True
+        self.has_tasks = False
+
+    # Function to record a chunk that failed, returns True the first time so the scenario reports one error.
+    # The scenario stops, and its chunks still running are dropped as they come in.
+    def receive_error(self):
+        self.outstanding -= 1
+        first = not self.failed
+        self.failed = True
+        self.cancel()
+        return first
+
+    # Function to build the JSON result line of the finished scenario
+    def result(self):
+        result = {
+            'index': self.index,
+            'id': self.id,
+            'attacker': self.attacker_counts,
+            'defender': self.defender_counts,
+            'iterations': self.stats.iterations,
+            'seed': self.seed,
+            'results': self.stats.results(),
+            'intervals': {side: self.stats.win_prob_interval(side, self.confidence)
+                          for side in ('attacker', 'defender')},
+        }
+        if self.stats.counters is not None:
+            result['counters'] = self.stats.counters.to_dict()
+        if self.stats.distribution is not None:
+            result['distribution'] = self.stats.distribution.to_dict()
+        return result
+
+
+def run_batch(scenarios, processes=None, chunk_size=DEFAULT_CHUNK_SIZE, max_iterations=DEFAULT_MAX_ITERATIONS,
+              confidence=0.95, seed=None):
+    """ Simulate many scenarios over one worker pool, yielding each result as soon as its scenario is finished.
+    Scenarios are read from the iterable as workers become free, so a long stream starts producing results
+    straight away. A scenario that can not be run gives a result with an 'error' message instead.
+    :param scenarios: Iterable of scenario dicts with 'attacker' and 'defender' counts, 'iterations' or 'precision',
+                      and optionally 'id', 'ship_types' (custom types by name), 'confidence', 'max_iterations',
+                      'chunk_size', 'seed', 'instrument' and 'distribution'
+    :param processes: Number of worker processes, defaults to the number of CPUs, 1 runs in this process
+    :param chunk_size: Number of battles in one worker task
+    :param max_iterations: Default limit on battles for scenarios with a precision
+    :param confidence: Default confidence level of precision targets and reported intervals
+    :param seed: Root seed for scenarios without their own seed, each scenario gets its own stream from it
+    :return: Generator of result dicts in order of completion, or of dicts with 'index', 'id' and 'error' for the
+             scenarios that could not be run
+    """
+    base_types = get_ship_types()
+    scenarios = iter(enumerate(scenarios))
+    runs = {}
+    waiting = deque()
+    finished = queue.SimpleQueue()
+    in_flight = 0
+    more_scenarios = True
+    if processes is None:
+        processes = os.cpu_count() or 1
+    pool = InlinePool() if processes == 1 else Pool(processes)
+    # Tasks handed to the pool at once, enough to keep every worker busy while results are merged
+    limit = 2 * processes
+
+    with pool:
+        while True:
+            # Keep the workers busy, finishing the oldest scenarios first and starting new ones when they run out
+            while in_flight < limit:
+                task = None
+                while waiting and task is None:
+                    run = runs.get(waiting[0])
+                    task = run.next_task() if run is not None else None
+                    if task is None:
+                        waiting.popleft()
+                if task is None:
+                    if not more_scenarios:
+                        break
+                    try:
+                        index, scenario = next(scenarios)
+                    except StopIteration:
+                        more_scenarios = False
+                        break
+                    try:
+                        runs[index] = ScenarioRun(index, scenario, base_types, chunk_size, max_iterations, confidence,
+                                                  seed)
+                    except (ValueError, TypeError) as error:
+                        yield {'index': index, 'id': scenario.get('id', index) if isinstance(scenario, dict) else index,
+                               'error': str(error)}
+                        continue
+                    waiting.append(index)
+                    continue
+                in_flight += 1
+                pool.apply_async(run_batch_chunk, (task,), callback=finished.put,
+                                 error_callback=lambda error, task=task: finished.put((task[0], task[1], error)))
+
+            if not in_flight:
+                return
+            index, chunk_index, chunk_stats = finished.get()
+            in_flight -= 1
+            run = runs[index]
+            if isinstance(chunk_stats, BaseException):
+                if run.receive_error():
+                    yield {'index': index, 'id': run.id, 'error': f"{type(chunk_stats).__name__}: {chunk_stats}"}
+                if not run.outstanding:
+                    del runs[index]
+            elif run.receive(chunk_index, chunk_stats):
+                yield runs.pop(index).result()
+            elif run.failed and not run.outstanding:
+                del runs[index]
+
+
+# Function to read scenarios from a JSON list, a JSON object with a 'scenarios' list, or JSON lines
+def read_scenarios(file):
+    first_line = ''
+    for first_line in file:
+        if first_line.strip():
+            break
+    stripped = first_line.strip()
+    if not stripped:
+        return
+    if not stripped.startswith('['):
+        try:
+            scenario = json.loads(stripped)
+        except json.JSONDecodeError:
+            scenario = None
+        if isinstance(scenario, dict) and 'scenarios' not in scenario:
+            yield scenario
+            for line in file:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError as error:
+                        yield UnreadableScenario(f"Invalid JSON line: {error}.")
+            return
+    try:
+        data = json.loads(first_line + file.read())
+    except json.JSONDecodeError as error:
+        yield UnreadableScenario(f"Invalid JSON: {error}.")
+        return
+    yield from data.get('scenarios', [data]) if isinstance(data, dict) else data
+
+
+def simulate_combat_batch(args=None):
+    """ Console entry point simulating the scenarios of a JSON or JSON lines file (or stdin) and printing one
+    JSON result line per scenario as it finishes
+    :param args: Command line arguments, defaults to sys.argv
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Simulate many combat scenarios from a JSON or JSON lines file.")
+    parser.add_argument('input', nargs='?', default='-', help="scenario file, - or nothing for stdin")
+    parser.add_argument('--processes', type=int, help="worker processes, defaults to the number of CPUs")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="battles per worker task")
+    parser.add_argument('--max-iterations', type=int, default=DEFAULT_MAX_ITERATIONS,
+                        help="limit on battles for scenarios with a precision")
+    parser.add_argument('--confidence', type=float, default=0.95, help="confidence level of the intervals")
+    parser.add_argument('--seed', type=int, help="root seed for scenarios without their own seed")
+    options = parser.parse_args(args)
+
+    file = sys.stdin if options.input == '-' else open(options.input)
+    try:
+        for result in run_batch(read_scenarios(file), options.processes, options.chunk_size, options.max_iterations,
+                                options.confidence, options.seed):
+            print(json.dumps(result), flush=True)
+    finally:
+        if file is not sys.stdin:
+            file.close()
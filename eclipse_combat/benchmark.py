@@ -0,0 +1,218 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tracemalloc
+import multiprocessing
+from contextlib import contextmanager
+from statistics import quantiles
+from . import ship_types
+from .combat import ENGINE_VERSION, fight, run_combat_parallel
+from .ship_table import load_ship_table
+from .rng import stream
+
+# resource is only available on Unix, elsewhere the peak memory of the workers is not reported
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Ship types used only by the benchmark scenarios, added to SHIP_TYPES for the length of a run
+BENCHMARK_SHIP_TYPES = {
+    'BenchMissileCruiser': {'type': 'cruiser', 'hull': 1, 'computer': 1, 'shield': 0, 'dice': {1: 1}, 'rift_cannon': 0,
+                            'missiles': {2: 2}, 'initiative': 3, 'antimatter_splitter': False},
+    'BenchMissileInterceptor': {'type': 'interceptor', 'hull': 0, 'computer': 1, 'shield': 1, 'dice': {},
+                                'rift_cannon': 0, 'missiles': {2: 1}, 'initiative': 4, 'antimatter_splitter': False},
+    'BenchRiftDreadnought': {'type': 'dreadnought', 'hull': 4, 'computer': 1, 'shield': 1, 'dice': {1: 1},
+                             'rift_cannon': 2, 'missiles': {}, 'initiative': 1, 'antimatter_splitter': False},
+    'BenchAntimatterDreadnought': {'type': 'dreadnought', 'hull': 3, 'computer': 2, 'shield': 1, 'dice': {4: 1, 1: 1},
+                                   'rift_cannon': 0, 'missiles': {}, 'initiative': 1, 'antimatter_splitter': True},
+}
+
+# Fixed matchups the engine is timed on, as (attacker counts, defender counts)
+SCENARIOS = {
+    'skirmish': ({'Interceptor': 2}, {'Interceptor': 2}),
+    'max_fleet_vs_gcds': ({'Interceptor': 8, 'Cruiser': 4, 'Dreadnought': 2}, {'GCDS': 1}),
+    'missiles': ({'BenchMissileCruiser': 4, 'BenchMissileInterceptor': 4}, {'Ancient': 2, 'Guardian': 1}),
+    'rift': ({'BenchRiftDreadnought': 2}, {'Cruiser': 4}),
+    'antimatter': ({'BenchAntimatterDreadnought': 2}, {'GCDS': 1}),
+}
+
+DEFAULT_BATTLES = 2000
+
+# Chunks given to each worker in the pool mode, so every worker gets several and the pool is kept busy
+CHUNKS_PER_PROCESS = 4
+
+# Most battles traced for the serial peak memory, tracing slows the simulation down too much to time it as well
+MEMORY_BATTLES = 200
+
+
+# Context manager adding the benchmark ship types to SHIP_TYPES, and removing them again so they are never saved
+@contextmanager
+def benchmark_ship_types():
+    added = [name for name in BENCHMARK_SHIP_TYPES if name not in ship_types.SHIP_TYPES]
+    for name in added:
+        ship_types.SHIP_TYPES[name] = BENCHMARK_SHIP_TYPES[name]
+    try:
+        load_ship_table()
+        yield
+    finally:
+        for name in added:
+            del ship_types.SHIP_TYPES[name]
+        load_ship_table()
+
+
+# Function to time battles one at a time in this process
+def benchmark_serial(attacker_counts, defender_counts, battles, seed):
+    rng = stream(seed, 'serial')
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(battles):
+        battle_start = time.perf_counter()
+        fight(attacker_counts, defender_counts, rng)
+        latencies.append(time.perf_counter() - battle_start)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    for _ in range(min(battles, MEMORY_BATTLES)):
+        fight(attacker_counts, defender_counts, rng)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    percentiles = quantiles(latencies, n=100) if battles > 1 else latencies * 99
+    return {
+        'battles': battles,
+        'seconds': elapsed,
+        'battles_per_sec': battles / elapsed,
+        'latency_us': {'p50': percentiles[49] * 1e6, 'p90': percentiles[89] * 1e6, 'p99': percentiles[98] * 1e6,
+                       'max': max(latencies) * 1e6},
+        'peak_memory_kb': peak / 1024,
+    }
+
+
+# Function to time battles over the worker pool used by run_combat_parallel, sending the results over connection.
+# The peak RSS of reaped children covers every pool this process ever ran, so it runs in a process of its own.
+def _benchmark_pool_process(connection, attacker_counts, defender_counts, battles, seed, processes, chunk_size):
+    with benchmark_ship_types():
+        tracemalloc.start()
+        start = time.perf_counter()
+        run_combat_parallel(attacker_counts, defender_counts, battles, chunk_size=chunk_size, processes=processes,
+                            progress=False, seed=seed)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    connection.send({
+        'battles': battles,
+        'seconds': elapsed,
+        'battles_per_sec': battles / elapsed,
+        'processes': processes,
+        'chunk_size': chunk_size,
+        'parent_peak_memory_kb': peak / 1024,
+        # ru_maxrss is in KiB on Linux but in bytes on macOS
+        'worker_max_rss_kb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss if resource else None,
+    })
+    connection.close()
+
+
+# Function to time battles over the worker pool used by run_combat_parallel, in a fresh process per scenario.
+# chunk_size defaults to a share of the battles that gives every worker CHUNKS_PER_PROCESS chunks.
+def benchmark_pool(attacker_counts, defender_counts, battles, seed, processes=None, chunk_size=None):
+    processes = processes or os.cpu_count()
+    if chunk_size is None:
+        chunk_size = max(1, battles // (processes * CHUNKS_PER_PROCESS))
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=_benchmark_pool_process,
+                                      args=(sender, attacker_counts, defender_counts, battles, seed, processes,
+                                            chunk_size))
+    process.start()
+    sender.close()
+    try:
+        results = receiver.recv()
+    except EOFError:
+        raise RuntimeError(f"The pool benchmark process failed with exit code {process.exitcode}.")
+    finally:
+        process.join()
+    return results
+
+
+def run_benchmark(scenarios=None, battles=DEFAULT_BATTLES, modes=('serial', 'pool'), processes=None, seed=0,
+                  chunk_size=None):
+    """ Time the simulation engine on the fixed benchmark scenarios
+    :param scenarios: Names of the scenarios to run, defaults to all of SCENARIOS
+    :param battles: Number of battles per scenario and mode
+    :param modes: 'serial' to time single battles in this process, 'pool' to time run_combat_parallel
+    :param processes: Number of worker processes for the pool mode, defaults to the number of CPUs
+    :param seed: Root seed of the dice, so every run simulates the same battles
+    :param chunk_size: Battles per worker task in the pool mode, defaults to CHUNKS_PER_PROCESS chunks per worker
+    :return: Dict of run metadata and the measurements of every scenario
+    """
+    if scenarios is None:
+        scenarios = list(SCENARIOS)
+    report = {
+        'engine_version': ENGINE_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'battles': battles,
+        'seed': seed,
+        'scenarios': {},
+    }
+    with benchmark_ship_types():
+        for name in scenarios:
+            attacker_counts, defender_counts = SCENARIOS[name]
+            results = {'attacker': attacker_counts, 'defender': defender_counts}
+            if 'serial' in modes:
+                results['serial'] = benchmark_serial(attacker_counts, defender_counts, battles, seed)
+            if 'pool' in modes:
+                results['pool'] = benchmark_pool(attacker_counts, defender_counts, battles, seed, processes,
+                                                 chunk_size)
+            report['scenarios'][name] = results
+    return report
+
+
+# Function to print a benchmark report as a table
+def print_report(report):
+    print(f"{'scenario':<20}{'mode':<8}{'battles/s':>12}{'p50 us':>10}{'p90 us':>10}{'p99 us':>10}{'peak KiB':>10}"
+          f"{'worker KiB':>12}")
+    for name, results in report['scenarios'].items():
+        if 'serial' in results:
+            serial = results['serial']
+            latency = serial['latency_us']
+            print(f"{name:<20}{'serial':<8}{serial['battles_per_sec']:>12.0f}{latency['p50']:>10.1f}"
+                  f"{latency['p90']:>10.1f}{latency['p99']:>10.1f}{serial['peak_memory_kb']:>10.0f}")
+        if 'pool' in results:
+            pool = results['pool']
+            worker_rss = pool['worker_max_rss_kb']
+            print(f"{name:<20}{'pool':<8}{pool['battles_per_sec']:>12.0f}{'':>30}{pool['parent_peak_memory_kb']:>10.0f}"
+                  f"{worker_rss if worker_rss is not None else '-':>12}")
+
+
+def benchmark_combat(args=None):
+    """ Console entry point running the benchmark and optionally writing the report as JSON
+    :param args: Command line arguments, defaults to sys.argv
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Time the combat simulation on fixed benchmark scenarios.")
+    parser.add_argument('--battles', type=int, default=DEFAULT_BATTLES, help="battles per scenario and mode")
+    parser.add_argument('--scenario', action='append', choices=list(SCENARIOS), help="scenario to run, repeatable")
+    parser.add_argument('--mode', action='append', choices=['serial', 'pool'], help="mode to run, repeatable")
+    parser.add_argument('--processes', type=int, help="worker processes for the pool mode")
+    parser.add_argument('--chunk-size', type=int, help="battles per worker task in the pool mode")
+    parser.add_argument('--seed', type=int, default=0, help="root seed of the dice")
+    parser.add_argument('--output', help="write the report as JSON to this file, - for stdout")
+    options = parser.parse_args(args)
+
+    report = run_benchmark(options.scenario, options.battles, options.mode or ('serial', 'pool'), options.processes,
+                           options.seed, options.chunk_size)
+    if options.output == '-':
+        json.dump(report, sys.stdout, indent=2)
+        print()
+        return
+    print_report(report)
+    if options.output:
+        with open(options.output, 'w') as file:
+            json.dump(report, file, indent=2)
+        print(f"Report written to {options.output}")
@@ -0,0 +1,178 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+from .combat import ENGINE_VERSION, run_combat_adaptive, run_combat_parallel
+from .ship_table import load_ship_table
+from .stats import CombatStats
+
+# Results are cached per user, outside the package directory
+DEFAULT_CACHE_FILE = os.path.join(os.path.expanduser('~'), '.cache', 'eclipse_tools', 'results.sqlite')
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Ship attributes that affect the outcome of a battle
+SPEC_FIELDS = ('type', 'hull', 'computer', 'shield', 'dice', 'missiles', 'rift_cannon', 'initiative',
+               'antimatter_splitter')
+
+ENGINES = ('parallel', 'vectorized')
+
+# Engine options that change what a result holds or which battles it is made of
+KEY_OPTIONS = ('seed', 'instrument', 'distribution')
+
+
+def matchup_key(attacker_counts, defender_counts, engine, table=None, options=None):
+    """ Build a canonical hash of a matchup. Fleet order is kept as it decides targeting ties.
+    :param attacker_counts: Dictionary of ship types and their counts for the attacker
+    :param defender_counts: Dictionary of ship types and their counts for the defender
+    :param engine: Name of the engine the results come from
+    :param table: ShipTable the ship types are resolved from, defaults to the current SHIP_TYPES
+    :param options: Dictionary of engine options the results were simulated with, see KEY_OPTIONS
+    :return: Hex digest identifying the matchup
+    """
+    if table is None:
+        table = load_ship_table()
+    ship_types = {}
+    for name in list(attacker_counts) + list(defender_counts):
+        spec = table.specs[table.index[name]]
+        ship_types[name] = {field: getattr(spec, field) for field in SPEC_FIELDS}
+    data = {
+        'attacker': list(attacker_counts.items()),
+        'defender': list(defender_counts.items()),
+        'ship_types': ship_types,
+        'engine': engine,
+        'engine_version': ENGINE_VERSION,
+    }
+    if options:
+        data['options'] = options
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+
+class ResultCache:
+    """ SQLite store of finished simulation results keyed by matchup. Only the result with the most iterations is
+    kept per matchup, and it answers any request for fewer iterations or a lower precision. The least recently used
+    entries are evicted once the cache holds more than max_entries results or max_bytes of data.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_FILE, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.connection = sqlite3.connect(path, timeout=30)
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    matchup TEXT PRIMARY KEY,
+                    iterations INTEGER NOT NULL,
+                    stats TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                )""")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def get(self, key, iterations=None, precision=None, confidence=0.95):
+        """ Look up a cached result that is at least as good as the one requested
+        :param key: Matchup key from matchup_key
+        :param iterations: Minimum number of iterations needed
+        :param precision: Maximum half width of the win probability confidence intervals
+        :param confidence: Confidence level the precision is measured at
+        :return: CombatStats, or None if there is no good enough result
+        """
+        row = self.connection.execute("SELECT iterations, stats FROM results WHERE matchup = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        stats = CombatStats.from_dict(json.loads(row[1]))
+        if iterations is not None and stats.iterations < iterations:
+            return None
+        if precision is not None and not stats.precise_enough(precision, confidence):
+            return None
+        with self.connection:
+            self.connection.execute("UPDATE results SET last_used = ? WHERE matchup = ?", (time.time(), key))
+        return stats
+
+    def put(self, key, stats):
+        data = json.dumps(stats.to_dict())
+        with self.connection:
+            # Keep whichever result has more iterations
+            self.connection.execute("""
+                INSERT INTO results (matchup, iterations, stats, size, last_used) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (matchup) DO UPDATE SET
+                    iterations = excluded.iterations, stats = excluded.stats, size = excluded.size,
+                    last_used = excluded.last_used
+                WHERE excluded.iterations > results.iterations""",
+                                    (key, stats.iterations, data, len(data), time.time()))
+        self.evict()
+
+    def evict(self):
+        with self.connection:
+            count, total_size = self.connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+            rows = self.connection.execute("SELECT matchup, size FROM results ORDER BY last_used")
+            evicted = []
+            for matchup, size in rows:
+                if count <= self.max_entries and total_size <= self.max_bytes:
+                    break
+                evicted.append((matchup,))
+                count -= 1
+                total_size -= size
+            self.connection.executemany("DELETE FROM results WHERE matchup = ?", evicted)
+
+    def clear(self):
+        with self.connection:
+            self.connection.execute("DELETE FROM results")
+
+
+def run_combat_cached(attacker_counts, defender_counts, iterations=None, precision=None, engine='parallel',
+                      cache=None, confidence=0.95, **kwargs):
+    """ Simulate a matchup, reusing a cached result when one with enough iterations or precision exists
+    :param attacker_counts: Dictionary of ship types and their counts for the attacker
+    :param defender_counts: Dictionary of ship types and their counts for the defender
+    :param iterations: Number of battles to simulate
+    :param precision: Target half width of the win probability intervals, used instead of iterations
+    :param engine: 'parallel' for run_combat_parallel / run_combat_adaptive, or 'vectorized'
+    :param cache: ResultCache to use, defaults to one at DEFAULT_CACHE_FILE
+    :param confidence: Confidence level the precision is measured at
+    :param kwargs: Passed on to the engine
+    :return: CombatStats
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine '{engine}', expected one of {ENGINES}.")
+    if (iterations is None) == (precision is None):
+        raise ValueError("Give either a number of iterations or a precision.")
+    if engine == 'vectorized' and precision is not None:
+        raise ValueError("The vectorized engine needs a number of iterations.")
+
+    own_cache = cache is None
+    if own_cache:
+        cache = ResultCache()
+    try:
+        # A result is only reused for the same seed, and only when it has the counters and distribution asked for
+        options = {name: kwargs.get(name) if name == 'seed' else bool(kwargs.get(name)) for name in KEY_OPTIONS}
+        key = matchup_key(attacker_counts, defender_counts, engine, options=options)
+        stats = cache.get(key, iterations, precision, confidence)
+        if stats is None:
+            if engine == 'vectorized':
+                # NumPy is only imported when the vectorized engine is used
+                from .vectorized import vectorized_combat_stats
+
+                stats = vectorized_combat_stats(attacker_counts, defender_counts, iterations, **kwargs)
+            elif precision is not None:
+                stats = run_combat_adaptive(attacker_counts, defender_counts, precision, confidence, **kwargs)
+            else:
+                stats = run_combat_parallel(attacker_counts, defender_counts, iterations, **kwargs)
+            cache.put(key, stats)
+        return stats
+    finally:
+        if own_cache:
+            cache.close()
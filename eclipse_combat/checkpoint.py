@@ -0,0 +1,176 @@
+import os
+import json
+import time
+import argparse
+from .cache import matchup_key
+from .combat import (DEFAULT_CHUNK_SIZE, DEFAULT_MAX_ITERATIONS, ENGINE_VERSION, chunk_sizes, iterate_chunks,
+                     print_intervals, print_results)
+from .ship_table import load_ship_table
+from .ship_types import write_json_atomic
+from .stats import CombatStats
+
+# Seconds between checkpoints of a running simulation
+DEFAULT_CHECKPOINT_INTERVAL = 60
+
+CHECKPOINT_VERSION = 1
+
+
+def load_checkpoint(path):
+    """ Read a checkpoint, also while its simulation is still running
+    :param path: Checkpoint file
+    :return: Dict of the run settings and progress, with the totals so far as a CombatStats under 'stats'
+    """
+    with open(path) as file:
+        state = json.load(file)
+    if state.get('version') != CHECKPOINT_VERSION:
+        raise ValueError(f"'{path}' is not a checkpoint this version can read.")
+    state['stats'] = CombatStats.from_dict(state['stats'])
+    return state
+
+
+def save_checkpoint(path, state):
+    data = dict(state, stats=state['stats'].to_dict(), updated=time.strftime('%Y-%m-%dT%H:%M:%S%z'))
+    write_json_atomic(path, data, prefix='.checkpoint.')
+
+
+def run_combat_checkpointed(path, attacker_counts=None, defender_counts=None, iterations=None, precision=None,
+                            confidence=0.95, chunk_size=DEFAULT_CHUNK_SIZE, max_iterations=DEFAULT_MAX_ITERATIONS,
+                            processes=None, progress=True, seed=None, checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL):
+    """ Simulate battles like run_combat_parallel or run_combat_adaptive, saving the totals to a checkpoint file
+    every checkpoint_interval seconds and when the run stops for any reason, Ctrl+C included.
+
+    If the checkpoint file exists the run continues from it, with the settings saved in it. Chunk i always rolls
+    from the stream derived from the run's seed and i, and chunks are merged in order, so the checkpoint only needs
+    the number of chunks done to know where every stream is. A continued run gives exactly the results the run would
+    have given without stopping. Unseeded runs are given a random seed for this.
+    :param path: Checkpoint file
+    :param attacker_counts: Dictionary of ship types and their counts for the attacker, for a new run
+    :param defender_counts: Dictionary of ship types and their counts for the defender, for a new run
+    :param iterations: Number of battles to simulate, for a new run
+    :param precision: Target half width of the confidence intervals, instead of iterations
+    :param confidence: Confidence level of the intervals
+    :param chunk_size: Number of battles each worker simulates before sending back its totals
+    :param max_iterations: Stop after this many battles even if the precision has not been reached
+    :param processes: Number of worker processes, defaults to the number of CPUs, 1 runs in this process
+    :param progress: Show a progress bar
+    :param seed: Root seed of a new run
+    :param checkpoint_interval: Seconds between checkpoints
+    :return: CombatStats of all the battles simulated, before and after resuming
+    """
+    from tqdm import tqdm
+
+    if os.path.exists(path):
+        state = load_checkpoint(path)
+        if state['engine_version'] != ENGINE_VERSION:
+            raise ValueError(f"The checkpoint '{path}' was started with engine version {state['engine_version']}, "
+                             f"it cannot be continued with version {ENGINE_VERSION}.")
+        if attacker_counts is not None and (attacker_counts, defender_counts) != (state['attacker_counts'],
+                                                                               state['defender_counts']):
+            raise ValueError(f"The checkpoint '{path}' is of a different matchup.")
+        attacker_counts, defender_counts = state['attacker_counts'], state['defender_counts']
+        if matchup_key(attacker_counts, defender_counts, 'checkpoint') != state['matchup_key']:
+            raise ValueError(f"The ship types of the checkpoint '{path}' have changed since it was started.")
+    else:
+        if attacker_counts is None or defender_counts is None:
+            raise ValueError(f"There is no checkpoint '{path}' to resume, give the fleets to start a new run.")
+        if (iterations is None) == (precision is None):
+            raise ValueError("Give either a number of iterations or a precision.")
+        state = {
+            'version': CHECKPOINT_VERSION,
+            'engine_version': ENGINE_VERSION,
+            'matchup_key': matchup_key(attacker_counts, defender_counts, 'checkpoint'),
+            'attacker_counts': attacker_counts,
+            'defender_counts': defender_counts,
+            'iterations': iterations,
+            'precision': precision,
+            'confidence': confidence,
+            'max_iterations': max_iterations,
+            'chunk_size': chunk_size,
+            'seed': seed if seed is not None else int.from_bytes(os.urandom(8), 'big'),
+            'chunks': 0,
+            'finished': False,
+            'stats': CombatStats(attacker_counts, defender_counts),
+        }
+
+    load_ship_table()
+    stats = state['stats']
+    total = state['iterations'] if state['precision'] is None else state['max_iterations']
+    last_save = time.monotonic()
+    try:
+        with tqdm(total=total, initial=stats.iterations, disable=not progress or state['finished']) as progress_bar:
+            if not state['finished']:
+                for chunk_stats in iterate_chunks(attacker_counts, defender_counts,
+                                                  chunk_sizes(total - stats.iterations, state['chunk_size']),
+                                                  processes, state['seed'], first_chunk=state['chunks']):
+                    # The totals and the chunk count are replaced together, so a Ctrl+C at any point leaves the
+                    # finally below a state where they agree, and no chunk is counted twice on resume
+                    stats = CombatStats.from_dict(stats.to_dict()).merge(chunk_stats)
+                    state = dict(state, stats=stats, chunks=state['chunks'] + 1)
+                    progress_bar.update(chunk_stats.iterations)
+                    if state['precision'] is not None and stats.precise_enough(state['precision'],
+                                                                               state['confidence']):
+                        break
+                    if time.monotonic() - last_save >= checkpoint_interval:
+                        save_checkpoint(path, state)
+                        last_save = time.monotonic()
+                state['finished'] = True
+    finally:
+        save_checkpoint(path, state)
+    return stats
+
+
+def simulate_combat_checkpointed(args=None):
+    """ Console entry point to start, resume or look at a checkpointed simulation
+    :param args: Command line arguments, defaults to sys.argv
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Run long simulations that can be stopped and resumed.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    start = commands.add_parser('start', help="start a new run")
+    start.add_argument('checkpoint', help="checkpoint file to write")
+    start.add_argument('--attacker', type=json.loads, required=True, help='attacker fleet as JSON, e.g. {"Cruiser": 2}')
+    start.add_argument('--defender', type=json.loads, required=True, help="defender fleet as JSON")
+    amount = start.add_mutually_exclusive_group(required=True)
+    amount.add_argument('--iterations', type=int, help="number of battles")
+    amount.add_argument('--precision', type=float, help="target precision, e.g. 0.001 for +-0.1%%")
+    start.add_argument('--confidence', type=float, default=0.95, help="confidence level of the intervals")
+    start.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="battles per worker task")
+    start.add_argument('--max-iterations', type=int, default=DEFAULT_MAX_ITERATIONS,
+                       help="limit on battles for a precision")
+    start.add_argument('--seed', type=int, help="root seed of the dice")
+    resume = commands.add_parser('resume', help="continue a run from its checkpoint")
+    resume.add_argument('checkpoint', help="checkpoint file to continue from")
+    for command in (start, resume):
+        command.add_argument('--processes', type=int, help="worker processes, defaults to the number of CPUs")
+        command.add_argument('--interval', type=float, default=DEFAULT_CHECKPOINT_INTERVAL,
+                             help="seconds between checkpoints")
+    status = commands.add_parser('status', help="print the results so far, also while the run is going")
+    status.add_argument('checkpoint', help="checkpoint file to read")
+    options = parser.parse_args(args)
+
+    if options.command == 'status':
+        state = load_checkpoint(options.checkpoint)
+        stats = state['stats']
+    else:
+        if options.command == 'start':
+            if os.path.exists(options.checkpoint):
+                parser.error(f"'{options.checkpoint}' already exists, use resume to continue it.")
+            run = dict(attacker_counts=options.attacker, defender_counts=options.defender,
+                       iterations=options.iterations, precision=options.precision, confidence=options.confidence,
+                       chunk_size=options.chunk_size, max_iterations=options.max_iterations, seed=options.seed)
+        else:
+            if not os.path.exists(options.checkpoint):
+                parser.error(f"There is no checkpoint '{options.checkpoint}'.")
+            run = {}
+        try:
+            stats = run_combat_checkpointed(options.checkpoint, processes=options.processes,
+                                            checkpoint_interval=options.interval, **run)
+        except KeyboardInterrupt:
+            print(f"\nStopped, resume with: simulate_combat_checkpointed resume {options.checkpoint}")
+            return
+        state = load_checkpoint(options.checkpoint)
+
+    print(f"{'Finished' if state['finished'] else 'In progress'}: {stats.iterations} iterations "
+          f"({state['chunks']} chunks), last saved {state['updated']}")
+    print_results(stats.results())
+    print_intervals(stats, state['confidence'])
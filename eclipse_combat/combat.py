@@ -1,10 +1,21 @@
 import random
-from tqdm import tqdm
-from tqdm.contrib.concurrent import process_map
+from multiprocessing import Pool
+from functools import partial
 import itertools
-from .ship_types import SHIP_TYPES
+import bisect
+from .ship_types import get_ship_types
+from .ship_table import get_ship_table, load_ship_table, init_ship_table
+# Not used here, re-exported because these functions were defined in this module before the ship table existed
+from .ship_table import calculate_average_damage, calculate_average_damage_missile  # noqa: F401
+from .stats import CombatStats
+from .analysis import MatchupAnalysis
+from .rng import stream
+from .counters import CombatCounters
+from .distribution import OutcomeDistribution
 from timeit import default_timer as time
 
+# tqdm is imported by the functions that show a progress bar, so importing the package stays fast
+
 # Define Rift Cannon sides
 RIFT_CANNON_SIDES = {
     'Hit and Damage Self': {'damage_target': 3, 'damage_self': 1},
@@ -15,258 +26,344 @@ RIFT_CANNON_SIDES = {
     'Miss': {},
 }
 
+# Rift cannon sides a roll picks from
+RIFT_CANNON_SIDE_NAMES = list(RIFT_CANNON_SIDES)
+
+# Version of the simulation rules, bump it whenever a change alters simulation results so cached results are not reused
+ENGINE_VERSION = 3
+
+# Number of battles a worker simulates before sending its totals back to the parent process
+DEFAULT_CHUNK_SIZE = 2000
+
+# Upper limit on battles when running until a target precision is reached
+DEFAULT_MAX_ITERATIONS = 10 ** 7
+
+
+class Ship:
+    """ A ship in a battle. Only the hull changes during combat, everything else is read from the
+    ShipSpec shared by every ship of the same type.
+    """
+    __slots__ = ('spec', 'hull', 'is_defender', 'index', 'position', 'priority')
+
+    def __init__(self, spec, is_defender=False):
+        self.spec = spec
+        self.hull = spec.hull
+        self.is_defender = is_defender
+        self.index = 0
+        self.position = 0
+        self.priority = None
+
+
+# Function to rank a ships hull for a hit of the given damage:
+# hull == damage-1 first, then descending to 0, then ascending from damage
+def hull_priority(hull, damage):
+    return abs(hull - (damage - 1)), hull < damage, hull
+
+
+class TargetPriority:
+    """ The alive ships of one fleet bucketed by type and hull, so the highest priority target for a die
+    can be found without sorting the whole fleet. Picks the same target as sorting by threat level and
+    then by hull_priority would, as long as every hull change goes through damage_ship.
+    """
+
+    def __init__(self, fleet):
+        self.ships = fleet
+        self.specs = {}
+        # type_id -> {hull: sorted positions of the alive ships of that type with that hull}
+        self.buckets = {}
+        for position, ship in enumerate(fleet):
+            ship.position = position
+            ship.priority = self
+            self.specs[ship.spec.type_id] = ship.spec
+            self.buckets.setdefault(ship.spec.type_id, {}).setdefault(ship.hull, []).append(position)
+        # Types grouped by equal threat level, highest threat first, for each shield (and missile initiative)
+        self.threat_groups = {}
+
+    def update(self, ship, old_hull):
+        hulls = self.buckets[ship.spec.type_id]
+        if old_hull >= 0:
+            positions = hulls[old_hull]
+            positions.remove(ship.position)
+            if not positions:
+                del hulls[old_hull]
+        if ship.hull >= 0:
+            bisect.insort(hulls.setdefault(ship.hull, []), ship.position)
+
+    def groups(self, target_shield, missile_initiative=None):
+        key = (target_shield, missile_initiative)
+        if key not in self.threat_groups:
+            threats = []
+            for type_id, spec in self.specs.items():
+                if missile_initiative is not None and spec.initiative < missile_initiative:
+                    # Lower initiative ships will fire before the next missile, and are listed first
+                    threats.append((spec.missile_threat[target_shield], 0, type_id))
+                else:
+                    threats.append((spec.threat[target_shield], int(missile_initiative is not None), type_id))
+            threats.sort(key=lambda x: -x[0])
+            self.threat_groups[key] = [[(tie, type_id) for _, tie, type_id in group]
+                                       for _, group in itertools.groupby(threats, key=lambda x: x[0])]
+        return self.threat_groups[key]
+
+    def select(self, dice_roll, hit_threshold, damage, groups, counters=None):
+        for group in groups:
+            if counters is not None:
+                counters.candidates_scanned += len(group)
+            best = None
+            for tie, type_id in group:
+                hulls = self.buckets[type_id]
+                if not hulls or dice_roll < hit_threshold[self.specs[type_id].shield]:
+                    continue
+                hull = min(hulls, key=lambda h: hull_priority(h, damage))
+                key = (hull_priority(hull, damage), tie, hulls[hull][0])
+                if best is None or key < best:
+                    best = key
+            if best is not None:
+                return self.ships[best[2]]
+        return None
+
+    # Function to check whether any ship of the fleet is still alive
+    def alive(self):
+        return any(self.buckets.values())
+
+    def assign(self, dice_rolls, hit_threshold, damage, groups, counters=None):
+        """ Resolve all the rolls of one damage from one ship in a single pass, hitting the same targets as
+        selecting a target for each roll in turn would. Rolls too low to hit any type in the fleet are skipped
+        without a search, and the rolls left over once the fleet is destroyed are dropped.
+        :param dice_rolls: List of rolls, in the order they were rolled
+        :param hit_threshold: Lowest hitting roll of the firing ship for each shield
+        :param damage: Damage of each hit
+        :param groups: Threat groups of the fleet, from groups
+        :param counters: CombatCounters to count the target selections in, or None
+        :return: None
+        """
+        lowest = min(hit_threshold[spec.shield] for spec in self.specs.values())
+        for roll in dice_rolls:
+            if roll < lowest:
+                continue
+            if counters is not None:
+                counters.select_target_calls += 1
+            target = self.select(roll, hit_threshold, damage, groups, counters)
+            if target is not None:
+                damage_ship(target, damage)
+            elif not self.alive():
+                return
+
 
 # Function to create a fleet based on the number of each ship type
-def create_fleet(ship_counts):
+def create_fleet(ship_counts, is_defender=False, table=None):
+    if table is None:
+        table = get_ship_table()
     fleet = []
     for ship_type, count in ship_counts.items():
-        for _ in range(count):
-            ship = SHIP_TYPES[ship_type].copy()
-            ship['type'] = ship_type  # Add the 'type' key
-            fleet.append(ship)
+        spec = table.specs[table.index[ship_type]]
+        fleet.extend(Ship(spec, is_defender) for _ in range(count))
+    TargetPriority(fleet)
     return fleet
 
 
-# Function to calculate the average damage output of a ship
-def calculate_average_damage(ship, target_shield):
-    total_damage = 0
-    for damage, count in ship['dice'].items():
-        hit_chance = lambda ship_computer, shield: min(
-            max((1 / 6) + (ship_computer * (1 / 6)) - (shield * (1 / 6)), 1 / 6), 5 / 6)
-        total_damage += float(damage) * float(count) * hit_chance(ship['computer'], target_shield)  # Call hit_chance with arguments
-    rift = ship['rift_cannon']
-    total_damage += rift
-    return total_damage
-
-# Function to calculate the average damage output of a ship with missiles
-def calculate_average_damage_missile(ship, target_shield):
-    total_damage = 0
-    for damage, count in ship['dice'].items():
-        hit_chance = lambda ship_computer, shield: min(
-            max((1 / 6) + (ship_computer * (1 / 6)) - (shield * (1 / 6)), 1 / 6), 5 / 6)
-        total_damage += float(damage) * float(count) * hit_chance(ship['computer'], target_shield)  # Call hit_chance with arguments
-    for damage, count in ship['missiles'].items():
-        hit_chance = lambda ship_computer, shield: min(
-            max((1 / 6) + (ship_computer * (1 / 6)) - (shield * (1 / 6)), 1 / 6), 5 / 6)
-        total_damage += float(damage) * float(count) * hit_chance(ship['computer'], target_shield)  # Call hit_chance with arguments
-    rift = ship['rift_cannon']
-    total_damage += rift
-    return total_damage
-
-
-def select_target(fleet, dice_roll, attacking_ship, attacking_fleet, damage):
-    # Calculate threat levels for each ship
-    target_shield = max(ship['shield'] for ship in attacking_fleet)
-    threat_levels = [(calculate_average_damage(ship, target_shield), ship) for ship in fleet if ship['hull'] >= 0]
-
-    # Sort by threat level descending
-    threat_levels.sort(key=lambda x: -x[0])
-
-    # Sort targets within each threat level group based on the new prioritization rules
-    sorted_targets = []
-    for threat, group in itertools.groupby(threat_levels, key=lambda x: x[0]):
-        group = list(group)
-        # Sort group by hull criteria: hull == damage-1 first, then descending to 0, then ascending from damage
-        group.sort(key=lambda x: (abs(x[1]['hull'] - (damage - 1)), x[1]['hull'] < damage, x[1]['hull']))
-        sorted_targets.extend(group)
-
-    # Return the highest priority target that can be hit
-    for threat, ship in sorted_targets:
-        if (dice_roll + attacking_ship['computer'] - ship['shield'] >= 6 or dice_roll == 6):
-            return ship
-    return None
-
-
-def select_target_missile(fleet, dice_roll, attacking_ship, attacking_fleet, damage):
-    # Calculate target shield from the attacking fleet
-    target_shield = max(ship['shield'] for ship in attacking_fleet)
-
-    # Separate fleet into two groups based on initiative
-    lower_initiative_ships = [ship for ship in fleet if ship['initiative'] < attacking_ship['initiative']]
-    higher_initiative_ships = [ship for ship in fleet if ship['initiative'] >= attacking_ship['initiative']]
-
-    # Calculate threat levels for lower initiative ships
-    lower_threat_levels = [(calculate_average_damage_missile(ship, target_shield), ship) for ship in
-                           lower_initiative_ships if ship['hull'] >= 0]
-    # Calculate threat levels for higher initiative ships
-    higher_threat_levels = [(calculate_average_damage(ship, target_shield), ship) for ship in
-                            higher_initiative_ships if ship['hull'] >= 0]
-
-    # Combine threat levels
-    threat_levels = lower_threat_levels + higher_threat_levels
-
-    # Sort by threat level descending
-    threat_levels.sort(key=lambda x: -x[0])
-
-    # Sort targets within each threat level group based on the new prioritization rules
-    sorted_targets = []
-    for threat, group in itertools.groupby(threat_levels, key=lambda x: x[0]):
-        group = list(group)
-        # Sort group by hull criteria: hull == damage-1 first, then descending to 0, then ascending from damage
-        group.sort(key=lambda x: (abs(x[1]['hull'] - (damage - 1)), x[1]['hull'] < damage, x[1]['hull']))
-        sorted_targets.extend(group)
-
-    # Return the highest priority target that can be hit
-    for threat, ship in sorted_targets:
-        if (dice_roll + attacking_ship['computer'] - ship['shield'] >= 6 or dice_roll == 6):
-            return ship
-    return None
+# Function to damage a ship, keeping its fleets target priority up to date
+def damage_ship(ship, damage):
+    if damage:
+        old_hull = ship.hull
+        ship.hull -= damage
+        ship.priority.update(ship, old_hull)
+
+
+def select_target(fleet, dice_roll, attacking_ship, attacking_fleet, damage, counters=None):
+    if not fleet:
+        return None
+    if counters is not None:
+        counters.select_target_calls += 1
+    # Threat levels are calculated against the best shield in the attacking fleet
+    target_shield = max(ship.spec.shield for ship in attacking_fleet)
+    priority = fleet[0].priority
+    return priority.select(dice_roll, attacking_ship.spec.hit_threshold, damage, priority.groups(target_shield),
+                           counters)
+
+
+def select_target_missile(fleet, dice_roll, attacking_ship, attacking_fleet, damage, counters=None):
+    if not fleet:
+        return None
+    if counters is not None:
+        counters.select_target_calls += 1
+    # Ships with lower initiative than the missile ship are rated on their missiles too
+    target_shield = max(ship.spec.shield for ship in attacking_fleet)
+    priority = fleet[0].priority
+    return priority.select(dice_roll, attacking_ship.spec.hit_threshold, damage,
+                           priority.groups(target_shield, attacking_ship.spec.initiative), counters)
 
 
 # Function to determine the outcome of a single ship types dice rolls
-def rolls(ship):
+def rolls(ship, rng=random):
     results = {}
-    for damage, counts in ship['dice'].items():
-        results[damage] = []
+    for damage, counts in ship.spec.dice:
+        results.setdefault(damage, [])
         for _ in range(counts):
-            roll = random.randint(1, 6)
+            roll = rng.randint(1, 6)
             if roll != 1:
-                if damage == 4 and ship['antimatter_splitter']:
-                    results[1].extend([roll] * 4)
+                if damage == 4 and ship.spec.antimatter_splitter:
+                    results.setdefault(1, []).extend([roll] * 4)
                 else:
                     results[damage].append(roll)
     return results
 
 
-# Function to assign hits from a ship to the opposing fleet
-def assign_hits(ship, fleet, attacking_fleet):
-    dice = rolls(ship)
+# Function to assign hits from a ship to the opposing fleet, all the dice of one damage in one pass
+def assign_hits(ship, fleet, attacking_fleet, rng=random, counters=None):
+    dice = rolls(ship, rng)
+    if counters is not None:
+        counters.dice_rolled += sum(count for _, count in ship.spec.dice)
+    if not fleet or not any(dice.values()):
+        return
+    # Threat levels are calculated against the best shield in the attacking fleet, see select_target
+    target_shield = max(ally.spec.shield for ally in attacking_fleet)
+    priority = fleet[0].priority
+    groups = priority.groups(target_shield)
     for die in dice:
-        for roll in dice[die]:
-            if fleet is None:
-                continue
-            else:
-                target = select_target(fleet, roll, ship, attacking_fleet, int(die))
-                if target is not None:
-                    target['hull'] -= int(die)
+        priority.assign(dice[die], ship.spec.hit_threshold, int(die), groups, counters)
 
 
 # Function to determine the outcome of a single ship types rift cannon rolls
-def rolls_rift_cannon(ship):
+def rolls_rift_cannon(ship, rng=random):
     results = {side: 0 for side in RIFT_CANNON_SIDES}
-    for _ in range(ship['rift_cannon']):
-        side = random.choice(list(RIFT_CANNON_SIDES.keys()))
+    for _ in range(ship.spec.rift_cannon):
+        side = rng.choice(RIFT_CANNON_SIDE_NAMES)
         results[side] += 1
     return results
 
 
 # Function to assign rift cannon hits from a ship to the opposing fleet
-def assign_rift_cannon(ship, fleet, attacking_fleet):
-    dice = rolls_rift_cannon(ship)
-    attacking_ships_with_rift_cannons = sorted([s for s in attacking_fleet if s['rift_cannon'] > 0],
-                                               key=lambda s: s['hull'], reverse=True)
+def assign_rift_cannon(ship, fleet, attacking_fleet, rng=random, counters=None):
+    dice = rolls_rift_cannon(ship, rng)
+    if counters is not None:
+        counters.dice_rolled += ship.spec.rift_cannon
+    if not fleet or not ship.spec.rift_cannon:
+        return
+    attacking_ships_with_rift_cannons = sorted([s for s in attacking_fleet if s.spec.rift_cannon > 0],
+                                               key=lambda s: s.hull, reverse=True)
+    target_shield = max(ally.spec.shield for ally in attacking_fleet)
+    priority = fleet[0].priority
+    groups = priority.groups(target_shield)
 
     for side, count in dice.items():
+        damage_target = RIFT_CANNON_SIDES[side].get('damage_target', 0)
+        damage_self = RIFT_CANNON_SIDES[side].get('damage_self', 0)
         for _ in range(count):
-            if fleet is None:
-                continue
-
-            # Calculate the damage to target
-            damage_target = RIFT_CANNON_SIDES[side].get('damage_target', 0)
-
-            # Select the target considering the damage
-            target = select_target(fleet, 6, ship, attacking_fleet,
-                                   damage_target)  # Assuming a roll of 6 for the rift cannon
-
-            if target is not None:
-                # Apply damage to the target
-                if 'damage_target' in RIFT_CANNON_SIDES[side]:
-                    target['hull'] -= RIFT_CANNON_SIDES[side]['damage_target']
-
-                # Apply damage to the firing ship
-                if 'damage_self' in RIFT_CANNON_SIDES[side] and attacking_ships_with_rift_cannons:
-                    attacking_ships_with_rift_cannons[0]['hull'] -= RIFT_CANNON_SIDES[side]['damage_self']
+            # A rift cannon hits as a roll of 6 would, so any alive ship can be the target. Faces without damage
+            # to the target only need to know that there is one.
+            if damage_target:
+                if counters is not None:
+                    counters.select_target_calls += 1
+                target = priority.select(6, ship.spec.hit_threshold, damage_target, groups, counters)
+                if target is None:
+                    return
+                damage_ship(target, damage_target)
+            elif not priority.alive():
+                return
+
+            # Apply damage to the firing ship
+            if damage_self and attacking_ships_with_rift_cannons:
+                damage_ship(attacking_ships_with_rift_cannons[0], damage_self)
+                if counters is not None:
+                    counters.rift_self_damage += 1
 
 
 # Function to determine the outcome of a single ship types missile rolls
-def rolls_missiles(ship):
+def rolls_missiles(ship, rng=random):
     results = {}
-    for damage, counts in ship['missiles'].items():
+    for damage, counts in ship.spec.missiles:
         results[damage] = []
         for _ in range(counts):
-            roll = random.randint(1, 6)
+            roll = rng.randint(1, 6)
             if roll != 1:
                 results[damage].append(roll)
     return results
 
 
-# Function to assign missile hits from a ship to the opposing fleet
-def assign_missiles(ship, fleet, attacking_fleet):
-    dice = rolls_missiles(ship)
+# Function to assign missile hits from a ship to the opposing fleet, all the missiles of one damage in one pass
+def assign_missiles(ship, fleet, attacking_fleet, rng=random, counters=None):
+    dice = rolls_missiles(ship, rng)
+    if counters is not None:
+        counters.dice_rolled += sum(count for _, count in ship.spec.missiles)
+    if not fleet or not any(dice.values()):
+        return
+    # Ships with lower initiative than the missile ship are rated on their missiles too, see select_target_missile
+    target_shield = max(ally.spec.shield for ally in attacking_fleet)
+    priority = fleet[0].priority
+    groups = priority.groups(target_shield, ship.spec.initiative)
     for die in dice:
-        for roll in dice[die]:
-            if fleet is None:
-                continue
-            else:
-                target = select_target_missile(fleet, roll, ship, attacking_fleet, int(die))
-                if target is not None:
-                    target['hull'] -= int(die)
+        priority.assign(dice[die], ship.spec.hit_threshold, int(die), groups, counters)
 
 
-def simulate_combat_round(attacker, defender):
+def simulate_combat_round(attacker, defender, rng=random, counters=None):
     # Add an index to each ship for tie-breaking
     for idx, ship in enumerate(attacker):
-        ship['index'] = idx
+        ship.index = idx
     for idx, ship in enumerate(defender):
-        ship['index'] = idx + len(attacker)  # Ensure unique indices across both lists
+        ship.index = idx + len(attacker)  # Ensure unique indices across both lists
 
     # Sort ships by initiative, defender status, and index
-    all_ships = sorted(attacker + defender, key=lambda ship: (ship['initiative'], ship in defender, ship['index']),
+    all_ships = sorted(attacker + defender, key=lambda ship: (ship.spec.initiative, ship.is_defender, ship.index),
                        reverse=True)
 
     for ship in all_ships:
         # Check if all ships in either attacker or defender have hull <= -1
-        if all(ship['hull'] <= -1 for ship in attacker) or all(ship['hull'] <= -1 for ship in defender):
+        if all(ship.hull <= -1 for ship in attacker) or all(ship.hull <= -1 for ship in defender):
             break
 
-        if ship['hull'] < 0:
+        if ship.hull < 0:
             continue
 
-        if ship in attacker:
+        if not ship.is_defender:
             targets = [target for target in defender]
-            allies = [ally for ally in attacker if ally['hull'] >= 0]
-            assign_hits(ship, targets, allies)
-            assign_rift_cannon(ship, targets, allies)
+            allies = [ally for ally in attacker if ally.hull >= 0]
+            assign_hits(ship, targets, allies, rng, counters)
+            assign_rift_cannon(ship, targets, allies, rng, counters)
         else:
             targets = [target for target in attacker]
-            allies = [ally for ally in defender if ally['hull'] >= 0]
-            assign_hits(ship, targets, allies)
-            assign_rift_cannon(ship, targets, allies)
+            allies = [ally for ally in defender if ally.hull >= 0]
+            assign_hits(ship, targets, allies, rng, counters)
+            assign_rift_cannon(ship, targets, allies, rng, counters)
 
-    attacker = [ship for ship in attacker if ship['hull'] >= 0]
-    defender = [ship for ship in defender if ship['hull'] >= 0]
+    attacker = [ship for ship in attacker if ship.hull >= 0]
+    defender = [ship for ship in defender if ship.hull >= 0]
 
     return attacker, defender
 
 
 # Function to simulate the missile attacks
-def missile_attack(attacker, defender):
+def missile_attack(attacker, defender, rng=random, counters=None):
     # Add an index to each ship for tie-breaking
     for idx, ship in enumerate(attacker):
-        ship['index'] = idx
+        ship.index = idx
     for idx, ship in enumerate(defender):
-        ship['index'] = idx + len(attacker)  # Ensure unique indices across both lists
+        ship.index = idx + len(attacker)  # Ensure unique indices across both lists
 
     # Sort ships by initiative, defender status, and index
-    all_ships = sorted(attacker + defender, key=lambda ship: (ship['initiative'], ship in defender, ship['index']),
+    all_ships = sorted(attacker + defender, key=lambda ship: (ship.spec.initiative, ship.is_defender, ship.index),
                        reverse=True)
 
     for ship in all_ships:
         # Check if all ships in either attacker or defender have hull <= -1
-        if all(ship['hull'] <= -1 for ship in attacker) or all(ship['hull'] <= -1 for ship in defender):
+        if all(ship.hull <= -1 for ship in attacker) or all(ship.hull <= -1 for ship in defender):
             break
 
-        if ship['hull'] < 0:
+        if ship.hull < 0:
             continue
 
-        if ship in attacker:
+        if not ship.is_defender:
             targets = [target for target in defender]
-            allies = [ally for ally in attacker if ally['hull'] >= 0]
-            assign_missiles(ship, targets, allies)
+            allies = [ally for ally in attacker if ally.hull >= 0]
+            assign_missiles(ship, targets, allies, rng, counters)
         else:
             targets = [target for target in attacker]
-            allies = [ally for ally in defender if ally['hull'] >= 0]
-            assign_missiles(ship, targets, allies)
+            allies = [ally for ally in defender if ally.hull >= 0]
+            assign_missiles(ship, targets, allies, rng, counters)
+
+    attacker = [ship for ship in attacker if ship.hull >= 0]
+    defender = [ship for ship in defender if ship.hull >= 0]
+
+    return attacker, defender
 
 # Mapping of ship categories to their max counts
 SHIP_CATEGORY_LIMITS = {
@@ -279,22 +376,23 @@ SHIP_CATEGORY_LIMITS = {
 }
 
 def input_fleet(fleet_name):
+    ship_types = get_ship_types()
     fleet_counts = {}
     print(f"Input the {fleet_name} fleet:")
     while True:
         print("Available ship types:")
-        for index, ship_name in enumerate(SHIP_TYPES.keys(), start=1):
-            ship_type = SHIP_TYPES[ship_name]['type']
+        for index, ship_name in enumerate(ship_types.keys(), start=1):
+            ship_type = ship_types[ship_name]['type']
             max_count = SHIP_CATEGORY_LIMITS.get(ship_type, 0)
             print(f"{index}. {ship_name} (Category: {ship_type}, Max: {max_count})")
         choice = input("Enter the number of the ship type to add to the fleet (or leave blank to finish): ").strip()
         if not choice:
             break
-        if not choice.isdigit() or int(choice) < 1 or int(choice) > len(SHIP_TYPES):
+        if not choice.isdigit() or int(choice) < 1 or int(choice) > len(ship_types):
             print("Invalid choice. Please enter a valid number.")
             continue
-        ship_name = list(SHIP_TYPES.keys())[int(choice) - 1]
-        ship_type = SHIP_TYPES[ship_name]['type']
+        ship_name = list(ship_types.keys())[int(choice) - 1]
+        ship_type = ship_types[ship_name]['type']
         max_count = SHIP_CATEGORY_LIMITS.get(ship_type, 0)
         count = int(input(f"Enter the number of '{ship_name}' ships (max {max_count}): "))
         if count > max_count:
@@ -303,62 +401,110 @@ def input_fleet(fleet_name):
         fleet_counts[ship_name] = count
     return fleet_counts
 
+# Function to print the results dict returned by a simulation
+def print_results(results):
+    print(f"\nResults:\n{'-' * 20}")
+    print(f"Attacker win probability: {results['attacker_win_prob']}")
+    print(f"Defender win probability: {results['defender_win_prob']}")
+    if 'draw_prob' in results:
+        print(f"Draw probability: {results['draw_prob']}")
+    if results.get('stalemate_prob'):
+        print(f"Stalemate probability: {results['stalemate_prob']}")
+    print(f"\nAttacker survival average:")
+    for ship_type, avg in results['attacker_survival_avg'].items():
+        print(f"{ship_type}: {avg}")
+    print(f"\nDefender survival average:")
+    for ship_type, avg in results['defender_survival_avg'].items():
+        print(f"{ship_type}: {avg}")
+
+
+# Function to ask for either a number of iterations or a target precision such as 0.5%
+def input_iterations():
+    value = input("Enter the number of combat iterations (or a target precision such as 0.5%): ").strip()
+    if value.endswith('%'):
+        return None, float(value[:-1]) / 100
+    return int(value), None
+
+
+# Function to print the confidence intervals of the win probabilities
+def print_intervals(stats, confidence=0.95):
+    print(f"\n{confidence:.0%} confidence intervals after {stats.iterations} iterations:")
+    for side in ('attacker', 'defender'):
+        low, high = stats.win_prob_interval(side, confidence)
+        print(f"{side.capitalize()} win probability: {low:.4f} - {high:.4f}")
+
+
 def simulate_combat():
     print("Let's simulate a combat!")
 
     attacker_counts = input_fleet("attacker")
     defender_counts = input_fleet("defender")
 
-    iterations = int(input("Enter the number of combat iterations: "))
+    iterations, precision = input_iterations()
 
     start_time = time()
-    attacker_wins = 0
-    defender_wins = 0
-    attacker_survivors = {ship_type: [] for ship_type in attacker_counts}
-    defender_survivors = {ship_type: [] for ship_type in defender_counts}
+    if precision is None:
+        from tqdm import tqdm
+
+        load_ship_table()
+        stats = MatchupAnalysis(attacker_counts, defender_counts).outcome(iterations)
+        if stats is None:
+            stats = CombatStats(attacker_counts, defender_counts)
+            for i in tqdm(range(iterations)):
+                stats.add(*fight(attacker_counts, defender_counts))
+    else:
+        stats = run_combat_adaptive(attacker_counts, defender_counts, precision, processes=1)
+    end_time = time()
+    print(f"Simulated {stats.iterations} combat iterations in {end_time - start_time:.2f} seconds.")
 
-    for i in tqdm(range(iterations)):
-        attacker_fleet = create_fleet(attacker_counts)
-        defender_fleet = create_fleet(defender_counts)
+    print_results(stats.results())
+    if precision is not None:
+        print_intervals(stats)
 
-        missile_attack(attacker_fleet, defender_fleet)
 
-        while attacker_fleet and defender_fleet:
-            attacker_fleet, defender_fleet = simulate_combat_round(attacker_fleet, defender_fleet)
+# Function to check whether a ship in either fleet can still do damage in a combat round. A roll of 6 always hits,
+# so a battle ends as long as one can, and once none can it would go on forever and is stopped as a stalemate.
+def can_damage(attacker_fleet, defender_fleet):
+    return any(ship.spec.can_damage for ship in attacker_fleet) or any(ship.spec.can_damage for ship in defender_fleet)
 
-        if attacker_fleet and not defender_fleet:
-            attacker_wins += 1
-            for ship_type in attacker_counts:
-                attacker_survivors[ship_type].append(sum(ship['type'] == ship_type for ship in attacker_fleet))
 
-        if defender_fleet and not attacker_fleet:
-            defender_wins += 1
-            for ship_type in defender_counts:
-                defender_survivors[ship_type].append(sum(ship['type'] == ship_type for ship in defender_fleet))
-    end_time = time()
-    print(f"Simulated {iterations} combat iterations in {end_time - start_time:.2f} seconds.")
+# Function to fight one battle, returning the ships left in each fleet
+# Pass CombatCounters as counters to count and time the phases of the battle
+def fight(attacker_counts, defender_counts, rng=random, counters=None):
+    attacker_fleet, defender_fleet, _ = fight_rounds(attacker_counts, defender_counts, rng, counters)
+    return attacker_fleet, defender_fleet
 
-    attacker_survival_avg = {ship_type: sum(counts) / len(counts) if counts else 0 for ship_type, counts in
-                             attacker_survivors.items()}
-    defender_survival_avg = {ship_type: sum(counts) / len(counts) if counts else 0 for ship_type, counts in
-                             defender_survivors.items()}
 
-    results = {
-        'attacker_win_prob': attacker_wins / iterations,
-        'defender_win_prob': defender_wins / iterations,
-        'attacker_survival_avg': attacker_survival_avg,
-        'defender_survival_avg': defender_survival_avg
-    }
+# Function to fight one battle, returning the ships left in each fleet and the rounds fought after the missile phase
+def fight_rounds(attacker_counts, defender_counts, rng=random, counters=None):
+    attacker_fleet = create_fleet(attacker_counts)
+    defender_fleet = create_fleet(defender_counts, is_defender=True)
 
-    print(f"\nResults:\n{'-' * 20}")
-    print(f"Attacker win probability: {results['attacker_win_prob']}")
-    print(f"Defender win probability: {results['defender_win_prob']}")
-    print(f"\nAttacker survival average:")
-    for ship_type, avg in results['attacker_survival_avg'].items():
-        print(f"{ship_type}: {avg}")
-    print(f"\nDefender survival average:")
-    for ship_type, avg in results['defender_survival_avg'].items():
-        print(f"{ship_type}: {avg}")
+    if counters is None:
+        attacker_fleet, defender_fleet = missile_attack(attacker_fleet, defender_fleet, rng)
+
+        rounds = 0
+        while attacker_fleet and defender_fleet and can_damage(attacker_fleet, defender_fleet):
+            attacker_fleet, defender_fleet = simulate_combat_round(attacker_fleet, defender_fleet, rng)
+            rounds += 1
+
+        return attacker_fleet, defender_fleet, rounds
+
+    start_time = time()
+    attacker_fleet, defender_fleet = missile_attack(attacker_fleet, defender_fleet, rng, counters)
+    counters.missile_phases += 1
+    counters.missile_seconds += time() - start_time
+
+    rounds = 0
+    while attacker_fleet and defender_fleet and can_damage(attacker_fleet, defender_fleet):
+        start_time = time()
+        attacker_fleet, defender_fleet = simulate_combat_round(attacker_fleet, defender_fleet, rng, counters)
+        counters.round_seconds += time() - start_time
+        rounds += 1
+    counters.rounds += rounds
+    counters.add_battle(rounds)
+
+    return attacker_fleet, defender_fleet, rounds
 
 
 def simulate_combat_iteration(attacker_counts, defender_counts):
@@ -368,31 +514,165 @@ def simulate_combat_iteration(attacker_counts, defender_counts):
     :return: Tuple of attacker wins, defender wins, attacker survivors, defender survivors
 
     """
-    attacker_fleet = create_fleet(attacker_counts)
-    defender_fleet = create_fleet(defender_counts)
+    attacker_fleet, defender_fleet = fight(attacker_counts, defender_counts)
 
     attacker_wins = 0
     defender_wins = 0
     attacker_survivors = {ship_type: [] for ship_type in attacker_counts}
     defender_survivors = {ship_type: [] for ship_type in defender_counts}
 
-    missile_attack(attacker_fleet, defender_fleet)
-
-    while attacker_fleet and defender_fleet:
-        attacker_fleet, defender_fleet = simulate_combat_round(attacker_fleet, defender_fleet)
-
     if attacker_fleet and not defender_fleet:
         attacker_wins += 1
         for ship_type in attacker_counts:
-            attacker_survivors[ship_type].append(sum(ship['type'] == ship_type for ship in attacker_fleet))
+            attacker_survivors[ship_type].append(sum(ship.spec.name == ship_type for ship in attacker_fleet))
 
     if defender_fleet and not attacker_fleet:
         defender_wins += 1
         for ship_type in defender_counts:
-            defender_survivors[ship_type].append(sum(ship['type'] == ship_type for ship in defender_fleet))
+            defender_survivors[ship_type].append(sum(ship.spec.name == ship_type for ship in defender_fleet))
 
     return attacker_wins, defender_wins, attacker_survivors, defender_survivors
 
+
+def simulate_combat_chunk(attacker_counts, defender_counts, iterations, rng=random, instrument=False,
+                          distribution=False):
+    """ Simulate a chunk of battles and reduce them to running totals
+    :param attacker_counts: Dictionary of ship types and their counts for the attacker
+    :param defender_counts: Dictionary of ship types and their counts for the defender
+    :param iterations: Number of battles to simulate
+    :param rng: Random generator the dice are rolled with, defaults to the global random module
+    :param instrument: Collect CombatCounters in stats.counters
+    :param distribution: Collect the OutcomeDistribution of the battles in stats.distribution
+    :return: CombatStats of the chunk
+    """
+    if not instrument and not distribution:
+        stats = MatchupAnalysis(attacker_counts, defender_counts).outcome(iterations)
+        if stats is not None:
+            return stats
+    stats = CombatStats(attacker_counts, defender_counts)
+    if instrument:
+        stats.counters = CombatCounters()
+    if not distribution:
+        for _ in range(iterations):
+            stats.add(*fight(attacker_counts, defender_counts, rng, stats.counters))
+        return stats
+    stats.distribution = OutcomeDistribution(attacker_counts, defender_counts)
+    for _ in range(iterations):
+        attacker_fleet, defender_fleet, rounds = fight_rounds(attacker_counts, defender_counts, rng, stats.counters)
+        stats.add(attacker_fleet, defender_fleet)
+        stats.distribution.add(attacker_fleet, defender_fleet, rounds)
+    return stats
+
+
+# Function to simulate the chunk with the given index on its own random stream derived from seed
+def simulate_seeded_chunk(attacker_counts, defender_counts, seed, instrument, distribution, chunk):
+    chunk_index, iterations = chunk
+    return simulate_combat_chunk(attacker_counts, defender_counts, iterations, stream(seed, chunk_index), instrument,
+                                 distribution)
+
+
+# Function to split a number of iterations into chunks of at most chunk_size
+def chunk_sizes(iterations, chunk_size):
+    while iterations > 0:
+        size = min(chunk_size, iterations)
+        iterations -= size
+        yield size
+
+
+# Matchup of the current run in a worker process, published once per run by init_worker
+_worker_run = None
+
+
+# Function to set up a worker process for a run, so its tasks only need a chunk index and size
+def init_worker(specs, attacker_counts, defender_counts, seed, instrument, distribution):
+    global _worker_run
+    init_ship_table(specs)
+    _worker_run = (attacker_counts, defender_counts, seed, instrument, distribution)
+
+
+# Function to simulate a chunk of the run set up by init_worker
+def simulate_worker_chunk(chunk):
+    return simulate_seeded_chunk(*_worker_run, chunk)
+
+
+# Function to simulate chunks of battles, yielding the totals of each chunk in chunk order.
+# Every chunk rolls its dice from its own stream derived from seed, so the same seed and chunk sizes give the same
+# totals whether the chunks run in this process (processes is 1) or over a worker pool.
+# The pool is closed once the caller stops. first_chunk is the index of the first chunk, to continue a run.
+# Matchups decided before a die is rolled are answered here without starting a pool.
+def iterate_chunks(attacker_counts, defender_counts, sizes, processes=None, seed=None, instrument=False,
+                   first_chunk=0, distribution=False):
+    analysis = MatchupAnalysis(attacker_counts, defender_counts)
+    if analysis.winner is not None and not instrument and not distribution:
+        yield from map(analysis.outcome, sizes)
+        return
+    if processes == 1:
+        worker = partial(simulate_seeded_chunk, attacker_counts, defender_counts, seed, instrument, distribution)
+        yield from map(worker, enumerate(sizes, first_chunk))
+        return
+    initargs = (get_ship_table().specs, attacker_counts, defender_counts, seed, instrument, distribution)
+    with Pool(processes, initializer=init_worker, initargs=initargs) as pool:
+        yield from pool.imap(simulate_worker_chunk, enumerate(sizes, first_chunk))
+
+
+def run_combat_parallel(attacker_counts, defender_counts, iterations, chunk_size=DEFAULT_CHUNK_SIZE,
+                        processes=None, progress=True, seed=None, instrument=False, distribution=False):
+    """ Simulate battles over a pool of worker processes. Each worker reduces a whole chunk of battles to a
+    CombatStats, and the chunks are merged as they finish, so memory does not grow with iterations.
+    :param attacker_counts: Dictionary of ship types and their counts for the attacker
+    :param defender_counts: Dictionary of ship types and their counts for the defender
+    :param iterations: Number of battles to simulate
+    :param chunk_size: Number of battles each worker simulates before sending back its totals
+    :param processes: Number of worker processes, defaults to the number of CPUs
+    :param progress: Show a progress bar
+    :param seed: Root seed, the same seed and chunk_size give the same results for any number of processes
+    :param instrument: Count and time the phases of every battle in stats.counters
+    :param distribution: Collect the OutcomeDistribution of the battles in stats.distribution
+    :return: CombatStats of all the battles
+    """
+    from tqdm import tqdm
+
+    load_ship_table()
+    stats = CombatStats(attacker_counts, defender_counts)
+    with tqdm(total=iterations, disable=not progress) as progress_bar:
+        for chunk_stats in iterate_chunks(attacker_counts, defender_counts, chunk_sizes(iterations, chunk_size),
+                                          processes, seed, instrument, distribution=distribution):
+            stats.merge(chunk_stats)
+            progress_bar.update(chunk_stats.iterations)
+    return stats
+
+
+def run_combat_adaptive(attacker_counts, defender_counts, precision, confidence=0.95, chunk_size=DEFAULT_CHUNK_SIZE,
+                        max_iterations=DEFAULT_MAX_ITERATIONS, processes=None, progress=True, seed=None,
+                        instrument=False, distribution=False):
+    """ Simulate battles in chunks until both win probabilities are known to within +-precision
+    :param attacker_counts: Dictionary of ship types and their counts for the attacker
+    :param defender_counts: Dictionary of ship types and their counts for the defender
+    :param precision: Target half width of the confidence intervals, e.g. 0.005 for +-0.5%
+    :param confidence: Confidence level of the intervals
+    :param chunk_size: Number of battles simulated between precision checks (per worker)
+    :param max_iterations: Stop after this many battles even if the precision has not been reached
+    :param processes: Number of worker processes, defaults to the number of CPUs, 1 runs in this process
+    :param progress: Show a progress bar
+    :param seed: Root seed, the same seed and chunk_size give the same results for any number of processes
+    :param instrument: Count and time the phases of every battle in stats.counters
+    :param distribution: Collect the OutcomeDistribution of the battles in stats.distribution
+    :return: CombatStats of the battles simulated, use win_prob_interval for the achieved intervals
+    """
+    from tqdm import tqdm
+
+    load_ship_table()
+    stats = CombatStats(attacker_counts, defender_counts)
+    with tqdm(disable=not progress, unit='it') as progress_bar:
+        for chunk_stats in iterate_chunks(attacker_counts, defender_counts, chunk_sizes(max_iterations, chunk_size),
+                                          processes, seed, instrument, distribution=distribution):
+            stats.merge(chunk_stats)
+            progress_bar.update(chunk_stats.iterations)
+            if stats.precise_enough(precision, confidence):
+                break
+    return stats
+
+
 def simulate_combat_parallel():
     """ Simulate a battle in parallel.
     :return: None
@@ -402,38 +682,14 @@ def simulate_combat_parallel():
     attacker_counts = input_fleet("attacker")
     defender_counts = input_fleet("defender")
     start_time = time()
-    iterations = int(input("Enter the number of combat iterations: "))
-
-    attacker_survivors = {ship_type: [] for ship_type in attacker_counts}
-    defender_survivors = {ship_type: [] for ship_type in defender_counts}
+    iterations, precision = input_iterations()
 
-    results = process_map(simulate_combat_iteration, [attacker_counts] * iterations, [defender_counts] * iterations, chunksize=200)
+    if precision is None:
+        stats = run_combat_parallel(attacker_counts, defender_counts, iterations)
+    else:
+        stats = run_combat_adaptive(attacker_counts, defender_counts, precision)
     end_time = time()
-    print(f"Simulated {iterations} combat iterations in {end_time - start_time:.2f} seconds.")
-    attacker_wins = sum(result[0] for result in results)
-    defender_wins = sum(result[1] for result in results)
-    for result in results:
-        for ship_type in attacker_counts:
-            attacker_survivors[ship_type].extend(result[2][ship_type])
-        for ship_type in defender_counts:
-            defender_survivors[ship_type].extend(result[3][ship_type])
-
-    attacker_survival_avg = {ship_type: sum(counts) / len(counts) if counts else 0 for ship_type, counts in
-                                attacker_survivors.items()}
-    defender_survival_avg = {ship_type: sum(counts) / len(counts) if counts else 0 for ship_type, counts in
-                                defender_survivors.items()}
-    final_results = {
-        'attacker_win_prob': attacker_wins / iterations,
-        'defender_win_prob': defender_wins / iterations,
-        'attacker_survival_avg': attacker_survival_avg,
-        'defender_survival_avg': defender_survival_avg
-    }
-    print(f"\nResults:\n{'-' * 20}")
-    print(f"Attacker win probability: {final_results['attacker_win_prob']}")
-    print(f"Defender win probability: {final_results['defender_win_prob']}")
-    print(f"\nAttacker survival average:")
-    for ship_type, avg in final_results['attacker_survival_avg'].items():
-        print(f"{ship_type}: {avg}")
-    print(f"\nDefender survival average:")
-    for ship_type, avg in final_results['defender_survival_avg'].items():
-        print(f"{ship_type}: {avg}")
+    print(f"Simulated {stats.iterations} combat iterations in {end_time - start_time:.2f} seconds.")
+    print_results(stats.results())
+    if precision is not None:
+        print_intervals(stats)
@@ -0,0 +1,142 @@
+import random
+from math import ceil, sqrt
+from statistics import NormalDist
+from multiprocessing import Pool
+from functools import partial
+from .combat import DEFAULT_CHUNK_SIZE, chunk_sizes, fight
+from .ship_table import init_ship_table, load_ship_table
+from .stats import CombatStats, winner
+from .rng import AntitheticRandom, derive_seed
+
+VARIANTS = ('a', 'b')
+
+
+class PairedComparison:
+    """ Mergeable totals of a paired comparison between two variants of a matchup.
+
+    Every sample fights variant A and variant B on the same dice stream (and on its mirror image with antithetic
+    dice), and records the difference in how often side won. Both variants see the same luck, so the differences
+    vary far less than two independent runs would, and fewer samples are needed for a clear answer.
+    """
+
+    def __init__(self, variant_a, variant_b, side='attacker'):
+        self.variants = {'a': variant_a, 'b': variant_b}
+        self.side = side
+        self.stats = {name: CombatStats(*variant) for name, variant in self.variants.items()}
+        self.samples = 0
+        self.difference_sum = 0
+        self.difference_sum_sq = 0
+
+    # Function to record one sample from the share of its battles side won with each variant
+    def add(self, won_a, won_b):
+        difference = won_a - won_b
+        self.samples += 1
+        self.difference_sum += difference
+        self.difference_sum_sq += difference * difference
+
+    # Function to add the totals of another PairedComparison of the same variants into this one
+    def merge(self, other):
+        self.samples += other.samples
+        self.difference_sum += other.difference_sum
+        self.difference_sum_sq += other.difference_sum_sq
+        for name in VARIANTS:
+            self.stats[name].merge(other.stats[name])
+        return self
+
+    # Function to calculate the win probability of side with variant A minus the one with variant B
+    def difference(self):
+        return self.difference_sum / self.samples if self.samples else 0
+
+    def _variance(self):
+        if self.samples < 2:
+            return 0.25
+        mean = self.difference()
+        return max(self.difference_sum_sq - self.samples * mean * mean, 0) / (self.samples - 1)
+
+    # Function to calculate the confidence interval of the difference from the spread of the paired samples
+    def difference_interval(self, confidence=0.95):
+        if not self.samples:
+            return -1.0, 1.0
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        half_width = z * sqrt(self._variance() / self.samples)
+        return max(self.difference() - half_width, -1.0), min(self.difference() + half_width, 1.0)
+
+    # Function to estimate how many times more battles two independent runs would need for the same interval
+    def variance_reduction(self):
+        variance = self._variance()
+        battles = self.stats['a'].iterations
+        if not battles or not variance:
+            return float('inf')
+        independent = sum(stats.win_prob(self.side) * (1 - stats.win_prob(self.side)) for stats in self.stats.values())
+        return (independent / battles) / (variance / self.samples)
+
+    # Function to build a results dict with the difference and the results of both variants
+    def results(self, confidence=0.95):
+        return {
+            'side': self.side,
+            'difference': self.difference(),
+            'difference_interval': self.difference_interval(confidence),
+            'variance_reduction': self.variance_reduction(),
+            'a': self.stats['a'].results(),
+            'b': self.stats['b'].results(),
+        }
+
+
+# Function to fight a chunk of paired samples, each on its own dice stream drawn from the chunk's stream
+def compare_chunk(variant_a, variant_b, side, antithetic, seed, chunk):
+    chunk_index, samples = chunk
+    rng = random.Random(None if seed is None else derive_seed(seed, chunk_index))
+    comparison = PairedComparison(variant_a, variant_b, side)
+    for _ in range(samples):
+        battle_seed = rng.getrandbits(64)
+        won = {}
+        for name in VARIANTS:
+            dice_streams = [random.Random(battle_seed)]
+            if antithetic:
+                dice_streams.append(AntitheticRandom(random.Random(battle_seed)))
+            won[name] = 0
+            for dice in dice_streams:
+                fleets = fight(*comparison.variants[name], dice)
+                comparison.stats[name].add(*fleets)
+                won[name] += winner(*fleets) == side
+            won[name] /= len(dice_streams)
+        comparison.add(won['a'], won['b'])
+    return comparison
+
+
+# Function to run the chunks in this process when processes is 1, otherwise over a worker pool, in chunk order
+def _map_chunks(worker, chunks, processes, table):
+    if processes == 1:
+        yield from map(worker, chunks)
+        return
+    with Pool(processes, initializer=init_ship_table, initargs=(table.specs,)) as pool:
+        yield from pool.imap(worker, chunks)
+
+
+def compare_variants(variant_a, variant_b, iterations, side='attacker', antithetic=False,
+                     chunk_size=DEFAULT_CHUNK_SIZE, processes=None, progress=True, seed=None):
+    """ Compare two variants of a matchup on common random numbers, e.g. a Cruiser blueprint with +1 computer
+    against one with +1 shield, each saved as its own ship type
+    :param variant_a: Tuple of attacker counts and defender counts of variant A
+    :param variant_b: Tuple of attacker counts and defender counts of variant B
+    :param iterations: Number of battles to simulate per variant
+    :param side: Side whose win probability is compared, 'attacker' or 'defender'
+    :param antithetic: Also fight every dice stream mirrored (7 - d), half as many streams are used
+    :param chunk_size: Number of samples each worker simulates before sending back its totals
+    :param processes: Number of worker processes, defaults to the number of CPUs, 1 runs in this process
+    :param progress: Show a progress bar
+    :param seed: Root seed, the same seed and chunk_size give the same results for any number of processes
+    :return: PairedComparison, use difference_interval for the confidence interval of the difference
+    """
+    from tqdm import tqdm
+
+    table = load_ship_table()
+    samples = ceil(iterations / 2) if antithetic else iterations
+    worker = partial(compare_chunk, variant_a, variant_b, side, antithetic, seed)
+    chunks = enumerate(chunk_sizes(samples, chunk_size))
+    comparison = PairedComparison(variant_a, variant_b, side)
+    with tqdm(total=samples, disable=not progress) as progress_bar:
+        for chunk in _map_chunks(worker, chunks, processes, table):
+            comparison.merge(chunk)
+            progress_bar.update(chunk.samples)
+    return comparison
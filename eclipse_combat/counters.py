@@ -0,0 +1,64 @@
+class CombatCounters:
+    """ Opt-in counters and timers of where the simulation spends its time. The engine only touches them when
+    one is passed in, so a simulation without counters pays nothing but a None check.
+
+    Like CombatStats the totals are plain numbers, so the counters of every worker can be merged in the parent.
+    rounds_histogram[n] is the number of battles that lasted n rounds after the missile phase.
+    """
+
+    FIELDS = ('battles', 'missile_phases', 'missile_seconds', 'rounds', 'round_seconds', 'select_target_calls',
+              'candidates_scanned', 'dice_rolled', 'rift_self_damage')
+
+    def __init__(self):
+        for field in self.FIELDS:
+            setattr(self, field, 0)
+        self.rounds_histogram = []
+
+    # Function to record the number of rounds of a finished battle
+    def add_battle(self, rounds):
+        self.battles += 1
+        if rounds >= len(self.rounds_histogram):
+            self.rounds_histogram.extend([0] * (rounds + 1 - len(self.rounds_histogram)))
+        self.rounds_histogram[rounds] += 1
+
+    # Function to add the totals of other counters into these
+    def merge(self, other):
+        for field in self.FIELDS:
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+        if len(other.rounds_histogram) > len(self.rounds_histogram):
+            self.rounds_histogram.extend([0] * (len(other.rounds_histogram) - len(self.rounds_histogram)))
+        for rounds, battles in enumerate(other.rounds_histogram):
+            self.rounds_histogram[rounds] += battles
+        return self
+
+    def to_dict(self):
+        data = {field: getattr(self, field) for field in self.FIELDS}
+        data['rounds_histogram'] = list(self.rounds_histogram)
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        counters = cls()
+        for field in cls.FIELDS:
+            setattr(counters, field, data[field])
+        counters.rounds_histogram = list(data['rounds_histogram'])
+        return counters
+
+
+# Function to print counters with the averages per battle and per round
+def print_counters(counters):
+    battles = counters.battles or 1
+    rounds = counters.rounds or 1
+    calls = counters.select_target_calls or 1
+    print(f"\nCounters over {counters.battles} battles:\n{'-' * 20}")
+    print(f"Missile phase: {counters.missile_seconds:.3f} s ({counters.missile_seconds / battles * 1e6:.1f} us per battle)")
+    print(f"Rounds: {counters.rounds} in {counters.round_seconds:.3f} s "
+          f"({counters.rounds / battles:.2f} per battle, {counters.round_seconds / rounds * 1e6:.1f} us per round)")
+    print(f"Target selections: {counters.select_target_calls} "
+          f"({counters.candidates_scanned / calls:.2f} candidates scanned per call)")
+    print(f"Dice rolled: {counters.dice_rolled} ({counters.dice_rolled / battles:.1f} per battle)")
+    print(f"Rift cannon self damage: {counters.rift_self_damage}")
+    print("Rounds per battle:")
+    for rounds, frequency in enumerate(counters.rounds_histogram):
+        if frequency:
+            print(f"{rounds:>4}: {frequency}")
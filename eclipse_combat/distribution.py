@@ -0,0 +1,154 @@
+from .ship_table import get_ship_table
+
+# Rounds tracked one by one, longer battles share the last bin of the rounds histogram
+DEFAULT_MAX_ROUNDS = 50
+
+
+class OutcomeDistribution:
+    """ Mergeable histograms of the full outcome of battles, in lists whose size is fixed by the matchup when it is
+    created, so recording a battle only increments a few counts.
+
+    For each side:
+    survivors[side] is a joint histogram of the surviving ships of every type, in every battle, not only the ones
+        the side won. The index of a battle is its survivor counts written in mixed radix, in the order of the ship
+        types in the fleet counts, see survivor_distribution.
+    hit_points[side] is a histogram of the damage the surviving ships could still take (hull + 1 for each ship).
+
+    rounds is a histogram of the rounds fought after the missile phase, the last bin counts max_rounds or more.
+    Battles that nobody wins are draws when both fleets are destroyed and stalemates when neither fleet can damage
+    the other any more, the same split CombatStats and the exact engine report as draw_prob and stalemate_prob.
+    """
+
+    def __init__(self, attacker_counts, defender_counts, max_rounds=DEFAULT_MAX_ROUNDS, max_hit_points=None):
+        self.counts = {'attacker': dict(attacker_counts), 'defender': dict(defender_counts)}
+        if max_hit_points is None:
+            table = get_ship_table()
+            max_hit_points = {side: sum(count * (table.specs[table.index[ship_type]].hull + 1)
+                                        for ship_type, count in counts.items())
+                              for side, counts in self.counts.items()}
+        self.max_rounds = max_rounds
+        self.iterations = 0
+        self.wins = {side: 0 for side in self.counts}
+        self.draws = 0
+        self.stalemates = 0
+        # Amount one surviving ship of each type adds to the joint survivor index of its side
+        self.strides = {}
+        self.survivors = {}
+        self.hit_points = {}
+        for side, counts in self.counts.items():
+            stride = 1
+            self.strides[side] = {}
+            for ship_type, count in counts.items():
+                self.strides[side][ship_type] = stride
+                stride *= count + 1
+            self.survivors[side] = [0] * stride
+            self.hit_points[side] = [0] * (max_hit_points[side] + 1)
+        self.rounds = [0] * (max_rounds + 1)
+
+    # Function to record one finished battle from the ships left in each fleet and the rounds it lasted
+    def add(self, attacker_fleet, defender_fleet, rounds):
+        self.iterations += 1
+        for side, fleet in (('attacker', attacker_fleet), ('defender', defender_fleet)):
+            strides = self.strides[side]
+            index = 0
+            hit_points = 0
+            for ship in fleet:
+                index += strides[ship.spec.name]
+                hit_points += ship.hull + 1
+            self.survivors[side][index] += 1
+            self.hit_points[side][hit_points] += 1
+        self.rounds[min(rounds, self.max_rounds)] += 1
+        if attacker_fleet and defender_fleet:
+            self.stalemates += 1
+        elif attacker_fleet:
+            self.wins['attacker'] += 1
+        elif defender_fleet:
+            self.wins['defender'] += 1
+        else:
+            self.draws += 1
+
+    # Function to add the histograms of another OutcomeDistribution of the same matchup into this one
+    def merge(self, other):
+        self.iterations += other.iterations
+        self.draws += other.draws
+        self.stalemates += other.stalemates
+        for side in self.counts:
+            self.wins[side] += other.wins[side]
+            for index, frequency in enumerate(other.survivors[side]):
+                self.survivors[side][index] += frequency
+            for points, frequency in enumerate(other.hit_points[side]):
+                self.hit_points[side][points] += frequency
+        for rounds, frequency in enumerate(other.rounds):
+            self.rounds[rounds] += frequency
+        return self
+
+    def win_prob(self, side):
+        return self.wins[side] / self.iterations if self.iterations else 0
+
+    # Function to calculate the chance that both fleets are destroyed
+    def draw_prob(self):
+        return self.draws / self.iterations if self.iterations else 0
+
+    # Function to calculate the chance that both fleets are left with nothing that can damage the other
+    def stalemate_prob(self):
+        return self.stalemates / self.iterations if self.iterations else 0
+
+    def survivor_distribution(self, side):
+        """ Probability of every combination of surviving ships of side that occurred
+        :param side: 'attacker' or 'defender'
+        :return: Dict of tuples of survivor counts, in the order of the ship types in the fleet counts,
+                 to their probability
+        """
+        distribution = {}
+        for index, frequency in enumerate(self.survivors[side]):
+            if not frequency:
+                continue
+            survivors = []
+            for count in self.counts[side].values():
+                index, survived = divmod(index, count + 1)
+                survivors.append(survived)
+            distribution[tuple(survivors)] = frequency / self.iterations
+        return distribution
+
+    def hit_points_distribution(self, side):
+        return [frequency / self.iterations if self.iterations else 0 for frequency in self.hit_points[side]]
+
+    def rounds_distribution(self):
+        return [frequency / self.iterations if self.iterations else 0 for frequency in self.rounds]
+
+    def expected_value(self, side, value):
+        """ Expected value of a function of the surviving ships of side, e.g. the cost of the surviving fleet
+        :param side: 'attacker' or 'defender'
+        :param value: Function taking a dict of ship types to survivor counts and returning a number
+        :return: Expected value over all battles
+        """
+        ship_types = list(self.counts[side])
+        return sum(probability * value(dict(zip(ship_types, survivors)))
+                   for survivors, probability in self.survivor_distribution(side).items())
+
+    # Function to convert the histograms to plain JSON friendly data
+    def to_dict(self):
+        return {
+            'attacker_counts': self.counts['attacker'],
+            'defender_counts': self.counts['defender'],
+            'iterations': self.iterations,
+            'wins': self.wins,
+            'draws': self.draws,
+            'stalemates': self.stalemates,
+            'survivors': self.survivors,
+            'hit_points': self.hit_points,
+            'rounds': self.rounds,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        max_hit_points = {side: len(histogram) - 1 for side, histogram in data['hit_points'].items()}
+        distribution = cls(data['attacker_counts'], data['defender_counts'], len(data['rounds']) - 1, max_hit_points)
+        distribution.iterations = data['iterations']
+        distribution.wins = dict(data['wins'])
+        distribution.draws = data['draws']
+        distribution.stalemates = data['stalemates']
+        distribution.survivors = {side: list(histogram) for side, histogram in data['survivors'].items()}
+        distribution.hit_points = {side: list(histogram) for side, histogram in data['hit_points'].items()}
+        distribution.rounds = list(data['rounds'])
+        return distribution
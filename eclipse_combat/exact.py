@@ -0,0 +1,263 @@
+import heapq
+import itertools
+from math import factorial
+from timeit import default_timer as time
+from .combat import input_fleet, print_results
+from .vectorized import FleetLayout, RIFT_SIDES, RIFT_DAMAGE_TARGET, RIFT_DAMAGE_SELF
+
+
+class ExactSolver:
+    """ Exact combat outcome solver. Fleet hull states form a Markov chain where every round can only
+    remove hull, so the outcome distribution is found by pushing probability mass from the starting
+    state down to the states where one side has been destroyed.
+
+    Ships of the same type without rift cannons are interchangeable, so their hulls are kept sorted
+    which keeps the number of states small. Rift cannon ships are kept in place because which of them
+    takes the self damage depends on their position in the fleet.
+    """
+
+    def __init__(self, attacker_counts, defender_counts):
+        layout = FleetLayout(attacker_counts, defender_counts)
+        self.layout = layout
+        self.side = layout.side.tolist()
+        self.hit_threshold = layout.hit_threshold.tolist()
+        self.shield = layout.shield.tolist()
+        self.rift_cannon = layout.rift_cannon.tolist()
+        self.slots = [slots.tolist() for slots in layout.slots]
+        self.shield_values = [values.tolist() for values in layout.shield_values]
+        self.ranks = [ranks.tolist() for ranks in layout.ranks]
+        self.missile_ranks = {slot: ranks.tolist() for slot, ranks in layout.missile_ranks.items()}
+        self.missile_ties = {slot: ties.tolist() for slot, ties in layout.missile_ties.items()}
+
+        # Runs of identical ships whose order in the fleet does not matter
+        self.blocks = []
+        start = 0
+        for end in range(1, layout.size + 1):
+            if end == layout.size or (layout.names[end], self.side[end]) != (layout.names[start], self.side[start]):
+                if self.rift_cannon[start] == 0 and end - start > 1:
+                    self.blocks.append((start, end))
+                start = end
+
+        # Round transitions already worked out, keyed by the state at the start of the round
+        self.transitions = {}
+
+    def canonical(self, hull):
+        hull = [h if h >= 0 else -1 for h in hull]
+        for start, end in self.blocks:
+            hull[start:end] = sorted(hull[start:end], reverse=True)
+        return tuple(hull)
+
+    def both_sides_alive(self, hull):
+        return (any(hull[i] >= 0 for i in self.slots[0]) and
+                any(hull[i] >= 0 for i in self.slots[1]))
+
+    # Function to apply one hit following the select_target priorities, returns the hit ship or None
+    @staticmethod
+    def apply_hit(hull, enemy_slots, ranks, ties, needed, roll, damage):
+        best = None
+        for j, e in enumerate(enemy_slots):
+            h = hull[e]
+            if h < 0 or roll < needed[j]:
+                continue
+            key = (ranks[j], abs(h - (damage - 1)), h < damage, h, ties[j])
+            if best is None or key < best[0]:
+                best = (key, e)
+        if best is None:
+            return None
+        hull[best[1]] -= damage
+        return best[1]
+
+    def target_shield_index(self, hull, side):
+        target_shield = max(self.shield[i] for i in self.slots[side] if hull[i] >= 0)
+        return self.shield_values[side].index(target_shield)
+
+    # Function to return the distribution of hull states after one ship fires its dice or missiles
+    def fire_dice(self, hull, slot, missiles=False):
+        plan, _ = self.layout.missiles[slot] if missiles else self.layout.dice[slot]
+        side = self.side[slot]
+        enemy_slots = self.slots[1 - side]
+        shield_index = self.target_shield_index(hull, side)
+        if missiles:
+            ranks = self.missile_ranks[slot][shield_index]
+            ties = self.missile_ties[slot]
+        else:
+            ranks = self.ranks[side][shield_index]
+            ties = list(range(len(enemy_slots)))
+        needed = [self.hit_threshold[slot][self.shield[e]] for e in enemy_slots]
+
+        outcomes = {tuple(hull): 1.0}
+        # Hits sharing a roll (antimatter split dice) are resolved together
+        for _, group in itertools.groupby(plan, key=lambda entry: entry[1]):
+            damages = [damage for damage, _ in group]
+            next_outcomes = {}
+            for state, probability in outcomes.items():
+                for roll in range(1, 7):
+                    new_hull = list(state)
+                    if roll != 1:
+                        for damage in damages:
+                            self.apply_hit(new_hull, enemy_slots, ranks, ties, needed, roll, damage)
+                    new_state = tuple(new_hull)
+                    next_outcomes[new_state] = next_outcomes.get(new_state, 0.0) + probability / 6
+            outcomes = next_outcomes
+        return outcomes
+
+    # Function to return the distribution of hull states after one ship fires its rift cannons
+    def fire_rift_cannon(self, hull, slot):
+        count = self.rift_cannon[slot]
+        side = self.side[slot]
+        enemy_slots = self.slots[1 - side]
+        ally_slots = self.slots[side]
+        ranks = self.ranks[side][self.target_shield_index(hull, side)]
+        ties = list(range(len(enemy_slots)))
+        needed = [0] * len(enemy_slots)
+
+        self_target = None
+        for i in ally_slots:
+            if hull[i] >= 0 and self.rift_cannon[i] > 0 and (self_target is None or hull[i] > hull[self_target]):
+                self_target = i
+
+        outcomes = {}
+        # Faces are resolved grouped by side, so only the number of each face rolled matters
+        for faces in itertools.combinations_with_replacement(range(len(RIFT_SIDES)), count):
+            probability = factorial(count) / len(RIFT_SIDES) ** count
+            for _, same in itertools.groupby(faces):
+                probability /= factorial(len(list(same)))
+            new_hull = list(hull)
+            for face in faces:
+                target = self.apply_hit(new_hull, enemy_slots, ranks, ties, needed, 6, int(RIFT_DAMAGE_TARGET[face]))
+                if target is not None:
+                    new_hull[self_target] -= int(RIFT_DAMAGE_SELF[face])
+            new_state = tuple(new_hull)
+            outcomes[new_state] = outcomes.get(new_state, 0.0) + probability
+        return outcomes
+
+    # Function to push a distribution of states through every ship firing in initiative order
+    def fire_in_initiative_order(self, distribution, missiles=False):
+        for slot in self.layout.order:
+            if missiles and not self.layout.missiles[slot][0]:
+                continue
+            next_distribution = {}
+            for state, probability in distribution.items():
+                if state[slot] < 0 or not self.both_sides_alive(state):
+                    outcomes = {state: 1.0}
+                elif missiles:
+                    outcomes = self.fire_dice(state, slot, missiles=True)
+                else:
+                    outcomes = {}
+                    for after_dice, p_dice in self.fire_dice(state, slot).items():
+                        if self.rift_cannon[slot]:
+                            for after_rift, p_rift in self.fire_rift_cannon(after_dice, slot).items():
+                                outcomes[after_rift] = outcomes.get(after_rift, 0.0) + p_dice * p_rift
+                        else:
+                            outcomes[after_dice] = outcomes.get(after_dice, 0.0) + p_dice
+                for new_state, p in outcomes.items():
+                    new_state = tuple(h if h >= 0 else -1 for h in new_state)
+                    next_distribution[new_state] = next_distribution.get(new_state, 0.0) + probability * p
+            distribution = next_distribution
+
+        # Ships are only interchangeable once every ship has had its turn
+        canonical_distribution = {}
+        for state, probability in distribution.items():
+            state = self.canonical(state)
+            canonical_distribution[state] = canonical_distribution.get(state, 0.0) + probability
+        return canonical_distribution
+
+    def round_transition(self, state):
+        if state not in self.transitions:
+            self.transitions[state] = self.fire_in_initiative_order({state: 1.0})
+        return self.transitions[state]
+
+    def solve(self):
+        """ Work out the probability of every final fleet state
+        :return: Tuple of a dict of final hull states and their probabilities, and the probability of a stalemate
+        """
+        start = self.canonical(self.layout.hull.tolist())
+        distribution = self.fire_in_initiative_order({start: 1.0}, missiles=True)
+
+        final_states = {}
+        stalemate = 0.0
+        # States are processed in order of remaining hull, so all mass has arrived before a state is expanded
+        pending = dict(distribution)
+        heap = [(-self.potential(state), state) for state in pending]
+        heapq.heapify(heap)
+        while heap:
+            _, state = heapq.heappop(heap)
+            mass = pending.pop(state)
+            if not self.both_sides_alive(state):
+                final_states[state] = final_states.get(state, 0.0) + mass
+                continue
+            transition = self.round_transition(state)
+            stay = transition.get(state, 0.0)
+            if len(transition) == 1 and stay > 0:
+                # Neither side can damage the other, the battle never ends
+                stalemate += mass
+                continue
+            for new_state, probability in transition.items():
+                if new_state == state:
+                    continue
+                if new_state not in pending:
+                    pending[new_state] = 0.0
+                    heapq.heappush(heap, (-self.potential(new_state), new_state))
+                pending[new_state] += mass * probability / (1 - stay)
+        return final_states, stalemate
+
+    @staticmethod
+    def potential(state):
+        return sum(h + 1 for h in state)
+
+
+def solve_combat_exact(attacker_counts, defender_counts):
+    """ Compute the exact outcome distribution of a battle instead of sampling it
+    :param attacker_counts: Dictionary of ship types and their counts for the attacker
+    :param defender_counts: Dictionary of ship types and their counts for the defender
+    :return: Results dict in the same format as simulate_combat, plus draw and stalemate probabilities and the
+        distribution of survivors for each side. Survivor distributions are keyed by a tuple of surviving ship
+        counts, in the order of the ship types in attacker_counts / defender_counts.
+    """
+    solver = ExactSolver(attacker_counts, defender_counts)
+    final_states, stalemate = solver.solve()
+    names = solver.layout.names
+
+    outcomes = {'attacker': {}, 'defender': {}, 'draw': 0.0}
+    for state, probability in final_states.items():
+        attacker_alive = [i for i in solver.slots[0] if state[i] >= 0]
+        defender_alive = [i for i in solver.slots[1] if state[i] >= 0]
+        if attacker_alive:
+            survivors = tuple(sum(names[i] == ship_type for i in attacker_alive) for ship_type in attacker_counts)
+            outcomes['attacker'][survivors] = outcomes['attacker'].get(survivors, 0.0) + probability
+        elif defender_alive:
+            survivors = tuple(sum(names[i] == ship_type for i in defender_alive) for ship_type in defender_counts)
+            outcomes['defender'][survivors] = outcomes['defender'].get(survivors, 0.0) + probability
+        else:
+            outcomes['draw'] += probability
+
+    results = {'draw_prob': outcomes['draw'], 'stalemate_prob': stalemate}
+    for side, counts in (('attacker', attacker_counts), ('defender', defender_counts)):
+        distribution = outcomes[side]
+        win_prob = sum(distribution.values())
+        results[f'{side}_win_prob'] = win_prob
+        results[f'{side}_survival_avg'] = {
+            ship_type: sum(survivors[index] * p for survivors, p in distribution.items()) / win_prob if win_prob else 0
+            for index, ship_type in enumerate(counts)}
+        results[f'{side}_survivor_distribution'] = dict(sorted(distribution.items()))
+    return results
+
+
+def simulate_combat_exact():
+    """ Compute the exact outcome of a battle.
+    :return: None
+    """
+    print("Let's simulate a combat!")
+
+    attacker_counts = input_fleet("attacker")
+    defender_counts = input_fleet("defender")
+
+    start_time = time()
+    results = solve_combat_exact(attacker_counts, defender_counts)
+    end_time = time()
+    print(f"Solved the combat exactly in {end_time - start_time:.2f} seconds.")
+    print_results(results)
+    for side in ('attacker', 'defender'):
+        print(f"\n{side.capitalize()} survivor distribution:")
+        for survivors, probability in results[f'{side}_survivor_distribution'].items():
+            print(f"{survivors}: {probability}")
@@ -0,0 +1,244 @@
+import json
+import itertools
+import argparse
+from math import ceil, log
+from multiprocessing import Pool
+from .combat import DEFAULT_CHUNK_SIZE, SHIP_CATEGORY_LIMITS, chunk_sizes
+from .ship_table import compile_ship_types, init_ship_table
+from .ship_types import get_ship_types
+from .stats import CombatStats
+from .sweep import _run_sweep_task, fleet_compositions
+
+# Fewest battles a candidate is given in a round, so no candidate is eliminated on a handful of battles
+DEFAULT_MIN_BATTLES = 200
+
+
+class Contender:
+    """ A candidate matchup in a race, with the battles simulated for it so far and the round it was eliminated in
+    (None while it is still in the race)
+    """
+
+    def __init__(self, index, attacker_counts, defender_counts):
+        self.index = index
+        self.attacker_counts = attacker_counts
+        self.defender_counts = defender_counts
+        self.stats = CombatStats(attacker_counts, defender_counts)
+        self.chunks = 0
+        self.eliminated = None
+
+    def to_dict(self, side, confidence=0.95):
+        return {
+            'index': self.index,
+            'attacker': self.attacker_counts,
+            'defender': self.defender_counts,
+            'iterations': self.stats.iterations,
+            'win_prob': self.stats.win_prob(side),
+            'interval': self.stats.win_prob_interval(side, confidence),
+            'eliminated': self.eliminated,
+        }
+
+
+def race(cells, budget, side='attacker', confidence=0.99, eta=2, min_battles=DEFAULT_MIN_BATTLES,
+         chunk_size=DEFAULT_CHUNK_SIZE, processes=None, progress=True, seed=None, types=None):
+    """ Find the matchup in which side wins most often, spending the simulations on the contenders.
+
+    The race runs in rounds of successive halving. Each round splits an equal share of the budget over the candidates
+    still in the race, then drops every candidate whose Wilson upper bound is below the best lower bound, and keeps at
+    most 1/eta of the rest by win probability. Clearly bad candidates leave after a few hundred battles, so the last
+    rounds spend most of the budget telling the best few apart. No round goes over the budget, and the race ends early
+    once one candidate is left or the budget is spent.
+    :param cells: List of (attacker_counts, defender_counts) candidates
+    :param budget: Total number of battles to simulate over all candidates
+    :param side: Side whose win probability is maximised, 'attacker' or 'defender'
+    :param confidence: Confidence level of the bounds used to eliminate candidates
+    :param eta: Fraction of candidates kept after each round is 1/eta
+    :param min_battles: Fewest battles given to each candidate in a round
+    :param chunk_size: Largest number of battles in one worker task
+    :param processes: Number of worker processes, defaults to the number of CPUs
+    :param progress: Show a progress bar
+    :param seed: Root seed, every chunk of every candidate rolls from its own stream derived from it
+    :param types: Dictionary of ship types to simulate with, defaults to SHIP_TYPES
+    :return: List of Contender, the best first: candidates still in the race by win probability, then the others
+             by the round they were eliminated in
+    """
+    from tqdm import tqdm
+
+    if not cells:
+        raise ValueError("There are no candidates to race.")
+    if len(cells) * min_battles > budget:
+        raise ValueError(f"A budget of {budget} battles cannot give {len(cells)} candidates {min_battles} battles each.")
+    # The workers get the table from their initializer, the table of this process is left as it is
+    table = compile_ship_types(types)
+    contenders = [Contender(index, attacker_counts, defender_counts)
+                  for index, (attacker_counts, defender_counts) in enumerate(cells)]
+    alive = list(contenders)
+    rounds = max(ceil(log(len(contenders), eta)), 1)
+    spent = 0
+
+    with Pool(processes, initializer=init_ship_table, initargs=(table.specs,)) as pool, \
+            tqdm(total=budget, disable=not progress) as progress_bar:
+        for round_index in range(rounds):
+            battles = min(max((budget - spent) // ((rounds - round_index) * len(alive)), min_battles),
+                          (budget - spent) // len(alive))
+            if not battles:
+                break
+            tasks = []
+            for contender in alive:
+                for size in chunk_sizes(battles, chunk_size):
+                    tasks.append((contender.index, contender.chunks, contender.attacker_counts,
+                                  contender.defender_counts, size, seed))
+                    contender.chunks += 1
+            for index, chunk_stats in pool.imap_unordered(_run_sweep_task, tasks):
+                contenders[index].stats.merge(chunk_stats)
+                spent += chunk_stats.iterations
+                progress_bar.update(chunk_stats.iterations)
+
+            # Racing: drop the candidates that are worse than the leader with the given confidence
+            best_lower = max(contender.stats.win_prob_interval(side, confidence)[0] for contender in alive)
+            for contender in alive:
+                if contender.stats.win_prob_interval(side, confidence)[1] < best_lower:
+                    contender.eliminated = round_index
+            alive = [contender for contender in alive if contender.eliminated is None]
+
+            # Successive halving: only the best 1/eta go on to the next round
+            if round_index < rounds - 1:
+                alive.sort(key=lambda contender: -contender.stats.win_prob(side))
+                for contender in alive[ceil(len(alive) / eta):]:
+                    contender.eliminated = round_index
+                alive = alive[:ceil(len(alive) / eta)]
+            if len(alive) == 1 or spent >= budget:
+                break
+
+    return sorted(contenders, key=lambda contender: (contender.eliminated is not None,
+                                                     -(contender.eliminated or 0),
+                                                     -contender.stats.win_prob(side)))
+
+
+def optimize_fleet(ship_names, defender_counts, budget, limits=SHIP_CATEGORY_LIMITS, **kwargs):
+    """ Race every attacker fleet made from ship_names within the category limits against a defender
+    :param ship_names: List of ship type names the attacker may build
+    :param defender_counts: Dictionary of ship types and their counts for the defender
+    :param budget: Total number of battles to simulate
+    :param limits: Dictionary of ship categories to the most ships of that category in a fleet
+    :param kwargs: Passed on to race
+    :return: List of Contender, the best fleet first
+    """
+    table = compile_ship_types(kwargs.get('types'))
+    cells = [(fleet, defender_counts) for fleet in fleet_compositions(ship_names, limits, table)]
+    return race(cells, budget, **kwargs)
+
+
+# Function to describe an upgrade such as {'computer': 1} or {'dice': {'2': 1}} in a ship type name
+def upgrade_label(upgrade):
+    labels = []
+    for attribute, value in upgrade.items():
+        if isinstance(value, dict):
+            labels.extend(f"{attribute}[{damage}]{count:+}" for damage, count in value.items())
+        else:
+            labels.append(f"{attribute}{value:+}")
+    return ', '.join(labels)
+
+
+# Function to apply an upgrade to the attributes of a ship type, adding weapons to its dice or missiles
+def apply_upgrade(attributes, upgrade):
+    attributes = dict(attributes)
+    for attribute, value in upgrade.items():
+        if isinstance(value, dict):
+            weapons = {}
+            for damage, count in list(attributes[attribute].items()) + list(value.items()):
+                weapons[int(damage)] = weapons.get(int(damage), 0) + count
+            attributes[attribute] = weapons
+        else:
+            attributes[attribute] = attributes[attribute] + value
+    return attributes
+
+
+def blueprint_variants(base_name, upgrades, slots, types=None):
+    """ Make a ship type for every way to put up to slots upgrades on a blueprint, the same upgrade may be used more
+    than once. The variants are not saved, pass them to race as types.
+    :param base_name: Name of the ship type to upgrade
+    :param upgrades: List of upgrades, each a dict of attribute increments like {'computer': 1} or {'dice': {2: 1}}
+    :param slots: Most upgrades on one variant
+    :param types: Dictionary of ship types to take the blueprint from, defaults to SHIP_TYPES
+    :return: Dictionary of variant names to attributes, the blueprint itself included under its own name
+    """
+    if types is None:
+        types = get_ship_types()
+    base = types[base_name]
+    variants = {}
+    for used in range(slots + 1):
+        for combination in itertools.combinations_with_replacement(range(len(upgrades)), used):
+            attributes = base
+            for upgrade_index in combination:
+                attributes = apply_upgrade(attributes, upgrades[upgrade_index])
+            if combination:
+                name = f"{base_name} ({'; '.join(upgrade_label(upgrades[i]) for i in combination)})"
+            else:
+                name = base_name
+            variants[name] = attributes
+    return variants
+
+
+def optimize_blueprint(base_name, upgrades, slots, count, defender_counts, budget, limits=SHIP_CATEGORY_LIMITS,
+                       **kwargs):
+    """ Race every variant of a blueprint with up to slots upgrades, count ships of it attacking a defender
+    :param base_name: Name of the ship type to upgrade
+    :param upgrades: List of upgrades, see blueprint_variants
+    :param slots: Most upgrades on one variant
+    :param count: Number of ships of the variant in the attacking fleet
+    :param defender_counts: Dictionary of ship types and their counts for the defender
+    :param budget: Total number of battles to simulate
+    :param limits: Dictionary of ship categories to the most ships of that category in a fleet
+    :param kwargs: Passed on to race
+    :return: List of Contender, the best variant first
+    """
+    types = dict(kwargs.pop('types', None) or get_ship_types())
+    category = types[base_name]['type']
+    if not 1 <= count <= limits.get(category, 0):
+        raise ValueError(f"A fleet can have 1 to {limits.get(category, 0)} ships of category '{category}', not {count}.")
+    variants = blueprint_variants(base_name, upgrades, slots, types)
+    types.update(variants)
+    cells = [({name: count}, defender_counts) for name in variants]
+    return race(cells, budget, types=types, **kwargs)
+
+
+def optimize_combat(args=None):
+    """ Console entry point racing fleets or blueprint upgrades against a defender
+    :param args: Command line arguments, defaults to sys.argv
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Find the fleet or blueprint that beats a defender most often.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    fleet = commands.add_parser('fleet', help="race every fleet of the given ship types within the category limits")
+    fleet.add_argument('--ships', nargs='+', required=True, help="ship types the attacker may build")
+    blueprint = commands.add_parser('blueprint', help="race every upgraded variant of a blueprint")
+    blueprint.add_argument('--base', required=True, help="ship type to upgrade")
+    blueprint.add_argument('--upgrades', type=json.loads, required=True,
+                           help='upgrades as a JSON list, e.g. [{"computer": 1}, {"shield": 1}, {"dice": {"2": 1}}]')
+    blueprint.add_argument('--slots', type=int, default=2, help="most upgrades on one variant")
+    blueprint.add_argument('--count', type=int, default=1, help="ships of the blueprint in the fleet")
+    for command in (fleet, blueprint):
+        command.add_argument('--defender', type=json.loads, required=True, help='defender fleet as JSON')
+        command.add_argument('--budget', type=int, default=10 ** 6, help="total battles to simulate")
+        command.add_argument('--confidence', type=float, default=0.99, help="confidence level of the bounds")
+        command.add_argument('--top', type=int, default=10, help="number of candidates to print")
+        command.add_argument('--processes', type=int, help="worker processes, defaults to the number of CPUs")
+        command.add_argument('--seed', type=int, help="root seed of the dice")
+    options = parser.parse_args(args)
+
+    kwargs = dict(confidence=options.confidence, processes=options.processes, seed=options.seed)
+    try:
+        if options.command == 'fleet':
+            ranking = optimize_fleet(options.ships, options.defender, options.budget, **kwargs)
+        else:
+            ranking = optimize_blueprint(options.base, options.upgrades, options.slots, options.count,
+                                         options.defender, options.budget, **kwargs)
+    except ValueError as error:
+        parser.error(str(error))
+
+    print(f"\n{len(ranking)} candidates, {sum(contender.stats.iterations for contender in ranking)} battles:")
+    for contender in ranking[:options.top]:
+        low, high = contender.stats.win_prob_interval('attacker', options.confidence)
+        status = 'in the race' if contender.eliminated is None else f"out in round {contender.eliminated + 1}"
+        print(f"{contender.stats.win_prob('attacker'):.2%} [{low:.2%}, {high:.2%}] "
+              f"after {contender.stats.iterations} battles, {status}: {contender.attacker_counts}")
@@ -0,0 +1,92 @@
+import os
+import hashlib
+
+# Number of dice rolled at once by a DiceBuffer
+DEFAULT_BUFFER_SIZE = 1 << 16
+
+
+# Function to derive the seed of one independent random stream from a root seed and a path,
+# e.g. (seed, chunk index) or (seed, cell index, chunk index).
+# The same root seed and path always give the same stream, in any process and in any order.
+def derive_seed(seed, *path):
+    key = ':'.join(str(part) for part in (seed,) + path).encode()
+    return int.from_bytes(hashlib.sha256(key).digest()[:8], 'big')
+
+
+class DiceBuffer:
+    """ Source of d6 rolls that rolls a whole buffer of dice at once and hands them out one at a time.
+    It has the randint, randrange and choice methods the engine uses from random.Random, but only for up to six
+    outcomes, which is all a die or a rift cannon needs.
+
+    Seeded buffers come from a NumPy Generator, so the same seed always gives the same rolls. Unseeded buffers
+    come from os.urandom, keeping the bytes below 252 so every face is equally likely.
+    """
+
+    def __init__(self, seed=None, size=DEFAULT_BUFFER_SIZE):
+        self.size = size
+        if seed is None:
+            self.generator = None
+        else:
+            import numpy as np
+
+            self.generator = np.random.default_rng(seed)
+        self.buffer = []
+        self.position = 0
+
+    def _refill(self):
+        if self.generator is None:
+            self.buffer = [byte % 6 + 1 for byte in os.urandom(self.size) if byte < 252]
+        else:
+            self.buffer = self.generator.integers(1, 7, size=self.size, dtype='uint8').tolist()
+        self.position = 0
+
+    # Function to roll a d6
+    def roll(self):
+        if self.position >= len(self.buffer):
+            self._refill()
+        self.position += 1
+        return self.buffer[self.position - 1]
+
+    def randint(self, a, b):
+        if a == 1 and b == 6:
+            return self.roll()
+        return a + self.randrange(b - a + 1)
+
+    def randrange(self, n):
+        if not 0 < n <= 6:
+            raise ValueError(f"A DiceBuffer can only pick from 1 to 6 outcomes, not {n}.")
+        # Rolls above n are rerolled, so each of the n outcomes stays equally likely
+        roll = self.roll()
+        while roll > n:
+            roll = self.roll()
+        return roll - 1
+
+    def choice(self, seq):
+        return seq[self.randrange(len(seq))]
+
+
+def stream(seed, *path):
+    """ Create the dice source for one part of a simulation
+    :param seed: Root seed of the simulation, None for an unseeded source
+    :param path: Position of the part in the simulation, e.g. its chunk index
+    :return: DiceBuffer
+    """
+    if seed is None:
+        return DiceBuffer()
+    return DiceBuffer(derive_seed(seed, *path))
+
+
+class AntitheticRandom:
+    """ Mirror image of a random generator for antithetic sampling: every die that would roll d rolls 7 - d,
+    and every choice picks from the other end of the list. A battle fought on a stream and its mirror image
+    tend to err in opposite directions, so their average varies less than two independent battles.
+    """
+
+    def __init__(self, rng):
+        self.rng = rng
+
+    def randint(self, a, b):
+        return a + b - self.rng.randint(a, b)
+
+    def choice(self, seq):
+        return seq[len(seq) - 1 - self.rng.randrange(len(seq))]
@@ -0,0 +1,124 @@
+import json
+import random
+import argparse
+from functools import partial
+from .combat import DEFAULT_CHUNK_SIZE, chunk_sizes, fight
+from .compare import PairedComparison, _map_chunks
+from .optimize import apply_upgrade
+from .rng import derive_seed
+from .ship_table import compile_ship_types, using_ship_table
+from .ship_types import get_ship_types
+from .stats import SIDES, winner
+
+# Changes whose value is estimated for every ship type in the matchup
+CHANGES = ('computer', 'shield', 'hull', 'die', 'missile')
+
+
+# Function to find the damage of the weapon a ship has most of, so an extra one is like the ones it has
+def _common_damage(weapons, default):
+    if not weapons:
+        return default
+    return int(max(weapons.items(), key=lambda weapon: weapon[1])[0])
+
+
+# Function to build the upgrade for one of the CHANGES on a ship type
+def change_upgrade(attributes, change):
+    if change == 'die':
+        return {'dice': {_common_damage(attributes['dice'], 1): 1}}
+    if change == 'missile':
+        return {'missiles': {_common_damage(attributes['missiles'], 2): 1}}
+    return {change: 1}
+
+
+# Function to fight a chunk of samples, the matchup and every variant on the same dice stream per sample
+def sensitivity_chunk(baseline, variants, seed, chunk):
+    chunk_index, samples = chunk
+    rng = random.Random(None if seed is None else derive_seed(seed, chunk_index))
+    comparisons = [PairedComparison(variant, baseline, side) for side, variant in variants]
+    for _ in range(samples):
+        battle_seed = rng.getrandbits(64)
+        baseline_fleets = fight(*baseline, random.Random(battle_seed))
+        baseline_winner = winner(*baseline_fleets)
+        for comparison in comparisons:
+            fleets = fight(*comparison.variants['a'], random.Random(battle_seed))
+            comparison.stats['a'].add(*fleets)
+            comparison.stats['b'].add(*baseline_fleets)
+            comparison.add(winner(*fleets) == comparison.side, baseline_winner == comparison.side)
+    return comparisons
+
+
+def sensitivity_analysis(attacker_counts, defender_counts, iterations, changes=CHANGES,
+                         chunk_size=DEFAULT_CHUNK_SIZE, processes=None, progress=True, seed=None):
+    """ Estimate how much +1 computer, +1 shield, +1 hull, an extra die or an extra missile on each ship type of a
+    matchup changes the win probability of the side that ship type is on, all in one run.
+
+    Each change is made to an unsaved copy of the ship type, on one side only. Every sample fights the matchup and
+    all the changed matchups on the same dice stream, so each change is a paired comparison with the matchup, as in
+    compare_variants, and the luck cancels out of the differences.
+    :param attacker_counts: Dictionary of ship types and their counts for the attacker
+    :param defender_counts: Dictionary of ship types and their counts for the defender
+    :param iterations: Number of samples, each fights the matchup and every changed matchup once
+    :param changes: Changes to estimate, some of CHANGES
+    :param chunk_size: Number of samples each worker simulates before sending back its totals
+    :param processes: Number of worker processes, defaults to the number of CPUs, 1 runs in this process
+    :param progress: Show a progress bar
+    :param seed: Root seed, the same seed and chunk_size give the same results for any number of processes
+    :return: List of (side, ship type, change, PairedComparison), the most valuable change first
+    """
+    from tqdm import tqdm
+
+    types = dict(get_ship_types())
+    baseline = (attacker_counts, defender_counts)
+    keys = []
+    variants = []
+    for side_index, side in enumerate(SIDES):
+        for ship_type, count in baseline[side_index].items():
+            if not count:
+                continue
+            for change in changes:
+                name = f"{ship_type} ({change}+1, {side})"
+                types[name] = apply_upgrade(types[ship_type], change_upgrade(types[ship_type], change))
+                # The changed type keeps its place in the fleet, as fleet order decides ties in firing and targeting
+                variant = [dict(counts) for counts in baseline]
+                variant[side_index] = {(name if other == ship_type else other): other_count
+                                       for other, other_count in baseline[side_index].items()}
+                keys.append((side, ship_type, change))
+                variants.append((side, tuple(variant)))
+
+    worker = partial(sensitivity_chunk, baseline, variants, seed)
+    comparisons = [PairedComparison(variant, baseline, side) for side, variant in variants]
+    # The changed ship types are only used for this run, chunks simulated in this process see them too
+    with using_ship_table(compile_ship_types(types)) as table, \
+            tqdm(total=iterations, disable=not progress) as progress_bar:
+        for chunk in _map_chunks(worker, enumerate(chunk_sizes(iterations, chunk_size)), processes, table):
+            for comparison, chunk_comparison in zip(comparisons, chunk):
+                comparison.merge(chunk_comparison)
+            progress_bar.update(chunk[0].samples if chunk else 0)
+
+    results = [key + (comparison,) for key, comparison in zip(keys, comparisons)]
+    return sorted(results, key=lambda result: -result[3].difference())
+
+
+def simulate_combat_sensitivity(args=None):
+    """ Console entry point printing the ranked value of every change on every ship type of a matchup
+    :param args: Command line arguments, defaults to sys.argv
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Rank the value of +1 on each attribute of each ship type.")
+    parser.add_argument('--attacker', type=json.loads, required=True, help='attacker fleet as JSON, e.g. {"Cruiser": 2}')
+    parser.add_argument('--defender', type=json.loads, required=True, help="defender fleet as JSON")
+    parser.add_argument('--iterations', type=int, default=20000, help="samples, each fights every variant once")
+    parser.add_argument('--changes', nargs='+', choices=CHANGES, default=CHANGES, help="changes to estimate")
+    parser.add_argument('--confidence', type=float, default=0.95, help="confidence level of the intervals")
+    parser.add_argument('--processes', type=int, help="worker processes, defaults to the number of CPUs")
+    parser.add_argument('--seed', type=int, help="root seed of the dice")
+    options = parser.parse_args(args)
+
+    results = sensitivity_analysis(options.attacker, options.defender, options.iterations, options.changes,
+                                   processes=options.processes, seed=options.seed)
+    print(f"\nChange in the win probability of the side of the ship, {options.iterations} samples:")
+    print(f"{'Side':<10}{'Ship type':<20}{'Change':<10}{'Difference':>12}   Confidence interval")
+    for side, ship_type, change, comparison in results:
+        low, high = comparison.difference_interval(options.confidence)
+        print(f"{side:<10}{ship_type:<20}{change + ' +1':<10}{comparison.difference():>+12.2%}   "
+              f"[{low:+.2%}, {high:+.2%}]")
@@ -0,0 +1,372 @@
+import os
+import json
+import queue
+import socket
+import argparse
+import itertools
+import threading
+from collections import deque
+from multiprocessing import Pool
+from .batch import InlinePool, ScenarioRun, run_batch_chunk
+from .combat import DEFAULT_CHUNK_SIZE, DEFAULT_MAX_ITERATIONS
+from .ship_table import load_ship_table
+from .ship_types import get_ship_types
+from .stats import CombatStats
+
+# Unix domain socket the service listens on by default, a host:port address listens on TCP instead
+DEFAULT_ADDRESS = os.path.join(os.path.expanduser('~'), '.cache', 'eclipse_tools', 'simulation.sock')
+
+# Requests one connection can have running or waiting before the service stops reading from it
+DEFAULT_MAX_PENDING = 64
+
+
+class SimulationError(Exception):
+    """ A request the simulation service could not run, or that was cancelled """
+
+
+# Function to turn an address into a socket family and socket address, host:port is TCP and anything else a path
+def parse_address(address):
+    host, _, port = address.rpartition(':')
+    if host and port.isdigit() and os.sep not in address:
+        return socket.AF_INET, (host, int(port))
+    return socket.AF_UNIX, address
+
+
+# Function to simulate a chunk in a worker, returning the error instead of raising it so the request can be failed
+def run_service_chunk(task):
+    try:
+        return run_batch_chunk(task)
+    except Exception as error:
+        return task[0], task[1], SimulationError(f"{type(error).__name__}: {error}")
+
+
+class Connection:
+    """ One client of the service. Messages are JSON lines, written by a thread of their own so a client that is
+    slow to read never holds up the scheduler. slots limits the requests the client can have pending.
+    """
+
+    def __init__(self, sock, max_pending):
+        self.sock = sock
+        self.slots = threading.Semaphore(max_pending)
+        self.outgoing = queue.SimpleQueue()
+        self.requests = {}
+        self.writer = threading.Thread(target=self._write, daemon=True)
+        self.writer.start()
+
+    def send(self, message):
+        self.outgoing.put(message)
+
+    def _write(self):
+        while True:
+            message = self.outgoing.get()
+            if message is None:
+                break
+            try:
+                self.sock.sendall((json.dumps(message) + '\n').encode())
+            except OSError:
+                break
+        self.sock.close()
+
+    def close(self):
+        self.outgoing.put(None)
+
+
+class SimulationService:
+    """ Long lived simulation server keeping one warm worker pool for every client.
+
+    Clients send JSON lines over a Unix domain socket or TCP: {"op": "simulate", "id": ..., <scenario>} where the
+    scenario takes the same fields as a run_batch scenario, and {"op": "cancel", "id": ...}. Requests from every
+    connection share the pool, oldest first, and each is answered with one line holding its results and the
+    CombatStats as to_dict. A connection with max_pending requests unanswered is not read from until one finishes,
+    so a client sending faster than the workers can simulate is slowed down by the socket itself.
+    """
+
+    def __init__(self, address=DEFAULT_ADDRESS, processes=None, max_pending=DEFAULT_MAX_PENDING,
+                 chunk_size=DEFAULT_CHUNK_SIZE, max_iterations=DEFAULT_MAX_ITERATIONS, confidence=0.95):
+        self.address = address
+        self.max_pending = max_pending
+        self.defaults = (chunk_size, max_iterations, confidence)
+        self.processes = processes or os.cpu_count() or 1
+        # Load the ship types before the workers are started, so every worker starts with them
+        self.base_types = get_ship_types()
+        load_ship_table()
+        self.pool = InlinePool() if self.processes == 1 else Pool(self.processes)
+        self.events = queue.SimpleQueue()
+        self.indices = itertools.count()
+        self.runs = {}
+        self.waiting = deque()
+        self.in_flight = 0
+        self.listener = None
+
+    def serve_forever(self):
+        family, address = parse_address(self.address)
+        if family == socket.AF_UNIX:
+            os.makedirs(os.path.dirname(address) or '.', exist_ok=True)
+            if os.path.exists(address):
+                os.unlink(address)
+        self.listener = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_INET:
+            self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind(address)
+        self.listener.listen()
+        scheduler = threading.Thread(target=self._schedule, daemon=True)
+        scheduler.start()
+        try:
+            while True:
+                sock, _ = self.listener.accept()
+                threading.Thread(target=self._read, args=(Connection(sock, self.max_pending),), daemon=True).start()
+        except OSError:
+            # The listener was closed by shutdown
+            pass
+        finally:
+            self.events.put(('stop',))
+            scheduler.join()
+            self.pool.__exit__(None, None, None)
+            if family == socket.AF_UNIX and os.path.exists(address):
+                os.unlink(address)
+
+    def shutdown(self):
+        if self.listener is not None:
+            try:
+                self.listener.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.listener.close()
+
+    # Function reading the requests of one connection and passing them to the scheduler
+    def _read(self, connection):
+        try:
+            for line in connection.sock.makefile('rb'):
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                except json.JSONDecodeError:
+                    connection.send({'error': "Invalid JSON."})
+                    continue
+                if not isinstance(request, dict):
+                    connection.send({'error': "A request must be a JSON object."})
+                    continue
+                operation = request.get('op', 'simulate')
+                if isinstance(request.get('id'), (list, dict)):
+                    connection.send({'error': "A request id must be a string or a number."})
+                elif operation == 'simulate':
+                    # Check the whole request here, so only runs that can be scheduled reach the scheduler
+                    try:
+                        run = ScenarioRun(next(self.indices), request, self.base_types, *self.defaults, None)
+                    except (ValueError, TypeError) as error:
+                        connection.send({'id': request.get('id'), 'error': str(error)})
+                        continue
+                    connection.slots.acquire()
+                    self.events.put(('submit', connection, request.get('id'), run))
+                elif operation == 'cancel':
+                    self.events.put(('cancel', connection, request.get('id')))
+                elif operation == 'ping':
+                    connection.send({'id': request.get('id'), 'pong': True})
+                else:
+                    connection.send({'id': request.get('id'), 'error': f"Unknown op '{operation}'."})
+        except OSError:
+            pass
+        finally:
+            self.events.put(('closed', connection))
+
+    # Function running on the scheduler thread, the only thread that touches the runs.
+    # An event that fails is answered with an error, the scheduler keeps serving every other request.
+    def _schedule(self):
+        while True:
+            self._dispatch()
+            event = self.events.get()
+            if event[0] == 'stop':
+                return
+            try:
+                self._handle(event)
+            except Exception as error:
+                self._fail(event, f"{type(error).__name__}: {error}")
+
+    # Function to apply one event from a connection or the pool to the runs
+    def _handle(self, event):
+        kind = event[0]
+        if kind == 'submit':
+            self._submit(*event[1:])
+        elif kind == 'cancel':
+            self._cancel(*event[1:])
+        elif kind == 'closed':
+            connection = event[1]
+            for request_id in list(connection.requests):
+                self._finish(connection.requests[request_id], None)
+            connection.close()
+        elif kind == 'chunk':
+            self.in_flight -= 1
+            index, chunk_index, chunk_stats = event[1]
+            if index not in self.runs:
+                return
+            run, connection, request_id = self.runs[index]
+            if isinstance(chunk_stats, SimulationError):
+                self._finish(index, {'id': request_id, 'error': str(chunk_stats)})
+            elif run.receive(chunk_index, chunk_stats):
+                message = run.result()
+                message.update(id=request_id, stats=run.stats.to_dict())
+                self._finish(index, message)
+
+    # Function to answer the request an event that raised belongs to with the error
+    def _fail(self, event, error):
+        kind = event[0]
+        if kind == 'submit':
+            connection, request_id, run = event[1:]
+            if self.runs.get(run.index, (None, None, None))[0] is run:
+                self._finish(run.index, {'id': request_id, 'error': error})
+            else:
+                connection.slots.release()
+                connection.send({'id': request_id, 'error': error})
+        elif kind == 'cancel':
+            event[1].send({'id': event[2], 'error': error})
+        elif kind == 'chunk' and event[1][0] in self.runs:
+            self._finish(event[1][0], {'id': self.runs[event[1][0]][2], 'error': error})
+
+    def _submit(self, connection, request_id, run):
+        if request_id in connection.requests:
+            connection.slots.release()
+            connection.send({'id': request_id, 'error': "A request with this id is already running."})
+            return
+        self.runs[run.index] = (run, connection, request_id)
+        connection.requests[request_id] = run.index
+        self.waiting.append(run.index)
+
+    def _cancel(self, connection, request_id):
+        if request_id not in connection.requests:
+            connection.send({'id': request_id, 'error': "No such request."})
+            return
+        self._finish(connection.requests[request_id], {'id': request_id, 'cancelled': True})
+
+    # Function to drop a run, answering its connection with message unless the connection is gone (None)
+    def _finish(self, index, message):
+        run, connection, request_id = self.runs.pop(index)
+        run.cancel()
+        del connection.requests[request_id]
+        connection.slots.release()
+        if message is not None:
+            connection.send(message)
+
+    # Function to hand chunks to the pool until it has enough to keep every worker busy
+    def _dispatch(self):
+        while self.in_flight < 2 * self.processes and self.waiting:
+            index = self.waiting[0]
+            try:
+                task = self.runs[index][0].next_task() if index in self.runs else None
+            except Exception as error:
+                self._finish(index, {'id': self.runs[index][2], 'error': f"{type(error).__name__}: {error}"})
+                continue
+            if task is None:
+                self.waiting.popleft()
+                continue
+            self.in_flight += 1
+            self.pool.apply_async(run_service_chunk, (task,), callback=self._chunk_done,
+                                  error_callback=lambda error, task=task: self._chunk_done(
+                                      (task[0], task[1], SimulationError(f"{type(error).__name__}: {error}"))))
+
+    def _chunk_done(self, result):
+        self.events.put(('chunk', result))
+
+
+class SimulationClient:
+    """ Client of a SimulationService. run_combat_parallel and run_combat_adaptive take the same arguments as the
+    library functions and return a CombatStats, but run on the warm pool of the service. submit, cancel and wait
+    send several requests at once and collect their answers as they come back.
+    """
+
+    def __init__(self, address=DEFAULT_ADDRESS):
+        family, address = parse_address(address)
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.connect(address)
+        self.lines = self.sock.makefile('rb')
+        self.ids = itertools.count()
+        self.answers = {}
+
+    def submit(self, attacker_counts, defender_counts, iterations=None, precision=None, **options):
+        """ Send a simulation request without waiting for it
+        :param attacker_counts: Dictionary of ship types and their counts for the attacker
+        :param defender_counts: Dictionary of ship types and their counts for the defender
+        :param iterations: Number of battles to simulate
+        :param precision: Target half width of the confidence intervals, instead of iterations
+        :param options: Other scenario fields: confidence, chunk_size, max_iterations, seed, instrument, distribution,
+                        ship_types
+        :return: Id of the request, to pass to wait or cancel
+        """
+        request_id = next(self.ids)
+        request = {'op': 'simulate', 'id': request_id, 'attacker': attacker_counts, 'defender': defender_counts}
+        if iterations is not None:
+            request['iterations'] = iterations
+        if precision is not None:
+            request['precision'] = precision
+        request.update({key: value for key, value in options.items() if value is not None})
+        self._send(request)
+        return request_id
+
+    def cancel(self, request_id):
+        self._send({'op': 'cancel', 'id': request_id})
+
+    def wait(self, request_id):
+        """ Wait for the answer to a request
+        :param request_id: Id returned by submit
+        :return: CombatStats of the request
+        """
+        while request_id not in self.answers:
+            line = self.lines.readline()
+            if not line:
+                raise SimulationError("The simulation service closed the connection.")
+            answer = json.loads(line)
+            self.answers[answer.get('id')] = answer
+        answer = self.answers.pop(request_id)
+        if 'error' in answer:
+            raise SimulationError(answer['error'])
+        if answer.get('cancelled'):
+            raise SimulationError(f"Request {request_id} was cancelled.")
+        return CombatStats.from_dict(answer['stats'])
+
+    def run_combat_parallel(self, attacker_counts, defender_counts, iterations, chunk_size=DEFAULT_CHUNK_SIZE,
+                            processes=None, progress=True, seed=None, instrument=False, distribution=False):
+        """ Same as combat.run_combat_parallel, on the pool of the service. processes and progress are ignored. """
+        return self.wait(self.submit(attacker_counts, defender_counts, iterations, chunk_size=chunk_size, seed=seed,
+                                     instrument=instrument or None, distribution=distribution or None))
+
+    def run_combat_adaptive(self, attacker_counts, defender_counts, precision, confidence=0.95,
+                            chunk_size=DEFAULT_CHUNK_SIZE, max_iterations=DEFAULT_MAX_ITERATIONS, processes=None,
+                            progress=True, seed=None, instrument=False, distribution=False):
+        """ Same as combat.run_combat_adaptive, on the pool of the service. processes and progress are ignored. """
+        return self.wait(self.submit(attacker_counts, defender_counts, precision=precision, confidence=confidence,
+                                     chunk_size=chunk_size, max_iterations=max_iterations, seed=seed,
+                                     instrument=instrument or None, distribution=distribution or None))
+
+    def _send(self, request):
+        self.sock.sendall((json.dumps(request) + '\n').encode())
+
+    def close(self):
+        self.lines.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+
+def simulation_service(args=None):
+    """ Console entry point running the simulation service until it is interrupted
+    :param args: Command line arguments, defaults to sys.argv
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Serve combat simulations from a warm worker pool.")
+    parser.add_argument('--address', default=DEFAULT_ADDRESS, help="Unix socket path or host:port to listen on")
+    parser.add_argument('--processes', type=int, help="worker processes, defaults to the number of CPUs")
+    parser.add_argument('--max-pending', type=int, default=DEFAULT_MAX_PENDING,
+                        help="requests a connection can have unanswered before it is no longer read from")
+    options = parser.parse_args(args)
+
+    service = SimulationService(options.address, options.processes, options.max_pending)
+    print(f"Serving simulations on {options.address}, press Ctrl+C to stop.")
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        service.shutdown()
@@ -0,0 +1,167 @@
+import sys
+import json
+import hashlib
+import argparse
+from multiprocessing import Pool
+from .cache import matchup_key
+from .combat import DEFAULT_CHUNK_SIZE, chunk_sizes
+from .ship_table import compile_ship_types, init_ship_table
+from .ship_types import get_ship_types, write_json_atomic
+from .stats import CombatStats, SIDES
+from .sweep import _run_sweep_task
+
+SHARD_VERSION = 1
+
+
+# Function to read a run spec: a JSON object with 'cells' (or a single 'attacker' and 'defender'), 'iterations',
+# 'seed' and optionally 'chunk_size' and 'ship_types'
+def read_spec(path):
+    with open(path) as file:
+        spec = json.load(file)
+    if 'cells' not in spec:
+        spec['cells'] = [{'attacker': spec.pop('attacker'), 'defender': spec.pop('defender')}]
+    if not isinstance(spec.get('iterations'), int) or not isinstance(spec.get('seed'), int):
+        raise ValueError("A sharded run needs whole numbers for 'iterations' and 'seed', so every shard agrees.")
+    spec.setdefault('chunk_size', DEFAULT_CHUNK_SIZE)
+    spec.setdefault('ship_types', {})
+    return spec
+
+
+# Function to list every chunk of a run as (cell index, chunk index, size), in the same order on every node
+def plan_chunks(spec):
+    chunks = []
+    for cell_index in range(len(spec['cells'])):
+        for chunk_index, size in enumerate(chunk_sizes(spec['iterations'], spec['chunk_size'])):
+            chunks.append((cell_index, chunk_index, size))
+    return chunks
+
+
+# Function to fingerprint a run, including the ship types of every cell in table, so shards of different runs never
+# merge
+def run_key(spec, shards, table):
+    cells = [matchup_key(cell['attacker'], cell['defender'], 'shard', table) for cell in spec['cells']]
+    data = {'cells': cells, 'iterations': spec['iterations'], 'chunk_size': spec['chunk_size'], 'seed': spec['seed'],
+            'shards': shards}
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+
+def run_shard(spec, shard, shards, processes=None, progress=True):
+    """ Simulate one shard of a run. Shard k of n simulates every n-th chunk starting at chunk k, each chunk on the
+    stream derived from the seed, its cell and its chunk index, so the shards together simulate exactly the battles
+    of a sweep with the same seed and chunk size, whichever node runs which shard.
+    :param spec: Run spec as returned by read_spec
+    :param shard: Index of this shard, from 0
+    :param shards: Number of shards the run is split into
+    :param processes: Number of worker processes on this node, defaults to the number of CPUs
+    :param progress: Show a progress bar
+    :return: Dict of the shard, as written to its partial result file
+    """
+    from tqdm import tqdm
+
+    if not 0 <= shard < shards:
+        raise ValueError(f"Shard {shard} is not one of the {shards} shards.")
+    # Ship types of the spec are only used for this run, the workers get them from their initializer and the ship
+    # types and table of this process are left as they are
+    table = compile_ship_types({**get_ship_types(), **spec['ship_types']})
+    cells = spec['cells']
+    tasks = [(cell_index, chunk_index, cells[cell_index]['attacker'], cells[cell_index]['defender'], size, spec['seed'])
+             for cell_index, chunk_index, size in plan_chunks(spec)[shard::shards]]
+    results = {}
+    with Pool(processes, initializer=init_ship_table, initargs=(table.specs,)) as pool, \
+            tqdm(total=len(tasks), disable=not progress, unit='chunk') as progress_bar:
+        for cell_index, chunk_stats in pool.imap_unordered(_run_sweep_task, tasks):
+            if cell_index not in results:
+                results[cell_index] = CombatStats(cells[cell_index]['attacker'], cells[cell_index]['defender'])
+            results[cell_index].merge(chunk_stats)
+            progress_bar.update(1)
+    return {
+        'version': SHARD_VERSION,
+        'run': run_key(spec, shards, table),
+        'shard': shard,
+        'shards': shards,
+        'chunks': len(tasks),
+        'cells': {str(cell_index): stats.to_dict() for cell_index, stats in results.items()},
+    }
+
+
+def merge_shards(shard_data):
+    """ Merge the partial results of every shard of a run into exact totals
+    :param shard_data: List of shard dicts as returned by run_shard
+    :return: Dict of cell index to CombatStats
+    """
+    if not shard_data:
+        raise ValueError("There are no shards to merge.")
+    first = shard_data[0]
+    seen = set()
+    for data in shard_data:
+        if data.get('version') != SHARD_VERSION or data['run'] != first['run']:
+            raise ValueError(f"Shard {data.get('shard')} is not from the same run as shard {first['shard']}.")
+        if data['shard'] in seen:
+            raise ValueError(f"Shard {data['shard']} is given more than once.")
+        seen.add(data['shard'])
+    missing = sorted(set(range(first['shards'])) - seen)
+    if missing:
+        raise ValueError(f"Shards {missing} of {first['shards']} are missing.")
+
+    merged = {}
+    for data in sorted(shard_data, key=lambda data: data['shard']):
+        for cell_index, stats in data['cells'].items():
+            stats = CombatStats.from_dict(stats)
+            if int(cell_index) in merged:
+                merged[int(cell_index)].merge(stats)
+            else:
+                merged[int(cell_index)] = stats
+    return dict(sorted(merged.items()))
+
+
+# Function to describe the merged results of a cell as plain JSON friendly data, cell being its index in the spec
+def cell_summary(cell, stats, confidence=0.95):
+    return {
+        'cell': cell,
+        'attacker': stats.counts['attacker'],
+        'defender': stats.counts['defender'],
+        'iterations': stats.iterations,
+        'results': stats.results(),
+        'intervals': {side: stats.win_prob_interval(side, confidence) for side in SIDES},
+        'survivor_distribution': stats.survivors,
+    }
+
+
+def simulate_combat_shard(args=None):
+    """ Console entry point to run one shard of a run, or to merge the shard files of a run
+    :param args: Command line arguments, defaults to sys.argv
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Split a simulation over several nodes and merge the results.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('run', help="simulate one shard of a run")
+    run.add_argument('spec', help="JSON run spec with cells (or attacker and defender), iterations and seed")
+    run.add_argument('--shard', type=int, required=True, help="index of this shard, from 0")
+    run.add_argument('--shards', type=int, required=True, help="number of shards")
+    run.add_argument('--output', required=True, help="partial result file to write")
+    run.add_argument('--processes', type=int, help="worker processes, defaults to the number of CPUs")
+    merge = commands.add_parser('merge', help="merge the partial result files of every shard")
+    merge.add_argument('files', nargs='+', help="partial result files")
+    merge.add_argument('--output', help="file to write the merged results to, defaults to stdout")
+    merge.add_argument('--confidence', type=float, default=0.95, help="confidence level of the intervals")
+    options = parser.parse_args(args)
+
+    if options.command == 'run':
+        data = run_shard(read_spec(options.spec), options.shard, options.shards, options.processes)
+        write_json_atomic(options.output, data)
+        return
+
+    shard_data = []
+    for path in options.files:
+        with open(path) as file:
+            shard_data.append(json.load(file))
+    try:
+        merged = merge_shards(shard_data)
+    except ValueError as error:
+        parser.error(str(error))
+    summary = {'cells': [cell_summary(cell, stats, options.confidence) for cell, stats in merged.items()]}
+    if options.output:
+        write_json_atomic(options.output, summary)
+    else:
+        json.dump(summary, sys.stdout, indent=2)
+        print()
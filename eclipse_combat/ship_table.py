@@ -0,0 +1,130 @@
+from collections import namedtuple
+from contextlib import contextmanager
+from types import MappingProxyType
+from . import ship_types
+
+# Static data of one ship type, shared by every ship of that type in every battle.
+# threat and missile_threat are indexed by the shield of the fleet being attacked,
+# hit_threshold by the shield of the ship being fired at.
+# can_damage is True when the ship can damage an enemy in the combat rounds, with dice or rift cannons.
+ShipSpec = namedtuple('ShipSpec', ['type_id', 'name', 'type', 'hull', 'computer', 'shield', 'dice', 'missiles',
+                                   'rift_cannon', 'initiative', 'antimatter_splitter', 'threat', 'missile_threat',
+                                   'hit_threshold', 'can_damage'])
+
+# Immutable table of every ship type, with index mapping ship type names to their type_id
+ShipTable = namedtuple('ShipTable', ['specs', 'index', 'max_shield'])
+
+# Table compiled from SHIP_TYPES at the start of the last simulation
+_current_table = None
+
+
+# Function to calculate the chance a die hits a ship with the given shield
+def hit_chance(computer, shield):
+    return min(max((1 / 6) + (computer * (1 / 6)) - (shield * (1 / 6)), 1 / 6), 5 / 6)
+
+
+# Function to calculate the average damage output of a ship
+def calculate_average_damage(ship, target_shield):
+    total_damage = 0
+    for damage, count in ship['dice'].items():
+        total_damage += float(damage) * float(count) * hit_chance(ship['computer'], target_shield)
+    total_damage += ship['rift_cannon']
+    return total_damage
+
+
+# Function to calculate the average damage output of a ship with missiles
+def calculate_average_damage_missile(ship, target_shield):
+    total_damage = 0
+    for damage, count in ship['dice'].items():
+        total_damage += float(damage) * float(count) * hit_chance(ship['computer'], target_shield)
+    for damage, count in ship['missiles'].items():
+        total_damage += float(damage) * float(count) * hit_chance(ship['computer'], target_shield)
+    total_damage += ship['rift_cannon']
+    return total_damage
+
+
+# Function to find the lowest roll that hits, rolls of 1 always miss and rolls of 6 always hit
+def hit_threshold(computer, shield):
+    return min(max(6 - computer + shield, 2), 6)
+
+
+def compile_ship_types(types=None):
+    """ Compile ship types into an immutable table with the threat scores and hit thresholds precomputed
+    :param types: Dictionary of ship types to compile, defaults to SHIP_TYPES
+    :return: ShipTable
+    """
+    if types is None:
+        types = ship_types.get_ship_types()
+    for name, attributes in types.items():
+        if attributes['shield'] < 0 or attributes['computer'] < 0:
+            raise ValueError(f"Ship type '{name}' has a negative shield or computer.")
+
+    max_shield = max([attributes['shield'] for attributes in types.values()], default=0)
+    specs = []
+    for type_id, (name, attributes) in enumerate(types.items()):
+        specs.append(ShipSpec(
+            type_id=type_id,
+            name=name,
+            type=attributes['type'],
+            hull=attributes['hull'],
+            computer=attributes['computer'],
+            shield=attributes['shield'],
+            dice=tuple((int(damage), count) for damage, count in attributes['dice'].items()),
+            missiles=tuple((int(damage), count) for damage, count in attributes['missiles'].items()),
+            rift_cannon=attributes['rift_cannon'],
+            initiative=attributes['initiative'],
+            antimatter_splitter=attributes['antimatter_splitter'],
+            threat=tuple(calculate_average_damage(attributes, shield) for shield in range(max_shield + 1)),
+            missile_threat=tuple(calculate_average_damage_missile(attributes, shield)
+                                 for shield in range(max_shield + 1)),
+            hit_threshold=tuple(hit_threshold(attributes['computer'], shield) for shield in range(max_shield + 1)),
+            can_damage=bool(attributes['rift_cannon'] > 0 or
+                            any(int(damage) > 0 and count > 0 for damage, count in attributes['dice'].items())),
+        ))
+    return table_from_specs(specs)
+
+
+# Function to build a table from its compiled specs, e.g. specs sent to a worker process
+def table_from_specs(specs):
+    index = MappingProxyType({spec.name: spec.type_id for spec in specs})
+    return ShipTable(specs=tuple(specs), index=index, max_shield=max((spec.shield for spec in specs), default=0))
+
+
+# Function to compile SHIP_TYPES and use the result for the following simulations
+def load_ship_table():
+    global _current_table
+    _current_table = compile_ship_types()
+    return _current_table
+
+
+# Function to get the current ship table, compiling it on first use (e.g. in a worker process)
+def get_ship_table():
+    if _current_table is None:
+        return load_ship_table()
+    return _current_table
+
+
+# Function to use an already compiled table for the following simulations in this process, e.g. one with custom types
+def use_ship_table(table):
+    global _current_table
+    _current_table = table
+    return table
+
+
+# Context manager to simulate with an already compiled table inside the with block only, the table used before is
+# restored afterwards, so custom types of one run do not leak into the next
+@contextmanager
+def using_ship_table(table):
+    global _current_table
+    previous = _current_table
+    _current_table = table
+    try:
+        yield table
+    finally:
+        _current_table = previous
+
+
+# Function to use the table of the given specs in this process, as a pool initializer so workers simulate with
+# exactly the ship types of the parent, including ones that have not been saved
+def init_ship_table(specs):
+    use_ship_table(table_from_specs(specs))
@@ -1,10 +1,10 @@
 import os
+import copy
 import json
-import atexit
-import eclipse_combat
+import tempfile
 
 # Directory of the current script (package directory)
-PACKAGE_DIR = os.path.dirname(eclipse_combat.__file__)
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 # File to store ship types data within the package directory
 SHIP_TYPES_FILE = os.path.join(PACKAGE_DIR, "ship_types.json")
@@ -27,35 +27,80 @@ DEFAULT_SHIP_TYPES = {
                  'initiative': 3, 'antimatter_splitter': False},
 }
 
-# Load ship types data from file
-try:
-    with open(SHIP_TYPES_FILE, "r") as file:
-        SHIP_TYPES = json.load(file)
-except FileNotFoundError:
-    SHIP_TYPES = {}
-
-# Merge default ship types with loaded ship types
-for name, attributes in DEFAULT_SHIP_TYPES.items():
-    if name not in SHIP_TYPES:
-        SHIP_TYPES[name] = attributes
-
-
+# Ship types loaded from SHIP_TYPES_FILE, read on first use rather than on import
+_ship_types = None
+
+
+# Function to get the ship types, loading them from SHIP_TYPES_FILE and merging in the defaults on first use
+def get_ship_types():
+    global _ship_types
+    if _ship_types is None:
+        try:
+            with open(SHIP_TYPES_FILE, "r") as file:
+                _ship_types = json.load(file)
+        except FileNotFoundError:
+            _ship_types = {}
+
+        # Merge default ship types with loaded ship types
+        for name, attributes in DEFAULT_SHIP_TYPES.items():
+            if name not in _ship_types:
+                _ship_types[name] = copy.deepcopy(attributes)
+    return _ship_types
+
+
+# SHIP_TYPES is still available as a module attribute, it is loaded when first accessed
+def __getattr__(name):
+    if name == 'SHIP_TYPES':
+        return get_ship_types()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Function to find the permissions a file written to path should get: those of the file it replaces, or the ones
+# open() would give a new file under the current umask
+def _file_mode(path):
+    try:
+        return os.stat(path).st_mode & 0o777
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+# Function to write JSON to a temporary file first and then move it into place, so a process reading it, or another
+# process writing it at the same time, never sees a half written file
+def write_json_atomic(path, data, prefix='.tmp.'):
+    directory = os.path.dirname(os.path.abspath(path))
+    descriptor, temporary_path = tempfile.mkstemp(dir=directory, prefix=prefix, suffix='.json')
+    try:
+        with os.fdopen(descriptor, "w") as file:
+            json.dump(data, file)
+            file.flush()
+            os.fsync(file.fileno())
+        # mkstemp creates the file readable by its owner only
+        os.chmod(temporary_path, _file_mode(path))
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.unlink(temporary_path)
+        raise
+
+
+# Function to save the ship types atomically, see write_json_atomic
 def save_ship_types():
-    with open(SHIP_TYPES_FILE, "w") as file:
-        json.dump(SHIP_TYPES, file)
+    write_json_atomic(SHIP_TYPES_FILE, get_ship_types(), prefix='.ship_types.')
 
 def reset_ship_types_to_defaults():
-    global SHIP_TYPES
-    SHIP_TYPES = DEFAULT_SHIP_TYPES
+    ship_types = get_ship_types()
+    ship_types.clear()
+    ship_types.update(copy.deepcopy(DEFAULT_SHIP_TYPES))
     save_ship_types()
     print("Ship types reset to defaults successfully!")
 
 def create_ship_type(name, attributes):
-    SHIP_TYPES[name] = attributes
+    get_ship_types()[name] = attributes
 
 
 def get_ship_type(name):
-    return SHIP_TYPES.get(name)
+    return get_ship_types().get(name)
 
 def create_ship():
     print("Let's create a new ship type.")
@@ -124,22 +169,23 @@ def create_ship():
     attributes['antimatter_splitter'] = antimatter_splitter_input == 'True'
 
     create_ship_type(name, attributes)
+    save_ship_types()
 
     print(f"Ship type '{name}' created successfully!")
 
 
 def update_ship_type():
     print("Select a ship type to update:")
-    for index, name in enumerate(SHIP_TYPES, start=1):
+    for index, name in enumerate(get_ship_types(), start=1):
         print(f"{index}. {name}")
 
     choice = input("Enter the number corresponding to the ship type to update (0 to cancel): ")
-    if not choice.isdigit() or int(choice) <= 0 or int(choice) > len(SHIP_TYPES):
+    if not choice.isdigit() or int(choice) <= 0 or int(choice) > len(get_ship_types()):
         print("Invalid choice.")
         return
 
     choice = int(choice)
-    name = list(SHIP_TYPES.keys())[choice - 1]
+    name = list(get_ship_types().keys())[choice - 1]
     ship = get_ship_type(name)
 
     print(f"Current attributes for '{name}':")
@@ -189,12 +235,13 @@ def update_ship_type():
                 else:
                     ship[attr] = value
 
+    save_ship_types()
     print(f"Ship type '{name}' updated successfully!")
 
 
 def list_ship_types():
     print("List of currently saved ship types:")
-    for name, attributes in SHIP_TYPES.items():
+    for name, attributes in get_ship_types().items():
         print(f"\n{name}:")
         for attr, value in attributes.items():
             if isinstance(value, dict):  # Format nested dictionaries (e.g., dice, missiles)
@@ -207,21 +254,19 @@ def list_ship_types():
 
 def delete_ship_type():
     print("Select a ship type to delete:")
-    for index, name in enumerate(SHIP_TYPES, start=1):
+    for index, name in enumerate(get_ship_types(), start=1):
         print(f"{index}. {name}")
 
     choice = input("Enter the number corresponding to the ship type to delete (0 to cancel): ")
     if choice.isdigit():
         choice = int(choice)
-        if 0 < choice <= len(SHIP_TYPES):
-            name = list(SHIP_TYPES.keys())[choice - 1]
-            del SHIP_TYPES[name]
+        if 0 < choice <= len(get_ship_types()):
+            name = list(get_ship_types().keys())[choice - 1]
+            del get_ship_types()[name]
+            save_ship_types()
             print(f"Ship type '{name}' deleted successfully!")
         else:
             print("Invalid choice.")
     else:
         print("Invalid input. Please enter a number.")
 
-
-# Call save_ship_types() when the program exits to ensure data persistence
-atexit.register(save_ship_types)
@@ -0,0 +1,159 @@
+from math import sqrt
+from statistics import NormalDist
+from .counters import CombatCounters
+from .distribution import OutcomeDistribution
+
+SIDES = ('attacker', 'defender')
+
+
+# Function to find which side won a finished battle from the ships left in each fleet, None when nobody won
+def winner(attacker_fleet, defender_fleet):
+    if attacker_fleet and not defender_fleet:
+        return 'attacker'
+    if defender_fleet and not attacker_fleet:
+        return 'defender'
+    return None
+
+
+class CombatStats:
+    """ Mergeable running totals of battle outcomes. Each worker fills one for its chunk of battles and the
+    parent merges them as they arrive, so memory stays the same whatever the number of iterations.
+
+    Battles that nobody wins are draws when both fleets are destroyed and stalemates when both fleets are left, because
+    no ship in either can damage the other any more. Every engine counts them the same way, see OutcomeDistribution.
+
+    Survivors are only recorded for the side that won, as in simulate_combat. For every ship type there is a
+    histogram of how many ships survived (index = number of survivors) and the sum and sum of squares of the
+    survivor counts.
+
+    counters holds the CombatCounters of the battles when the simulation was instrumented, otherwise None.
+    distribution holds the OutcomeDistribution of the battles when it was asked for, otherwise None.
+    """
+
+    def __init__(self, attacker_counts, defender_counts):
+        self.counts = {'attacker': dict(attacker_counts), 'defender': dict(defender_counts)}
+        self.iterations = 0
+        self.wins = {side: 0 for side in SIDES}
+        self.draws = 0
+        self.stalemates = 0
+        self.survivors = {side: {ship_type: [0] * (count + 1) for ship_type, count in self.counts[side].items()}
+                          for side in SIDES}
+        self.survivor_sum = {side: {ship_type: 0 for ship_type in self.counts[side]} for side in SIDES}
+        self.survivor_sum_sq = {side: {ship_type: 0 for ship_type in self.counts[side]} for side in SIDES}
+        self.counters = None
+        self.distribution = None
+
+    # Function to record one finished battle from the ships left in each fleet
+    def add(self, attacker_fleet, defender_fleet):
+        self.iterations += 1
+        side = winner(attacker_fleet, defender_fleet)
+        if side is None:
+            if attacker_fleet:
+                self.stalemates += 1
+            else:
+                self.draws += 1
+            return
+        fleet = attacker_fleet if side == 'attacker' else defender_fleet
+        self.wins[side] += 1
+        for ship_type in self.counts[side]:
+            survived = sum(ship.spec.name == ship_type for ship in fleet)
+            self.survivors[side][ship_type][survived] += 1
+            self.survivor_sum[side][ship_type] += survived
+            self.survivor_sum_sq[side][ship_type] += survived * survived
+
+    # Function to record many battles at once from the wins of each side, the survivor histograms of the winners and
+    # the number of stalemates, the rest are draws
+    def add_many(self, iterations, wins, survivors, stalemates=0):
+        self.iterations += iterations
+        self.stalemates += stalemates
+        self.draws += iterations - sum(wins.values()) - stalemates
+        for side in SIDES:
+            self.wins[side] += wins[side]
+            for ship_type, histogram in survivors[side].items():
+                for survived, frequency in enumerate(histogram):
+                    self.survivors[side][ship_type][survived] += frequency
+                    self.survivor_sum[side][ship_type] += survived * frequency
+                    self.survivor_sum_sq[side][ship_type] += survived * survived * frequency
+
+    # Function to add the totals of another CombatStats for the same matchup into this one
+    def merge(self, other):
+        self.add_many(other.iterations, other.wins, other.survivors, other.stalemates)
+        if other.counters is not None:
+            if self.counters is None:
+                self.counters = CombatCounters()
+            self.counters.merge(other.counters)
+        if other.distribution is not None:
+            if self.distribution is None:
+                self.distribution = OutcomeDistribution.from_dict(other.distribution.to_dict())
+            else:
+                self.distribution.merge(other.distribution)
+        return self
+
+    # Function to convert the totals to plain JSON friendly data
+    def to_dict(self):
+        data = {
+            'attacker_counts': self.counts['attacker'],
+            'defender_counts': self.counts['defender'],
+            'iterations': self.iterations,
+            'wins': self.wins,
+            'stalemates': self.stalemates,
+            'survivors': self.survivors,
+        }
+        if self.counters is not None:
+            data['counters'] = self.counters.to_dict()
+        if self.distribution is not None:
+            data['distribution'] = self.distribution.to_dict()
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls(data['attacker_counts'], data['defender_counts'])
+        stats.add_many(data['iterations'], data['wins'], data['survivors'], data.get('stalemates', 0))
+        if 'counters' in data:
+            stats.counters = CombatCounters.from_dict(data['counters'])
+        if 'distribution' in data:
+            stats.distribution = OutcomeDistribution.from_dict(data['distribution'])
+        return stats
+
+    def win_prob(self, side):
+        return self.wins[side] / self.iterations if self.iterations else 0
+
+    # Function to calculate the Wilson score interval of a sides win probability
+    def win_prob_interval(self, side, confidence=0.95):
+        n = self.iterations
+        if not n:
+            return 0.0, 1.0
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        p = self.wins[side] / n
+        centre = (p + z * z / (2 * n)) / (1 + z * z / n)
+        half_width = z * sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+        return max(centre - half_width, 0.0), min(centre + half_width, 1.0)
+
+    # Function to check whether both win probabilities are known to within +-precision
+    def precise_enough(self, precision, confidence=0.95):
+        for side in SIDES:
+            low, high = self.win_prob_interval(side, confidence)
+            if (high - low) / 2 > precision:
+                return False
+        return True
+
+    def survival_avg(self, side):
+        wins = self.wins[side]
+        return {ship_type: total / wins if wins else 0 for ship_type, total in self.survivor_sum[side].items()}
+
+    def survival_std(self, side):
+        wins = self.wins[side]
+        averages = self.survival_avg(side)
+        return {ship_type: max(total / wins - averages[ship_type] ** 2, 0) ** 0.5 if wins else 0
+                for ship_type, total in self.survivor_sum_sq[side].items()}
+
+    # Function to build the results dict returned by simulate_combat
+    def results(self):
+        return {
+            'attacker_win_prob': self.win_prob('attacker'),
+            'defender_win_prob': self.win_prob('defender'),
+            'draw_prob': self.draws / self.iterations if self.iterations else 0,
+            'stalemate_prob': self.stalemates / self.iterations if self.iterations else 0,
+            'attacker_survival_avg': self.survival_avg('attacker'),
+            'defender_survival_avg': self.survival_avg('defender'),
+        }
@@ -0,0 +1,97 @@
+import itertools
+from multiprocessing import Pool
+from .analysis import decided_outcome
+from .combat import DEFAULT_CHUNK_SIZE, SHIP_CATEGORY_LIMITS, chunk_sizes, simulate_combat_chunk
+from .rng import stream
+from .ship_table import init_ship_table, load_ship_table
+from .stats import CombatStats
+
+
+# Function to list every fleet made from ship_names that stays within the category limits.
+# Ships of the same category share its limit, and empty fleets are left out.
+def fleet_compositions(ship_names, limits=SHIP_CATEGORY_LIMITS, table=None):
+    if table is None:
+        table = load_ship_table()
+    categories = [table.specs[table.index[name]].type for name in ship_names]
+    ranges = [range(limits.get(category, 0) + 1) for category in categories]
+    compositions = []
+    for counts in itertools.product(*ranges):
+        used = {}
+        for category, count in zip(categories, counts):
+            used[category] = used.get(category, 0) + count
+        if any(count > limits.get(category, 0) for category, count in used.items()) or not any(counts):
+            continue
+        compositions.append({name: count for name, count in zip(ship_names, counts) if count})
+    return compositions
+
+
+# Function to estimate the relative cost of simulating one battle of a matchup
+def battle_cost(attacker_counts, defender_counts, table):
+    ships = 0
+    hull = 0
+    for counts in (attacker_counts, defender_counts):
+        for name, count in counts.items():
+            ships += count
+            hull += count * (table.specs[table.index[name]].hull + 1)
+    return ships * hull
+
+
+def _run_sweep_task(task):
+    index, chunk_index, attacker_counts, defender_counts, size, seed = task
+    return index, simulate_combat_chunk(attacker_counts, defender_counts, size, stream(seed, index, chunk_index))
+
+
+def sweep(cells, iterations, chunk_size=DEFAULT_CHUNK_SIZE, processes=None, progress=True, seed=None):
+    """ Simulate many matchups over one shared worker pool, yielding each one as soon as it is finished.
+    Cells are cut into chunks and the most expensive chunks are started first so the workers stay busy,
+    and matchups that are decided before a die is rolled are answered without simulating them.
+    :param cells: List of (attacker_counts, defender_counts) pairs
+    :param iterations: Number of battles to simulate per cell
+    :param chunk_size: Largest number of battles in one worker task
+    :param processes: Number of worker processes, defaults to the number of CPUs
+    :param progress: Show a progress bar
+    :param seed: Root seed, every chunk of every cell rolls from its own stream derived from it
+    :return: Generator of (cell index, attacker_counts, defender_counts, CombatStats) in order of completion
+    """
+    table = load_ship_table()
+    tasks = []
+    remaining_chunks = {}
+    results = {}
+    for index, (attacker_counts, defender_counts) in enumerate(cells):
+        stats = decided_outcome(attacker_counts, defender_counts, iterations, table)
+        if stats is not None:
+            yield index, attacker_counts, defender_counts, stats
+            continue
+        cost = battle_cost(attacker_counts, defender_counts, table)
+        results[index] = CombatStats(attacker_counts, defender_counts)
+        remaining_chunks[index] = 0
+        for chunk_index, size in enumerate(chunk_sizes(iterations, chunk_size)):
+            tasks.append((cost * size, (index, chunk_index, attacker_counts, defender_counts, size, seed)))
+            remaining_chunks[index] += 1
+    if not tasks:
+        return
+
+    from tqdm import tqdm
+
+    tasks.sort(key=lambda task: -task[0])
+    with Pool(processes, initializer=init_ship_table, initargs=(table.specs,)) as pool, \
+            tqdm(total=len(tasks), disable=not progress, unit='chunk') as progress_bar:
+        for index, chunk_stats in pool.imap_unordered(_run_sweep_task, [task for _, task in tasks]):
+            results[index].merge(chunk_stats)
+            remaining_chunks[index] -= 1
+            progress_bar.update(1)
+            if remaining_chunks[index] == 0:
+                stats = results.pop(index)
+                yield index, cells[index][0], cells[index][1], stats
+
+
+def sweep_matrix(attackers, defenders, iterations, **kwargs):
+    """ Simulate every attacker fleet against every defender fleet, e.g. N blueprints against M blueprints
+    :param attackers: List of attacker ship count dicts
+    :param defenders: List of defender ship count dicts
+    :param iterations: Number of battles to simulate per cell
+    :param kwargs: Passed on to sweep
+    :return: Dict of (attacker index, defender index) to CombatStats
+    """
+    cells = [(attacker, defender) for attacker in attackers for defender in defenders]
+    return {divmod(index, len(defenders)): stats for index, _, _, stats in sweep(cells, iterations, **kwargs)}
@@ -0,0 +1,277 @@
+import numpy as np
+from timeit import default_timer as time
+from .combat import RIFT_CANNON_SIDES, input_fleet, print_results
+from .ship_table import load_ship_table
+from .stats import CombatStats
+
+# Rift cannon faces in the order assign_rift_cannon resolves them
+RIFT_SIDES = list(RIFT_CANNON_SIDES.keys())
+RIFT_DAMAGE_TARGET = np.array([RIFT_CANNON_SIDES[side].get('damage_target', 0) for side in RIFT_SIDES])
+RIFT_DAMAGE_SELF = np.array([RIFT_CANNON_SIDES[side].get('damage_self', 0) for side in RIFT_SIDES])
+
+# Number of battles simulated together in one set of arrays
+DEFAULT_BATCH_SIZE = 50000
+
+
+# Function to turn a ship specs (damage, count) dice or missile pairs into the order the dice are resolved in.
+# Each entry is (damage, roll index) so the four hits of an antimatter split die share one roll.
+def dice_plan(dice, antimatter_splitter=False):
+    groups = {}
+    n_rolls = 0
+    for damage, count in dice:
+        groups.setdefault(damage, [])
+        for _ in range(count):
+            if damage == 4 and antimatter_splitter:
+                groups.setdefault(1, []).extend([n_rolls] * 4)
+            else:
+                groups[damage].append(n_rolls)
+            n_rolls += 1
+    plan = [(damage, roll) for damage, roll_indices in groups.items() for roll in roll_indices]
+    return plan, n_rolls
+
+
+# Function to rank threat levels so equal threats share a rank (0 is the biggest threat)
+def threat_ranks(threats):
+    distinct = sorted(set(threats), reverse=True)
+    return np.array([distinct.index(threat) for threat in threats])
+
+
+class FleetLayout:
+    """ Static per-ship arrays for one matchup. Ships are laid out attacker first, then defender,
+    in the same order create_fleet builds them, so position ties break exactly as in combat.py.
+    """
+
+    def __init__(self, attacker_counts, defender_counts, table=None):
+        if table is None:
+            table = load_ship_table()
+        names = []
+        sides = []
+        for is_defender, counts in ((0, attacker_counts), (1, defender_counts)):
+            for ship_type, count in counts.items():
+                names.extend([ship_type] * count)
+                sides.extend([is_defender] * count)
+        specs = [table.specs[table.index[name]] for name in names]
+
+        self.names = names
+        self.size = len(names)
+        self.side = np.array(sides, dtype=np.int64)
+        self.hull = np.array([spec.hull for spec in specs], dtype=np.int64)
+        self.computer = np.array([spec.computer for spec in specs], dtype=np.int64)
+        self.shield = np.array([spec.shield for spec in specs], dtype=np.int64)
+        self.initiative = np.array([spec.initiative for spec in specs], dtype=np.int64)
+        self.rift_cannon = np.array([spec.rift_cannon for spec in specs], dtype=np.int64)
+        self.can_damage = np.array([spec.can_damage for spec in specs], dtype=bool)
+        self.hit_threshold = np.array([spec.hit_threshold for spec in specs],
+                                      dtype=np.int64).reshape(self.size, table.max_shield + 1)
+        self.dice = [dice_plan(spec.dice, spec.antimatter_splitter) for spec in specs]
+        self.missiles = [dice_plan(spec.missiles) for spec in specs]
+        self.slots = [np.flatnonzero(self.side == 0), np.flatnonzero(self.side == 1)]
+
+        # Initiative order used by simulate_combat_round and missile_attack
+        self.order = sorted(range(self.size), key=lambda i: (self.initiative[i], self.side[i], i), reverse=True)
+
+        # Largest value a hull criterion can take, used to pack the targeting key into one integer
+        max_damage = max([1] + [damage for plan, _ in self.dice + self.missiles for damage, _ in plan] +
+                         [int(RIFT_DAMAGE_TARGET.max())])
+        self.key_base = int(self.hull.max(initial=0)) + max_damage + 2
+
+        # Threat ranks of each enemy ship for every shield value the attacking fleet can have
+        self.shield_values = []
+        self.ranks = []
+        for side in (0, 1):
+            enemies = [specs[i] for i in self.slots[1 - side]]
+            shields = np.unique(self.shield[self.slots[side]])
+            self.shield_values.append(shields)
+            self.ranks.append(np.array([threat_ranks([enemy.threat[shield] for enemy in enemies])
+                                        for shield in shields]))
+
+        # Missile threat ranks depend on the firing ship's initiative as well, see select_target_missile
+        self.missile_ranks = {}
+        self.missile_ties = {}
+        for i in range(self.size):
+            if not self.missiles[i][0]:
+                continue
+            side = self.side[i]
+            enemy_slots = self.slots[1 - side]
+            lower = self.initiative[enemy_slots] < self.initiative[i]
+            rows = []
+            for shield in self.shield_values[side]:
+                threats = [specs[e].missile_threat[shield] if low else specs[e].threat[shield]
+                           for e, low in zip(enemy_slots, lower)]
+                rows.append(threat_ranks(threats))
+            self.missile_ranks[i] = np.array(rows)
+            self.missile_ties[i] = np.where(lower, 0, len(enemy_slots)) + np.arange(len(enemy_slots))
+
+
+# Function to pick a target for one die in every battle at once, following select_target's priorities
+def select_targets(layout, hull, ranks, ties, enemy_slots, hittable, damage):
+    enemy_hull = hull[:, enemy_slots]
+    base = layout.key_base
+    key = ranks * base + np.abs(enemy_hull - (damage - 1))
+    key = key * 2 + (enemy_hull < damage)
+    key = key * base + enemy_hull
+    key = key * (2 * len(enemy_slots)) + ties
+    hittable = hittable & (enemy_hull >= 0)
+    key = np.where(hittable, key, np.iinfo(np.int64).max)
+    return np.argmin(key, axis=1), hittable.any(axis=1)
+
+
+# Function to fire one ship in every battle in rows, using either its dice or its missiles
+def fire_dice(layout, hull, rows, slot, rng, missiles=False):
+    plan, n_rolls = layout.missiles[slot] if missiles else layout.dice[slot]
+    if not plan or len(rows) == 0:
+        return
+    side = layout.side[slot]
+    enemy_slots = layout.slots[1 - side]
+    ally_slots = layout.slots[side]
+
+    target_shield = np.where(hull[rows][:, ally_slots] >= 0, layout.shield[ally_slots], -1).max(axis=1)
+    shield_index = np.searchsorted(layout.shield_values[side], target_shield)
+    if missiles:
+        ranks = layout.missile_ranks[slot][shield_index]
+        ties = layout.missile_ties[slot]
+    else:
+        ranks = layout.ranks[side][shield_index]
+        ties = np.arange(len(enemy_slots))
+
+    rolls = rng.integers(1, 7, size=(len(rows), n_rolls))
+    needed = layout.hit_threshold[slot][layout.shield[enemy_slots]]
+    for damage, roll_index in plan:
+        roll = rolls[:, roll_index]
+        hittable = roll[:, None] >= needed
+        target, hit = select_targets(layout, hull[rows], ranks, ties, enemy_slots, hittable, damage)
+        hull[rows[hit], enemy_slots[target[hit]]] -= damage
+
+
+# Function to fire one ships rift cannons in every battle in rows, following assign_rift_cannon
+def fire_rift_cannon(layout, hull, rows, slot, rng):
+    count = layout.rift_cannon[slot]
+    if count == 0 or len(rows) == 0:
+        return
+    side = layout.side[slot]
+    enemy_slots = layout.slots[1 - side]
+    ally_slots = layout.slots[side]
+
+    ally_hull = hull[rows][:, ally_slots]
+    target_shield = np.where(ally_hull >= 0, layout.shield[ally_slots], -1).max(axis=1)
+    ranks = layout.ranks[side][np.searchsorted(layout.shield_values[side], target_shield)]
+    ties = np.arange(len(enemy_slots))
+
+    # The firing fleets rift cannon ship with the most hull takes all self damage
+    has_rift = (ally_hull >= 0) & (layout.rift_cannon[ally_slots] > 0)
+    self_target = ally_slots[np.argmax(np.where(has_rift, ally_hull, -1), axis=1)]
+
+    # Faces are resolved grouped by side in RIFT_CANNON_SIDES order, not in the order rolled
+    faces = np.sort(rng.integers(0, len(RIFT_SIDES), size=(len(rows), count)), axis=1)
+    for column in range(count):
+        face = faces[:, column]
+        damage_target = RIFT_DAMAGE_TARGET[face]
+        damage_self = RIFT_DAMAGE_SELF[face]
+        for damage in np.unique(damage_target):
+            same = damage_target == damage
+            sub_rows = rows[same]
+            hittable = np.ones((len(sub_rows), len(enemy_slots)), dtype=bool)
+            target, hit = select_targets(layout, hull[sub_rows], ranks[same], ties, enemy_slots, hittable,
+                                         int(damage))
+            hull[sub_rows[hit], enemy_slots[target[hit]]] -= damage
+            hull[sub_rows[hit], self_target[same][hit]] -= damage_self[same][hit]
+
+
+# Function to run every ship in initiative order for the battles in rows, as one combat round or the missile phase
+def fire_in_initiative_order(layout, hull, rows, rng, missiles=False):
+    for slot in layout.order:
+        if missiles and not layout.missiles[slot][0]:
+            continue
+        alive = hull[rows] >= 0
+        both_sides = alive[:, layout.slots[0]].any(axis=1) & alive[:, layout.slots[1]].any(axis=1)
+        firing = rows[both_sides & alive[:, slot]]
+        if missiles:
+            fire_dice(layout, hull, firing, slot, rng, missiles=True)
+        else:
+            fire_dice(layout, hull, firing, slot, rng)
+            fire_rift_cannon(layout, hull, firing, slot, rng)
+
+
+# Function to simulate a batch of battles and return the final hull of every ship in every battle
+def simulate_batch(layout, battles, rng):
+    hull = np.tile(layout.hull, (battles, 1))
+    rows = np.arange(battles)
+    fire_in_initiative_order(layout, hull, rows, rng, missiles=True)
+    while len(rows):
+        alive = hull[rows] >= 0
+        running = alive[:, layout.slots[0]].any(axis=1) & alive[:, layout.slots[1]].any(axis=1)
+        # Battles where no ship left can do damage would never end, they are stopped as stalemates like in fight
+        running &= (alive & layout.can_damage).any(axis=1)
+        rows = rows[running]
+        fire_in_initiative_order(layout, hull, rows, rng)
+    return hull
+
+
+def vectorized_combat_stats(attacker_counts, defender_counts, iterations, batch_size=DEFAULT_BATCH_SIZE, seed=None):
+    """ Simulate many battles at once using NumPy arrays instead of per ship objects
+    :param attacker_counts: Dictionary of ship types and their counts for the attacker
+    :param defender_counts: Dictionary of ship types and their counts for the defender
+    :param iterations: Number of battles to simulate
+    :param batch_size: Number of battles held in memory at once
+    :param seed: Optional seed for the NumPy random generator
+    :return: CombatStats of the battles
+    """
+    stats = CombatStats(attacker_counts, defender_counts)
+    if not any(attacker_counts.values()) and not any(defender_counts.values()):
+        # Without any ships every battle is a draw, as in the scalar engine
+        stats.add_many(iterations, {'attacker': 0, 'defender': 0}, {'attacker': {}, 'defender': {}})
+        return stats
+    layout = FleetLayout(attacker_counts, defender_counts)
+    rng = np.random.default_rng(seed)
+    names = np.array(layout.names, dtype=object)
+
+    remaining = iterations
+    while remaining > 0:
+        battles = min(batch_size, remaining)
+        remaining -= battles
+        alive = simulate_batch(layout, battles, rng) >= 0
+        side_alive = [alive[:, layout.slots[0]], alive[:, layout.slots[1]]]
+        won = [side_alive[0].any(axis=1) & ~side_alive[1].any(axis=1),
+               side_alive[1].any(axis=1) & ~side_alive[0].any(axis=1)]
+        wins = {}
+        survivors = {}
+        for side_index, (side, counts) in enumerate((('attacker', attacker_counts), ('defender', defender_counts))):
+            winners = side_alive[side_index][won[side_index]]
+            wins[side] = len(winners)
+            survivors[side] = {}
+            for ship_type, count in counts.items():
+                columns = names[layout.slots[side_index]] == ship_type
+                survivors[side][ship_type] = np.bincount(winners[:, columns].sum(axis=1),
+                                                         minlength=count + 1).tolist()
+        stalemates = int((side_alive[0].any(axis=1) & side_alive[1].any(axis=1)).sum())
+        stats.add_many(battles, wins, survivors, stalemates)
+    return stats
+
+
+def run_combat_vectorized(attacker_counts, defender_counts, iterations, batch_size=DEFAULT_BATCH_SIZE, seed=None):
+    """ Simulate many battles at once using NumPy arrays instead of per ship objects
+    :param attacker_counts: Dictionary of ship types and their counts for the attacker
+    :param defender_counts: Dictionary of ship types and their counts for the defender
+    :param iterations: Number of battles to simulate
+    :param batch_size: Number of battles held in memory at once
+    :param seed: Optional seed for the NumPy random generator
+    :return: Results dict in the same format as simulate_combat
+    """
+    return vectorized_combat_stats(attacker_counts, defender_counts, iterations, batch_size, seed).results()
+
+
+def simulate_combat_vectorized():
+    """ Simulate a battle with the vectorized NumPy engine.
+    :return: None
+    """
+    print("Let's simulate a combat!")
+
+    attacker_counts = input_fleet("attacker")
+    defender_counts = input_fleet("defender")
+    iterations = int(input("Enter the number of combat iterations: "))
+
+    start_time = time()
+    results = run_combat_vectorized(attacker_counts, defender_counts, iterations)
+    end_time = time()
+    print(f"Simulated {iterations} combat iterations in {end_time - start_time:.2f} seconds.")
+    print_results(results)
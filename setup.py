@@ -6,6 +6,8 @@ setup(
     packages=find_packages(),
     install_requires=[
         # List your dependencies here
+        'tqdm',
+        'numpy',
     ],
     entry_points={
         'console_scripts': [
@@ -15,6 +17,15 @@ setup(
             'delete_ship_type = eclipse_combat.ship_types:delete_ship_type',
             'simulate_combat = eclipse_combat.combat:simulate_combat',
             'simulate_combat_parallel = eclipse_combat.combat:simulate_combat_parallel',
+            'simulate_combat_vectorized = eclipse_combat.vectorized:simulate_combat_vectorized',
+            'simulate_combat_exact = eclipse_combat.exact:simulate_combat_exact',
+            'simulate_combat_batch = eclipse_combat.batch:simulate_combat_batch',
+            'simulate_combat_checkpointed = eclipse_combat.checkpoint:simulate_combat_checkpointed',
+            'simulate_combat_shard = eclipse_combat.shard:simulate_combat_shard',
+            'optimize_combat = eclipse_combat.optimize:optimize_combat',
+            'simulate_combat_sensitivity = eclipse_combat.sensitivity:simulate_combat_sensitivity',
+            'simulation_service = eclipse_combat.service:simulation_service',
+            'benchmark_combat = eclipse_combat.benchmark:benchmark_combat',
             'reset_ship_types = eclipse_combat.ship_types:reset_ship_types_to_defaults',
         ],
     },
@@ -0,0 +1,18 @@
+import copy
+import pytest
+from eclipse_combat import ship_table, ship_types
+
+# Ship type with a single missile and no dice, so battles between them end in stalemates once the missiles are fired
+MISSILE_BOAT = {'type': 'interceptor', 'hull': 0, 'computer': 0, 'shield': 0, 'dice': {}, 'rift_cannon': 0,
+                'missiles': {'2': 1}, 'initiative': 2, 'antimatter_splitter': False}
+
+
+# Every test simulates with the default ship types plus MISSILE_BOAT, never reading or writing the saved ship types
+@pytest.fixture(autouse=True)
+def default_ship_types(monkeypatch, tmp_path):
+    types = copy.deepcopy(ship_types.DEFAULT_SHIP_TYPES)
+    types['Missile Boat'] = copy.deepcopy(MISSILE_BOAT)
+    monkeypatch.setattr(ship_types, 'SHIP_TYPES_FILE', str(tmp_path / 'ship_types.json'))
+    monkeypatch.setattr(ship_types, '_ship_types', types)
+    monkeypatch.setattr(ship_table, '_current_table', None)
+    return types
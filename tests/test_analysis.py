@@ -0,0 +1,57 @@
+import pytest
+from eclipse_combat.analysis import MatchupAnalysis, decided_outcome
+from eclipse_combat.ship_table import compile_ship_types
+from eclipse_combat.ship_types import DEFAULT_SHIP_TYPES
+
+UNARMED = dict(DEFAULT_SHIP_TYPES['Cruiser'], dice={})
+RIFT = dict(DEFAULT_SHIP_TYPES['Dreadnought'], dice={}, rift_cannon=1)
+
+
+@pytest.fixture
+def table(default_ship_types):
+    return compile_ship_types(dict(default_ship_types, Unarmed=UNARMED, Rift=RIFT))
+
+
+@pytest.mark.parametrize('attacker, defender, winner', [
+    ({'Cruiser': 1}, {}, 'attacker'),
+    ({}, {'Cruiser': 1}, 'defender'),
+    ({}, {}, 'draw'),
+    ({'Cruiser': 1}, {'Unarmed': 2}, 'attacker'),
+    ({'Unarmed': 1}, {'Interceptor': 1}, 'defender'),
+    ({'Unarmed': 1}, {'Unarmed': 1}, 'draw'),
+    ({'Cruiser': 1}, {'Interceptor': 1}, None),
+    ({'Cruiser': 1}, {'Missile Boat': 1}, None),
+    # Rift cannons can destroy their own ship, so the win is not certain
+    ({'Rift': 1}, {'Unarmed': 1}, None),
+])
+def test_winner(table, attacker, defender, winner):
+    assert MatchupAnalysis(attacker, defender, table).winner == winner
+
+
+def test_stalemate_when_nothing_can_damage_after_the_missiles(table):
+    assert MatchupAnalysis({'Missile Boat': 1}, {'Missile Boat': 1}, table).stalemate
+    assert not MatchupAnalysis({'Missile Boat': 1}, {'Cruiser': 1}, table).stalemate
+
+
+def test_win_bounds(table):
+    decided = MatchupAnalysis({'Cruiser': 1}, {'Unarmed': 1}, table)
+    assert decided.win_bounds == {'attacker': (1.0, 1.0), 'defender': (0.0, 0.0)}
+    # The missiles may not destroy the unarmed ship, but it can never win
+    unarmed = MatchupAnalysis({'Unarmed': 1}, {'Missile Boat': 1}, table)
+    assert unarmed.winner is None
+    assert unarmed.win_bounds == {'attacker': (0.0, 0.0), 'defender': (0.0, 1.0)}
+    # The rift cannon can destroy its own ship, so the unarmed defender can still win
+    rift = MatchupAnalysis({'Rift': 1}, {'Unarmed': 1}, table)
+    assert rift.win_bounds == {'attacker': (0.0, 1.0), 'defender': (0.0, 1.0)}
+    open_matchup = MatchupAnalysis({'Cruiser': 1}, {'Interceptor': 1}, table)
+    assert open_matchup.win_bounds == {'attacker': (0.0, 1.0), 'defender': (0.0, 1.0)}
+
+
+def test_decided_outcome_counts_every_battle(table):
+    stats = decided_outcome({'Cruiser': 2}, {'Unarmed': 1}, 300, table)
+    assert stats.wins == {'attacker': 300, 'defender': 0}
+    assert stats.survivors['attacker']['Cruiser'] == [0, 0, 300]
+    stalemate = decided_outcome({'Unarmed': 1}, {'Unarmed': 1}, 300, table)
+    assert (stalemate.draws, stalemate.stalemates) == (0, 300)
+    assert decided_outcome({}, {}, 300, table).draws == 300
+    assert decided_outcome({'Cruiser': 1}, {'Interceptor': 1}, 300, table) is None
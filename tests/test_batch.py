@@ -0,0 +1,77 @@
+import io
+import json
+import pytest
+from eclipse_combat import batch
+from eclipse_combat.batch import read_scenarios, run_batch, simulate_combat_batch
+from eclipse_combat.ship_types import DEFAULT_SHIP_TYPES
+
+VALID = {'id': 'ok', 'attacker': {'Cruiser': 2}, 'defender': {'Dreadnought': 1}, 'iterations': 300, 'seed': 1}
+
+
+def results_by_id(scenarios, **kwargs):
+    return {result['id']: result for result in run_batch(scenarios, **dict(dict(processes=1, chunk_size=100), **kwargs))}
+
+
+@pytest.mark.parametrize('scenario, error', [
+    ({'attacker': {'Cruiser': 1}, 'defender': {'Ancient': 1}}, 'iterations or precision'),
+    ({'attacker': {'Cruiser': 1}, 'defender': {'Ancient': 1}, 'iterations': 10, 'precision': 0.01},
+     'iterations or precision'),
+    ({'attacker': {'Cruiser': 1}, 'defender': {'Ancient': 1}, 'iterations': -5}, "'iterations'"),
+    ({'attacker': {'Cruiser': 1}, 'defender': {'Ancient': 1}, 'precision': 2}, "'precision'"),
+    ({'attacker': {'Cruiser': 1}, 'defender': {'Ancient': 1}, 'iterations': 10, 'seed': 'x'}, "'seed'"),
+    ({'attacker': {'Battleship': 1}, 'defender': {'Ancient': 1}, 'iterations': 10}, 'Unknown ship type'),
+    ({'attacker': [1], 'defender': {'Ancient': 1}, 'iterations': 10}, "'attacker'"),
+    ({'attacker': {'Odd': 1}, 'defender': {'Ancient': 1}, 'iterations': 10, 'ship_types': {'Odd': {'hull': 1}}},
+     'Invalid ship type'),
+])
+def test_invalid_scenarios_give_error_lines(scenario, error):
+    results = results_by_id([dict(scenario, id='bad'), VALID])
+    assert error in results['bad']['error']
+    assert results['ok']['iterations'] == 300
+
+
+def test_failing_chunk_gives_one_error_line_and_the_batch_goes_on(monkeypatch):
+    simulate_combat_chunk = batch.simulate_combat_chunk
+
+    def fail_for_ancients(attacker_counts, defender_counts, *args):
+        if 'Ancient' in defender_counts:
+            raise RuntimeError("chunk failed")
+        return simulate_combat_chunk(attacker_counts, defender_counts, *args)
+
+    monkeypatch.setattr(batch, 'simulate_combat_chunk', fail_for_ancients)
+    failing = {'id': 'fails', 'attacker': {'Cruiser': 1}, 'defender': {'Ancient': 1}, 'iterations': 500}
+    results = list(run_batch([failing, VALID], processes=1, chunk_size=100))
+    assert [result['id'] for result in results].count('fails') == 1
+    errors = {result['id']: result.get('error') for result in results}
+    assert errors == {'fails': 'RuntimeError: chunk failed', 'ok': None}
+
+
+def test_custom_ship_types_are_used_only_by_their_scenario():
+    custom = dict(VALID, id='custom', ship_types={'Cruiser': dict(DEFAULT_SHIP_TYPES['Dreadnought'], hull=8)})
+    results = results_by_id([custom, VALID])
+    assert results['custom']['results']['attacker_win_prob'] > results['ok']['results']['attacker_win_prob']
+
+
+def test_seeded_batch_does_not_depend_on_the_process_count():
+    scenarios = [VALID, dict(VALID, id='precise', iterations=None, precision=0.05)]
+    scenarios[1].pop('iterations')
+    single = results_by_id(scenarios)
+    pooled = results_by_id(scenarios, processes=2)
+    assert single == pooled
+
+
+def test_scenarios_are_read_as_json_lines_lists_or_objects():
+    lines = '{"id": 1}\n\nnot json\n{"id": 2}\n'
+    read = list(read_scenarios(io.StringIO(lines)))
+    assert read[0] == {'id': 1} and read[2] == {'id': 2}
+    assert 'Invalid JSON line' in read[1].error
+    assert list(read_scenarios(io.StringIO('[{"id": 1}, {"id": 2}]'))) == [{'id': 1}, {'id': 2}]
+    assert list(read_scenarios(io.StringIO('{"scenarios": [{"id": 1}]}'))) == [{'id': 1}]
+
+
+def test_command_prints_one_json_line_per_scenario(tmp_path, capsys):
+    path = tmp_path / 'scenarios.jsonl'
+    path.write_text(json.dumps(VALID) + '\n' + json.dumps({'id': 'bad'}) + '\n')
+    simulate_combat_batch([str(path), '--processes', '1'])
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert {line['id'] for line in lines} == {'ok', 'bad'}
@@ -0,0 +1,64 @@
+import pytest
+from eclipse_combat.cache import ResultCache, matchup_key, run_combat_cached
+from eclipse_combat.stats import CombatStats
+
+ATTACKER = {'Cruiser': 2}
+DEFENDER = {'Dreadnought': 1}
+RUN = dict(processes=1, progress=False, seed=1)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    with ResultCache(str(tmp_path / 'results.sqlite')) as cache:
+        yield cache
+
+
+# Function to build totals of a matchup with the given number of attacker wins and no other battles
+def attacker_wins(iterations):
+    stats = CombatStats(ATTACKER, DEFENDER)
+    stats.add_many(iterations, {'attacker': iterations, 'defender': 0}, {'attacker': {'Cruiser': [0, 0, iterations]},
+                                                                        'defender': {}})
+    return stats
+
+
+def test_repeated_matchup_is_answered_from_the_cache(cache):
+    first = run_combat_cached(ATTACKER, DEFENDER, iterations=1000, cache=cache, **RUN)
+    second = run_combat_cached(ATTACKER, DEFENDER, iterations=1000, cache=cache, **RUN)
+    assert second.to_dict() == first.to_dict()
+
+
+def test_other_options_are_not_answered_from_the_cache(cache):
+    run_combat_cached(ATTACKER, DEFENDER, iterations=1000, cache=cache, **RUN)
+    key = matchup_key(ATTACKER, DEFENDER, 'parallel', options={'seed': 2, 'instrument': False, 'distribution': False})
+    assert cache.get(key, 1000) is None
+    stats = run_combat_cached(ATTACKER, DEFENDER, iterations=1000, cache=cache, processes=1, progress=False,
+                              seed=1, distribution=True)
+    assert stats.distribution is not None
+
+
+def test_result_with_more_iterations_answers_fewer(cache):
+    cache.put('matchup', attacker_wins(5000))
+    assert cache.get('matchup', 1000).iterations == 5000
+    assert cache.get('matchup', 10000) is None
+    assert cache.get('matchup', precision=0.01) is not None
+
+
+def test_result_with_fewer_iterations_does_not_replace_more(cache):
+    cache.put('matchup', attacker_wins(5000))
+    cache.put('matchup', attacker_wins(100))
+    assert cache.get('matchup').iterations == 5000
+
+
+def test_least_recently_used_results_are_evicted(tmp_path):
+    with ResultCache(str(tmp_path / 'results.sqlite'), max_entries=2) as cache:
+        cache.put('first', attacker_wins(10))
+        cache.put('second', attacker_wins(10))
+        cache.get('first')
+        cache.put('third', attacker_wins(10))
+        assert cache.get('second') is None
+        assert cache.get('first') is not None and cache.get('third') is not None
+
+
+def test_cache_needs_iterations_or_precision(cache):
+    with pytest.raises(ValueError):
+        run_combat_cached(ATTACKER, DEFENDER, cache=cache)
@@ -0,0 +1,75 @@
+import json
+import pytest
+from eclipse_combat import checkpoint
+from eclipse_combat.checkpoint import load_checkpoint, run_combat_checkpointed
+from eclipse_combat.combat import run_combat_parallel
+from eclipse_combat.stats import CombatStats
+
+ATTACKER = {'Cruiser': 2}
+DEFENDER = {'Dreadnought': 1}
+RUN = dict(iterations=1000, chunk_size=200, processes=1, progress=False, seed=5)
+
+
+# Function to stop a run with Ctrl+C after its first chunk
+def interrupt_after_first_chunk(iterate_chunks):
+    def iterate(*args, **kwargs):
+        chunks = iterate_chunks(*args, **kwargs)
+        yield next(chunks)
+        raise KeyboardInterrupt
+    return iterate
+
+
+def test_resumed_run_matches_an_uninterrupted_run(tmp_path, monkeypatch):
+    path = str(tmp_path / 'run.json')
+    with monkeypatch.context() as patch:
+        patch.setattr(checkpoint, 'iterate_chunks', interrupt_after_first_chunk(checkpoint.iterate_chunks))
+        with pytest.raises(KeyboardInterrupt):
+            run_combat_checkpointed(path, ATTACKER, DEFENDER, **RUN)
+    state = load_checkpoint(path)
+    assert not state['finished']
+    assert state['chunks'] == 1
+    assert state['stats'].iterations == 200
+
+    resumed = run_combat_checkpointed(path, processes=1, progress=False)
+    uninterrupted = run_combat_parallel(ATTACKER, DEFENDER, RUN['iterations'], chunk_size=RUN['chunk_size'],
+                                        processes=1, progress=False, seed=RUN['seed'])
+    assert resumed.to_dict() == uninterrupted.to_dict()
+    assert load_checkpoint(path)['finished']
+
+
+def test_interrupt_while_merging_a_chunk_does_not_count_it_twice(tmp_path, monkeypatch):
+    path = str(tmp_path / 'run.json')
+    merge = CombatStats.merge
+    merges = []
+
+    # Ctrl+C arriving after the second chunk is merged into the totals, before the run has counted it
+    def interrupted_merge(self, other):
+        merge(self, other)
+        merges.append(other)
+        if len(merges) == 2:
+            raise KeyboardInterrupt
+        return self
+
+    with monkeypatch.context() as patch:
+        patch.setattr(CombatStats, 'merge', interrupted_merge)
+        with pytest.raises(KeyboardInterrupt):
+            run_combat_checkpointed(path, ATTACKER, DEFENDER, **RUN)
+    state = load_checkpoint(path)
+    assert (state['chunks'], state['stats'].iterations) == (1, 200)
+
+    resumed = run_combat_checkpointed(path, processes=1, progress=False)
+    uninterrupted = run_combat_parallel(ATTACKER, DEFENDER, RUN['iterations'], chunk_size=RUN['chunk_size'],
+                                        processes=1, progress=False, seed=RUN['seed'])
+    assert resumed.to_dict() == uninterrupted.to_dict()
+
+
+def test_resume_refuses_another_engine_version(tmp_path):
+    path = str(tmp_path / 'run.json')
+    run_combat_checkpointed(path, ATTACKER, DEFENDER, **RUN)
+    with open(path) as file:
+        data = json.load(file)
+    data['engine_version'] -= 1
+    with open(path, 'w') as file:
+        json.dump(data, file)
+    with pytest.raises(ValueError, match='engine version'):
+        run_combat_checkpointed(path, processes=1, progress=False)
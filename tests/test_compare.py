@@ -0,0 +1,38 @@
+import pytest
+from eclipse_combat.compare import compare_variants
+
+DEFENDER = {'Ancient': 1}
+CRUISERS = ({'Cruiser': 2}, DEFENDER)
+DREADNOUGHT = ({'Dreadnought': 1}, DEFENDER)
+RUN = dict(chunk_size=100, processes=1, progress=False, seed=3)
+
+
+@pytest.mark.parametrize('antithetic', [False, True])
+def test_identical_variants_fight_the_same_battles(antithetic):
+    comparison = compare_variants(CRUISERS, CRUISERS, 400, antithetic=antithetic, **RUN)
+    assert comparison.difference() == 0
+    assert comparison.difference_interval() == (0, 0)
+    assert comparison.stats['a'].to_dict() == comparison.stats['b'].to_dict()
+
+
+@pytest.mark.parametrize('antithetic', [False, True])
+def test_every_variant_gets_the_battles_asked_for(antithetic):
+    comparison = compare_variants(CRUISERS, DREADNOUGHT, 400, antithetic=antithetic, **RUN)
+    assert comparison.samples == (200 if antithetic else 400)
+    assert comparison.stats['a'].iterations == comparison.stats['b'].iterations == 400
+    low, high = comparison.difference_interval()
+    assert low <= comparison.difference() <= high
+    assert comparison.difference() == pytest.approx(comparison.stats['a'].win_prob('attacker') -
+                                                    comparison.stats['b'].win_prob('attacker'))
+
+
+def test_antithetic_dice_change_the_battles():
+    plain = compare_variants(CRUISERS, DREADNOUGHT, 400, **RUN)
+    antithetic = compare_variants(CRUISERS, DREADNOUGHT, 400, antithetic=True, **RUN)
+    assert plain.stats['a'].to_dict() != antithetic.stats['a'].to_dict()
+
+
+def test_seeded_comparison_does_not_depend_on_the_process_count():
+    single = compare_variants(CRUISERS, DREADNOUGHT, 400, antithetic=True, **RUN)
+    pooled = compare_variants(CRUISERS, DREADNOUGHT, 400, antithetic=True, **dict(RUN, processes=2))
+    assert single.results() == pooled.results()
@@ -0,0 +1,40 @@
+from eclipse_combat.combat import run_combat_parallel
+from eclipse_combat.counters import CombatCounters
+
+
+def test_merge_adds_fields_and_histograms_of_any_length():
+    first = CombatCounters()
+    first.add_battle(1)
+    first.dice_rolled = 5
+    second = CombatCounters()
+    second.add_battle(3)
+    second.add_battle(1)
+    second.dice_rolled = 7
+    first.merge(second)
+    assert first.battles == 3
+    assert first.dice_rolled == 12
+    assert first.rounds_histogram == [0, 2, 0, 1]
+
+
+def test_counters_round_trip_through_a_dict():
+    counters = CombatCounters()
+    counters.add_battle(2)
+    counters.missile_seconds = 0.5
+    assert CombatCounters.from_dict(counters.to_dict()).to_dict() == counters.to_dict()
+
+
+def test_instrumented_run_counts_every_battle_over_the_pool():
+    stats = run_combat_parallel({'Cruiser': 2}, {'Dreadnought': 1}, 400, chunk_size=100, processes=2, progress=False,
+                                seed=1, instrument=True)
+    assert stats.counters.battles == 400
+    assert sum(stats.counters.rounds_histogram) == 400
+    assert stats.counters.rounds == sum(rounds * battles for rounds, battles in
+                                        enumerate(stats.counters.rounds_histogram))
+    assert stats.counters.dice_rolled > 0
+
+
+def test_instrumenting_does_not_change_the_battles():
+    run = dict(chunk_size=100, processes=1, progress=False, seed=1)
+    plain = run_combat_parallel({'Cruiser': 2}, {'Dreadnought': 1}, 400, **run)
+    instrumented = run_combat_parallel({'Cruiser': 2}, {'Dreadnought': 1}, 400, instrument=True, **run)
+    assert instrumented.results() == plain.results()
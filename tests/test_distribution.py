@@ -0,0 +1,71 @@
+import pytest
+from eclipse_combat.combat import run_combat_parallel, simulate_combat_chunk
+from eclipse_combat.distribution import OutcomeDistribution
+from eclipse_combat.exact import solve_combat_exact
+from eclipse_combat.rng import stream
+from eclipse_combat.ship_types import DEFAULT_SHIP_TYPES
+from eclipse_combat.vectorized import run_combat_vectorized
+
+ATTACKER = {'Interceptor': 2, 'Cruiser': 1}
+DEFENDER = {'Dreadnought': 1}
+# More than four standard errors of a probability estimated from 5000 battles
+TOLERANCE = 0.03
+
+
+def chunk_distribution(chunk_index, iterations=200):
+    stats = simulate_combat_chunk(ATTACKER, DEFENDER, iterations, stream(6, chunk_index), distribution=True)
+    return stats.distribution
+
+
+def test_merge_adds_every_histogram():
+    first, second = chunk_distribution(0), chunk_distribution(1)
+    merged = OutcomeDistribution.from_dict(first.to_dict()).merge(second)
+    assert merged.iterations == 400
+    assert merged.draws + merged.stalemates + sum(merged.wins.values()) == 400
+    for side in ('attacker', 'defender'):
+        assert merged.survivors[side] == [a + b for a, b in zip(first.survivors[side], second.survivors[side])]
+        assert sum(merged.hit_points[side]) == 400
+    assert merged.rounds == [a + b for a, b in zip(first.rounds, second.rounds)]
+
+
+def test_to_dict_round_trip():
+    distribution = chunk_distribution(0)
+    assert OutcomeDistribution.from_dict(distribution.to_dict()).to_dict() == distribution.to_dict()
+
+
+def test_survivor_distribution_agrees_with_the_wins():
+    distribution = chunk_distribution(0, 1000)
+    survivors = distribution.survivor_distribution('attacker')
+    assert sum(survivors.values()) == pytest.approx(1.0)
+    won = sum(probability for counts, probability in survivors.items() if any(counts))
+    # The attacker has ships left when it wins, and in stalemates
+    assert won == pytest.approx(distribution.win_prob('attacker') + distribution.stalemate_prob())
+    assert distribution.expected_value('attacker', lambda counts: 0) == 0
+
+
+def test_draws_and_stalemates_agree_with_the_totals():
+    stats = run_combat_parallel(ATTACKER, DEFENDER, 1000, chunk_size=250, processes=1, progress=False, seed=2,
+                                distribution=True)
+    results = stats.results()
+    assert stats.distribution.draw_prob() == results['draw_prob']
+    assert stats.distribution.stalemate_prob() == results['stalemate_prob']
+
+
+@pytest.mark.parametrize('attacker, defender, draws, stalemates', [
+    # Missiles only: most battles end with ships left on both sides that can not damage each other
+    ({'Missile Boat': 2}, {'Missile Boat': 2}, False, True),
+    # Single interceptors fire one after the other, a battle never ends with both destroyed or both left
+    ({'Interceptor': 1}, {'Interceptor': 1}, False, False),
+    # A rift cannon can destroy its target and its own ship with the same roll
+    ({'Rift Interceptor': 1}, {'Interceptor': 1}, True, False),
+])
+def test_every_engine_splits_draws_and_stalemates_the_same_way(default_ship_types, attacker, defender, draws,
+                                                               stalemates):
+    default_ship_types['Rift Interceptor'] = dict(DEFAULT_SHIP_TYPES['Interceptor'], dice={}, rift_cannon=1)
+    exact = solve_combat_exact(attacker, defender)
+    sampled = run_combat_parallel(attacker, defender, 5000, processes=1, progress=False, seed=1).results()
+    vectorized = run_combat_vectorized(attacker, defender, 5000, seed=1)
+    assert (exact['draw_prob'] > 0, exact['stalemate_prob'] > 0.5) == (draws, stalemates)
+    for results in (sampled, vectorized):
+        for key in ('attacker_win_prob', 'draw_prob', 'stalemate_prob'):
+            assert results[key] == pytest.approx(exact[key], abs=TOLERANCE), key
@@ -0,0 +1,34 @@
+import pytest
+from eclipse_combat.combat import run_combat_parallel
+from eclipse_combat.exact import solve_combat_exact
+
+ATTACKER = {'Cruiser': 2}
+DEFENDER = {'Dreadnought': 1}
+ITERATIONS = 20000
+# More than four standard errors of a probability estimated from ITERATIONS battles
+TOLERANCE = 0.015
+
+
+def test_exact_probabilities_sum_to_one():
+    results = solve_combat_exact(ATTACKER, DEFENDER)
+    total = (results['attacker_win_prob'] + results['defender_win_prob'] + results['draw_prob'] +
+             results['stalemate_prob'])
+    assert total == pytest.approx(1.0)
+    for side in ('attacker', 'defender'):
+        assert sum(results[f'{side}_survivor_distribution'].values()) == pytest.approx(results[f'{side}_win_prob'])
+
+
+def test_monte_carlo_matches_exact():
+    exact = solve_combat_exact(ATTACKER, DEFENDER)
+    sampled = run_combat_parallel(ATTACKER, DEFENDER, ITERATIONS, processes=1, progress=False, seed=1).results()
+    for key in ('attacker_win_prob', 'defender_win_prob', 'draw_prob'):
+        assert sampled[key] == pytest.approx(exact[key], abs=TOLERANCE), key
+    for ship_type, average in exact['attacker_survival_avg'].items():
+        assert sampled['attacker_survival_avg'][ship_type] == pytest.approx(average, abs=2 * TOLERANCE)
+
+
+def test_survivor_distribution_is_keyed_by_fleet_order():
+    results = solve_combat_exact({'Interceptor': 1, 'Cruiser': 1}, {'Interceptor': 1})
+    for survivors in results['attacker_survivor_distribution']:
+        interceptors, cruisers = survivors
+        assert 0 <= interceptors <= 1 and 0 <= cruisers <= 1 and interceptors + cruisers > 0
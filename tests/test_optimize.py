@@ -0,0 +1,31 @@
+import pytest
+from eclipse_combat.optimize import optimize_blueprint, race
+
+DEFENDER = {'Ancient': 1}
+CELLS = [({'Interceptor': 1}, DEFENDER), ({'Cruiser': 1}, DEFENDER), ({'Dreadnought': 2}, DEFENDER),
+         ({'Cruiser': 2}, DEFENDER), ({'Interceptor': 2}, DEFENDER)]
+RUN = dict(min_battles=100, chunk_size=100, processes=1, progress=False, seed=1)
+
+
+@pytest.mark.parametrize('budget', [500, 1234, 8000])
+def test_race_stays_within_its_budget(budget):
+    ranking = race(CELLS, budget, **RUN)
+    assert sum(contender.stats.iterations for contender in ranking) <= budget
+    assert all(contender.stats.iterations >= RUN['min_battles'] for contender in ranking)
+
+
+def test_race_picks_the_strongest_fleet():
+    ranking = race(CELLS, 8000, **RUN)
+    assert ranking[0].attacker_counts == {'Dreadnought': 2}
+    assert ranking[0].eliminated is None
+    assert len(ranking) == len(CELLS)
+
+
+def test_race_refuses_a_budget_too_small_for_every_candidate():
+    with pytest.raises(ValueError, match='budget'):
+        race(CELLS, 499, **RUN)
+
+
+def test_blueprint_count_must_fit_the_category_limit():
+    with pytest.raises(ValueError, match="category 'dreadnought'"):
+        optimize_blueprint('Dreadnought', [{'computer': 1}], 1, 5, DEFENDER, 1000, **RUN)
@@ -0,0 +1,54 @@
+import os
+from collections import Counter
+import pytest
+from eclipse_combat.combat import run_combat_parallel
+from eclipse_combat.rng import DiceBuffer, derive_seed
+
+ATTACKER = {'Interceptor': 2, 'Cruiser': 1}
+DEFENDER = {'Dreadnought': 1}
+
+
+def test_derive_seed_depends_on_seed_and_path():
+    assert derive_seed(1, 2, 3) == derive_seed(1, 2, 3)
+    assert derive_seed(1, 2, 3) != derive_seed(1, 3, 2)
+    assert derive_seed(1, 2) != derive_seed(2, 2)
+
+
+def test_seeded_results_do_not_depend_on_the_process_count():
+    kwargs = dict(chunk_size=250, progress=False, seed=42)
+    single = run_combat_parallel(ATTACKER, DEFENDER, 1000, processes=1, **kwargs)
+    pooled = run_combat_parallel(ATTACKER, DEFENDER, 1000, processes=2, **kwargs)
+    assert single.to_dict() == pooled.to_dict()
+
+
+def test_different_seeds_give_different_battles():
+    first = run_combat_parallel(ATTACKER, DEFENDER, 1000, processes=1, progress=False, seed=1)
+    second = run_combat_parallel(ATTACKER, DEFENDER, 1000, processes=1, progress=False, seed=2)
+    assert first.to_dict() != second.to_dict()
+
+
+def test_seeded_dice_buffers_roll_the_same_dice():
+    first = DiceBuffer(9, size=64)
+    second = DiceBuffer(9, size=64)
+    rolls = [first.roll() for _ in range(200)]
+    assert rolls == [second.roll() for _ in range(200)]
+    assert set(rolls) <= set(range(1, 7))
+    assert rolls != [DiceBuffer(10, size=64).roll() for _ in range(200)]
+
+
+def test_unseeded_buffer_drops_bytes_that_would_favour_low_faces(monkeypatch):
+    monkeypatch.setattr(os, 'urandom', lambda size: bytes(range(256)))
+    dice = DiceBuffer(size=256)
+    rolls = Counter(dice.roll() for _ in range(252))
+    assert rolls == {face: 42 for face in range(1, 7)}
+    assert len(dice.buffer) == 252
+
+
+def test_dice_buffer_picks_fewer_outcomes_evenly():
+    dice = DiceBuffer(3, size=128)
+    picks = Counter(dice.choice('abc') for _ in range(3000))
+    assert set(picks) == {'a', 'b', 'c'}
+    assert all(900 < count < 1100 for count in picks.values())
+    assert all(1 <= dice.randint(1, 3) <= 3 for _ in range(100))
+    with pytest.raises(ValueError):
+        dice.randrange(7)
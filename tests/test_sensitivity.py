@@ -0,0 +1,32 @@
+from eclipse_combat.sensitivity import sensitivity_analysis
+from eclipse_combat.ship_table import get_ship_table
+
+RUN = dict(chunk_size=100, processes=1, progress=False, seed=1)
+
+
+def test_changed_ship_types_keep_their_place_in_the_fleet():
+    attacker = {'Interceptor': 1, 'Cruiser': 1, 'Dreadnought': 1}
+    results = sensitivity_analysis(attacker, {'Ancient': 1}, 50, changes=('hull',), **RUN)
+    for side, ship_type, change, comparison in results:
+        if side != 'attacker':
+            continue
+        variant = comparison.variants['a'][0]
+        assert list(variant.values()) == [1, 1, 1]
+        assert list(variant).index(f"{ship_type} (hull+1, attacker)") == list(attacker).index(ship_type)
+
+
+def test_every_change_is_estimated_on_the_side_of_its_ship_type():
+    results = sensitivity_analysis({'Cruiser': 2}, {'Ancient': 1}, 200, **RUN)
+    assert {(side, ship_type) for side, ship_type, _, _ in results} == {('attacker', 'Cruiser'),
+                                                                        ('defender', 'Ancient')}
+    assert len(results) == 10
+    differences = [comparison.difference() for _, _, _, comparison in results]
+    assert differences == sorted(differences, reverse=True)
+    assert all(comparison.samples == 200 for _, _, _, comparison in results)
+
+
+def test_sensitivity_restores_the_ship_table():
+    table = get_ship_table()
+    sensitivity_analysis({'Cruiser': 1}, {'Ancient': 1}, 50, changes=('computer',), **RUN)
+    assert get_ship_table() is table
+    assert not any('computer+1' in name for name in get_ship_table().index)
@@ -0,0 +1,61 @@
+import os
+import time
+import threading
+import pytest
+from eclipse_combat.combat import run_combat_parallel
+from eclipse_combat.service import SimulationClient, SimulationError, SimulationService
+
+ATTACKER = {'Cruiser': 2}
+DEFENDER = {'Dreadnought': 1}
+
+
+@pytest.fixture
+def address(tmp_path):
+    address = str(tmp_path / 'simulation.sock')
+    service = SimulationService(address, processes=2)
+    thread = threading.Thread(target=service.serve_forever, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not os.path.exists(address):
+        assert time.monotonic() < deadline, "The service did not start listening."
+        time.sleep(0.01)
+    yield address
+    service.shutdown()
+    thread.join(10)
+
+
+def test_service_gives_the_results_of_the_library(address):
+    with SimulationClient(address) as client:
+        stats = client.run_combat_parallel(ATTACKER, DEFENDER, 600, chunk_size=200, seed=4)
+    expected = run_combat_parallel(ATTACKER, DEFENDER, 600, chunk_size=200, processes=1, progress=False, seed=4)
+    assert stats.to_dict() == expected.to_dict()
+
+
+def test_submitted_requests_are_answered_by_id(address):
+    with SimulationClient(address) as client:
+        first = client.submit(ATTACKER, DEFENDER, 300, seed=1)
+        second = client.submit(DEFENDER, ATTACKER, 200, seed=1)
+        assert client.wait(second).iterations == 200
+        assert client.wait(first).iterations == 300
+
+
+def test_cancelled_request_is_answered_and_the_connection_goes_on(address):
+    with SimulationClient(address) as client:
+        request = client.submit(ATTACKER, DEFENDER, 10 ** 8, chunk_size=100)
+        client.cancel(request)
+        with pytest.raises(SimulationError, match='cancelled'):
+            client.wait(request)
+        with pytest.raises(SimulationError, match='No such request'):
+            client.cancel(request)
+            client.wait(request)
+        assert client.run_combat_parallel(ATTACKER, DEFENDER, 100).iterations == 100
+
+
+def test_unknown_ship_type_and_op_are_errors(address):
+    with SimulationClient(address) as client:
+        request = client.submit({'Battleship': 1}, DEFENDER, 100)
+        with pytest.raises(SimulationError, match="Unknown ship type 'Battleship'"):
+            client.wait(request)
+        client._send({'op': 'launch', 'id': 'x'})
+        with pytest.raises(SimulationError, match="Unknown op 'launch'"):
+            client.wait('x')
@@ -0,0 +1,34 @@
+import copy
+import pytest
+from eclipse_combat import ship_table, ship_types
+from eclipse_combat.shard import merge_shards, run_shard
+from eclipse_combat.sweep import sweep
+
+CELLS = [({'Cruiser': 2}, {'Dreadnought': 1}), ({'Interceptor': 3}, {'Cruiser': 1})]
+SPEC = {'cells': [{'attacker': attacker, 'defender': defender} for attacker, defender in CELLS],
+        'iterations': 600, 'seed': 3, 'chunk_size': 200, 'ship_types': {}}
+
+
+def test_merged_shards_match_a_single_sweep():
+    shards = [run_shard(SPEC, shard, 3, processes=2, progress=False) for shard in range(3)]
+    merged = merge_shards(shards)
+    expected = {index: stats for index, _, _, stats in sweep(CELLS, SPEC['iterations'], SPEC['chunk_size'],
+                                                             processes=2, progress=False, seed=SPEC['seed'])}
+    assert {cell: stats.to_dict() for cell, stats in merged.items()} == \
+           {cell: stats.to_dict() for cell, stats in expected.items()}
+
+
+def test_merge_needs_every_shard():
+    shards = [run_shard(SPEC, shard, 3, processes=1, progress=False) for shard in (0, 2)]
+    with pytest.raises(ValueError, match='missing'):
+        merge_shards(shards)
+
+
+def test_spec_ship_types_stay_in_the_run():
+    table = ship_table.get_ship_table()
+    spec = dict(copy.deepcopy(SPEC), cells=[{'attacker': {'Gunboat': 1}, 'defender': {'Interceptor': 1}}],
+                ship_types={'Gunboat': dict(ship_types.DEFAULT_SHIP_TYPES['Interceptor'], dice={'1': 2})})
+    shard = run_shard(spec, 0, 1, processes=1, progress=False)
+    assert shard['cells']['0']['iterations'] == spec['iterations']
+    assert 'Gunboat' not in ship_types.get_ship_types()
+    assert ship_table.get_ship_table() is table
@@ -0,0 +1,46 @@
+import multiprocessing
+import pytest
+from eclipse_combat.combat import run_combat_parallel
+from eclipse_combat.ship_table import compile_ship_types, get_ship_table, init_ship_table, using_ship_table
+from eclipse_combat.ship_types import DEFAULT_SHIP_TYPES
+
+
+# Workers started with spawn do not inherit the ship types of this process, only what their initializer gives them
+@pytest.fixture
+def spawned_workers():
+    start_method = multiprocessing.get_start_method(allow_none=True)
+    multiprocessing.set_start_method('spawn', force=True)
+    yield
+    multiprocessing.set_start_method(start_method, force=True)
+
+
+def test_unsaved_ship_types_reach_the_workers(default_ship_types, spawned_workers):
+    default_ship_types['Unsaved Cruiser'] = dict(DEFAULT_SHIP_TYPES['Cruiser'], hull=4, dice={'2': 2})
+    run = dict(chunk_size=200, progress=False, seed=2)
+    pooled = run_combat_parallel({'Unsaved Cruiser': 1}, {'Dreadnought': 1}, 400, processes=2, **run)
+    single = run_combat_parallel({'Unsaved Cruiser': 1}, {'Dreadnought': 1}, 400, processes=1, **run)
+    assert pooled.to_dict() == single.to_dict()
+
+
+def test_worker_table_matches_the_parent_table():
+    table = compile_ship_types()
+    init_ship_table(table.specs)
+    assert get_ship_table() == table
+    assert dict(get_ship_table().index) == dict(table.index)
+
+
+def test_compiled_table_precomputes_hit_thresholds():
+    table = compile_ship_types({'Gunner': dict(DEFAULT_SHIP_TYPES['Cruiser'], computer=2),
+                                'Wall': dict(DEFAULT_SHIP_TYPES['Cruiser'], shield=3)})
+    gunner = table.specs[table.index['Gunner']]
+    assert table.max_shield == 3
+    assert gunner.hit_threshold == (4, 5, 6, 6)
+    with pytest.raises(ValueError):
+        compile_ship_types({'Broken': dict(DEFAULT_SHIP_TYPES['Cruiser'], shield=-1)})
+
+
+def test_using_ship_table_restores_the_previous_table():
+    before = get_ship_table()
+    with using_ship_table(compile_ship_types({'Only': DEFAULT_SHIP_TYPES['Cruiser']})):
+        assert list(get_ship_table().index) == ['Only']
+    assert get_ship_table() is before
@@ -0,0 +1,53 @@
+import os
+import sys
+import json
+import subprocess
+import pytest
+from eclipse_combat import ship_types
+from eclipse_combat.ship_types import DEFAULT_SHIP_TYPES, save_ship_types, write_json_atomic
+
+
+def test_import_does_not_load_the_ship_types():
+    code = "import eclipse_combat.combat, eclipse_combat.ship_types as s; print(s._ship_types is None)"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True, cwd=root).stdout
+    assert output.strip() == 'True'
+
+
+def test_ship_types_are_loaded_on_first_use(monkeypatch, tmp_path):
+    path = tmp_path / 'ship_types.json'
+    path.write_text(json.dumps({'Custom': dict(DEFAULT_SHIP_TYPES['Cruiser'], hull=5)}))
+    monkeypatch.setattr(ship_types, 'SHIP_TYPES_FILE', str(path))
+    monkeypatch.setattr(ship_types, '_ship_types', None)
+    assert ship_types.SHIP_TYPES['Custom']['hull'] == 5
+    assert set(DEFAULT_SHIP_TYPES) <= set(ship_types.SHIP_TYPES)
+    assert ship_types.SHIP_TYPES is ship_types.get_ship_types()
+
+
+def test_saved_ship_types_are_loaded_again(monkeypatch):
+    ship_types.get_ship_types()['Custom'] = dict(DEFAULT_SHIP_TYPES['Cruiser'], hull=5)
+    save_ship_types()
+    monkeypatch.setattr(ship_types, '_ship_types', None)
+    assert ship_types.get_ship_types()['Custom']['hull'] == 5
+
+
+def test_atomic_write_keeps_the_mode_of_the_file_it_replaces(tmp_path):
+    path = str(tmp_path / 'data.json')
+    write_json_atomic(path, {'a': 1})
+    os.chmod(path, 0o600)
+    write_json_atomic(path, {'a': 2})
+    with open(path) as file:
+        assert json.load(file) == {'a': 2}
+    if os.name == 'posix':
+        assert os.stat(path).st_mode & 0o777 == 0o600
+    assert os.listdir(tmp_path) == ['data.json']
+
+
+def test_failed_atomic_write_leaves_the_old_file(tmp_path):
+    path = str(tmp_path / 'data.json')
+    write_json_atomic(path, {'a': 1})
+    with pytest.raises(TypeError):
+        write_json_atomic(path, {'a': object()})
+    with open(path) as file:
+        assert json.load(file) == {'a': 1}
+    assert os.listdir(tmp_path) == ['data.json']
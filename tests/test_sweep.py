@@ -0,0 +1,40 @@
+import sys
+from eclipse_combat.sweep import fleet_compositions, sweep, sweep_matrix
+
+# The package exports the sweep function under the name of its module
+sweep_module = sys.modules['eclipse_combat.sweep']
+
+
+def no_pool(*args, **kwargs):
+    raise AssertionError("A worker pool was started for decided matchups.")
+
+
+def test_decided_cells_are_answered_without_a_pool(monkeypatch):
+    monkeypatch.setattr(sweep_module, 'Pool', no_pool)
+    cells = [({'Interceptor': 1}, {}), ({}, {'Cruiser': 2}), ({}, {})]
+    results = {index: stats for index, _, _, stats in sweep(cells, 100, progress=False)}
+    assert results[0].wins == {'attacker': 100, 'defender': 0}
+    assert results[0].survivors['attacker']['Interceptor'] == [0, 100]
+    assert results[1].wins == {'attacker': 0, 'defender': 100}
+    assert results[2].draws == 100
+
+
+def test_decided_cells_come_before_simulated_ones():
+    cells = [({'Cruiser': 2}, {'Dreadnought': 1}), ({'Interceptor': 1}, {})]
+    results = list(sweep(cells, 400, chunk_size=100, processes=1, progress=False, seed=1))
+    assert [index for index, _, _, _ in results] == [1, 0]
+    assert results[1][3].iterations == 400
+
+
+def test_sweep_matrix_covers_every_pair():
+    matrix = sweep_matrix([{'Interceptor': 1}, {'Cruiser': 1}], [{'Ancient': 1}], 200, processes=1,
+                          progress=False, seed=1)
+    assert sorted(matrix) == [(0, 0), (1, 0)]
+    assert all(stats.iterations == 200 for stats in matrix.values())
+
+
+def test_fleet_compositions_respect_the_category_limits():
+    compositions = fleet_compositions(['Interceptor', 'Dreadnought'], limits={'interceptor': 2, 'dreadnought': 1})
+    assert len(compositions) == 3 * 2 - 1
+    assert {} not in compositions
+    assert {'Interceptor': 2, 'Dreadnought': 1} in compositions
@@ -0,0 +1,32 @@
+import pytest
+from eclipse_combat.combat import run_combat_parallel
+from eclipse_combat.vectorized import run_combat_vectorized, vectorized_combat_stats
+
+ATTACKER = {'Cruiser': 2}
+DEFENDER = {'Dreadnought': 1}
+ITERATIONS = 20000
+# More than four standard errors of the difference of two probabilities estimated from ITERATIONS battles each
+TOLERANCE = 0.02
+
+
+def test_vectorized_matches_the_scalar_engine():
+    vectorized = run_combat_vectorized(ATTACKER, DEFENDER, ITERATIONS, seed=1)
+    scalar = run_combat_parallel(ATTACKER, DEFENDER, ITERATIONS, processes=1, progress=False, seed=1).results()
+    for key in ('attacker_win_prob', 'defender_win_prob', 'draw_prob'):
+        assert vectorized[key] == pytest.approx(scalar[key], abs=TOLERANCE), key
+    for side in ('attacker', 'defender'):
+        for ship_type, average in scalar[f'{side}_survival_avg'].items():
+            assert vectorized[f'{side}_survival_avg'][ship_type] == pytest.approx(average, abs=2 * TOLERANCE)
+
+
+def test_vectorized_is_reproducible_with_a_seed():
+    first = vectorized_combat_stats(ATTACKER, DEFENDER, 2000, batch_size=500, seed=7)
+    second = vectorized_combat_stats(ATTACKER, DEFENDER, 2000, batch_size=500, seed=7)
+    assert first.to_dict() == second.to_dict()
+    assert first.iterations == 2000
+
+
+def test_vectorized_without_ships_is_a_draw():
+    results = run_combat_vectorized({}, {}, 10)
+    assert results['draw_prob'] == 1.0
+    assert results['attacker_win_prob'] == results['defender_win_prob'] == 0